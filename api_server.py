@@ -0,0 +1,250 @@
+"""
+行程规划 HTTP 服务：移动端后台通过它调用与 Streamlit 页面相同的流水线（chains.trip_pipeline）。
+
+    python api_server.py            # 默认监听 8600 端口
+
+接口：
+- POST /trips                提交 TripRequest（JSON），返回 202 + job_id；命中结果缓存时直接返回 200 + 结果
+- GET  /trips/{job_id}       任务状态；完成后带完整结果
+- GET  /trips/{job_id}/events  SSE 进度流：stage（阶段）、day（每排好一天推一次）、done / failed
+- GET  /health               排队数、在途数、工作线程数，以及各上游的熔断状态和延迟
+
+- 任务在进程内队列中排队，由 API_WORKERS 个工作线程执行；排队数超过 API_QUEUE_DEPTH 时返回 429
+- 相同请求（按内容哈希）在途时复用同一个任务；可复现模式的结果写入 ttl_cache，重复请求不再重算
+"""
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import tornado.ioloop
+import tornado.iostream
+import tornado.locks
+import tornado.web
+from pydantic import ValidationError
+
+from chains import trip_pipeline
+from models.trip_schema import TripRequest
+from tools import resilience, ttl_cache
+
+PORT = int(os.getenv("API_PORT", "8600"))
+WORKERS = int(os.getenv("API_WORKERS", "4"))
+QUEUE_DEPTH = int(os.getenv("API_QUEUE_DEPTH", "32"))
+JOB_HISTORY = int(os.getenv("API_JOB_HISTORY", "1000"))   # 内存里最多保留的任务数（含已完成）
+RESULT_TTL = float(os.getenv("API_RESULT_TTL", str(24 * 3600)))
+SSE_KEEPALIVE = 15  # 秒
+
+
+class Job:
+    def __init__(self, key: str, req: TripRequest):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.req = req
+        self.status = "queued"  # queued / running / done / failed
+        self.events = []        # [(event, data)]，SSE 连接从任意位置开始回放
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.changed = tornado.locks.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def summary(self) -> dict:
+        body = {"job_id": self.id, "status": self.status, "created": self.created}
+        if self.result is not None:
+            body["result"] = self.result
+        if self.error is not None:
+            body["error"] = self.error
+        return body
+
+
+class JobManager:
+    """进程内任务队列 + 工作线程池。状态只在 IOLoop 线程上修改，工作线程通过 add_callback 回传"""
+
+    def __init__(self, workers: int = WORKERS, queue_depth: int = QUEUE_DEPTH, backend=None):
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=queue_depth)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._inflight = {}  # request key → 未完成的 Job
+        self._running = 0
+        self._backend = backend
+        self._loop: Optional[tornado.ioloop.IOLoop] = None
+        self._workers = workers
+        self._started = False
+
+    def start(self):
+        self._loop = tornado.ioloop.IOLoop.current()
+        if self._started:
+            return
+        for i in range(self._workers):
+            threading.Thread(target=self._work, name=f"trip-worker-{i}", daemon=True).start()
+        self._started = True
+
+    # ---------- IOLoop 线程 ----------
+    async def submit(self, req: TripRequest) -> Job:
+        """返回新建或复用的任务；队列满时抛 queue.Full"""
+        key = trip_pipeline.request_key(req)
+        job = self._inflight.get(key)
+        if job is not None:
+            return job
+        cached = None
+        if req.deterministic:
+            # SQLite 读放到线程池，不阻塞 IOLoop
+            cached = await tornado.ioloop.IOLoop.current().run_in_executor(
+                None, ttl_cache.cache.get, "trip_result", key)
+            job = self._inflight.get(key)  # 等待期间可能已有相同请求入队
+            if job is not None:
+                return job
+        job = Job(key, req)
+        if cached is not None and time.time() < cached[1]:
+            job.status, job.result = "done", cached[0]
+            job.events.append(("done", {"cached": True}))
+        else:
+            self._queue.put_nowait(job)
+            self._inflight[key] = job
+        self._remember(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "running": self._running, "workers": self._workers,
+                "queue_depth": self._queue.maxsize, "jobs": len(self._jobs)}
+
+    def _remember(self, job: Job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > JOB_HISTORY:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.finished:
+                break  # 未完成的任务不淘汰
+            self._jobs.popitem(last=False)
+
+    def _emit(self, job: Job, event: str, data: dict):
+        if event == "running":
+            job.status = "running"
+            self._running += 1
+        elif event in ("done", "failed"):
+            job.status = event
+            self._running -= 1
+            self._inflight.pop(job.key, None)
+            job.result = data.pop("result", None)  # 完整结果只通过 GET /trips/{id} 返回，不重复推送
+            job.error = data.get("error")
+        job.events.append((event, data))
+        job.changed.notify_all()
+
+    # ---------- 工作线程 ----------
+    def _post(self, job: Job, event: str, data: dict):
+        self._loop.add_callback(self._emit, job, event, data)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            self._post(job, "running", {})
+            try:
+                result = trip_pipeline.run_trip(
+                    job.req, backend=self._backend,
+                    on_stage=lambda name: self._post(job, "stage", {"stage": name}),
+                    on_day=lambda day: self._post(job, "day", trip_pipeline.day_to_dict(day)),
+                ).to_dict()
+            except Exception as e:
+                self._post(job, "failed", {"error": str(e)})
+                continue
+            if job.req.deterministic:
+                try:
+                    ttl_cache.cache.set("trip_result", job.key, result, RESULT_TTL)
+                except Exception:
+                    pass  # 缓存失败不影响本次结果
+            self._post(job, "done", {"result": result})
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    @property
+    def jobs(self) -> JobManager:
+        return self.application.settings["jobs"]
+
+    def write_json(self, body: dict, status: int = 200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(body, ensure_ascii=False, default=str))
+
+    def job_or_404(self, job_id: str) -> Job:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise tornado.web.HTTPError(404, reason="job not found")
+        return job
+
+
+class TripsHandler(BaseHandler):
+    async def post(self):
+        try:
+            req = TripRequest(**json.loads(self.request.body or b"{}"))
+        except (ValueError, TypeError, ValidationError) as e:
+            return self.write_json({"error": f"参数校验失败：{e}"}, 400)
+        try:
+            job = await self.jobs.submit(req)
+        except queue.Full:
+            self.set_header("Retry-After", "5")
+            return self.write_json({"error": "任务队列已满，请稍后重试"}, 429)
+        self.write_json(job.summary(), 200 if job.finished else 202)
+
+
+class JobHandler(BaseHandler):
+    def get(self, job_id: str):
+        self.write_json(self.job_or_404(job_id).summary())
+
+
+class JobEventsHandler(BaseHandler):
+    async def get(self, job_id: str):
+        job = self.job_or_404(job_id)
+        self.set_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.set_header("Cache-Control", "no-cache")
+        sent = 0
+        while True:
+            batch = job.events[sent:]
+            for event, data in batch:
+                self.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n")
+            sent += len(batch)
+            try:
+                await self.flush()
+            except tornado.iostream.StreamClosedError:
+                return  # 客户端断开，任务继续跑，结果可以之后再查
+            if len(job.events) > sent:
+                continue  # flush 期间有新事件，notify 时没人在等，不能再去 wait
+            if job.finished:
+                break
+            if not await job.changed.wait(timeout=datetime.timedelta(seconds=SSE_KEEPALIVE)):
+                self.write(": keepalive\n\n")
+        self.finish()
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json({**self.jobs.stats(), "upstreams": resilience.report()})
+
+
+def make_app(jobs: Optional[JobManager] = None) -> tornado.web.Application:
+    return tornado.web.Application([
+        (r"/trips", TripsHandler),
+        (r"/trips/([0-9a-f]+)", JobHandler),
+        (r"/trips/([0-9a-f]+)/events", JobEventsHandler),
+        (r"/health", HealthHandler),
+    ], jobs=jobs or JobManager())
+
+
+def main():
+    app = make_app()
+    app.settings["jobs"].start()
+    app.listen(PORT)
+    print(f"行程规划服务已启动：http://127.0.0.1:{PORT}")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
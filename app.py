@@ -1,16 +1,78 @@
+import os
+
 import streamlit as st
 from datetime import date, timedelta
 from models.trip_schema import TripRequest
 from tools.city_tool import CityTool
 from datetime import date, timedelta, datetime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_folium import st_folium
-import random
+from tools.prefetcher import prefetcher
+from tools.session_memory import intern_pool, memory_report, registry as session_registry
 
-noise = lambda: random.uniform(-0.02, 0.02)  ##2公里的微小扰动
 # ---------- 会话初始化 ----------
 if "page" not in st.session_state:
     st.session_state.page = "form"
 
+# 候选池按内容在所有会话间共享，会话里只记引用、点赞/删除和可淘汰的派生产物（如行程快照）
+_ctx = get_script_run_ctx()
+SESSION_ID = _ctx.session_id if _ctx else "local"
+session_registry.touch(SESSION_ID)
+POOL_QUERIES = {"attractions": "景点", "restaurants": "餐厅", "hotels": "酒店"}
+
+
+def load_snapshot(snapshot_id: str) -> dict:
+    """从磁盘读快照，POI/酒店列表换成共享候选池，多个会话打开同一快照也只存一份"""
+    from tools.snapshot_store import store as snapshot_store
+
+    snapshot = snapshot_store.load(snapshot_id)
+    city = snapshot["request"]["destination"]
+    for slot, query in POOL_QUERIES.items():
+        pool = intern_pool(city, query, snapshot.get(slot) or [])
+        snapshot[slot] = session_registry.attach(SESSION_ID, slot, pool).items
+    return snapshot
+
+
+def current_snapshot():
+    """当前会话打开的快照；内存紧张时被淘汰过就从磁盘重新读"""
+    snapshot_id = st.session_state.get("snapshot_id")
+    if not snapshot_id:
+        return None
+    snapshot = session_registry.get(SESSION_ID, "snapshot")
+    if snapshot is None:
+        snapshot = load_snapshot(snapshot_id)
+        session_registry.put(SESSION_ID, "snapshot", snapshot)
+    return snapshot
+
+
+def open_snapshot(snapshot_id: str):
+    """加载行程快照并切到结果页；之后的页面渲染全部从快照回放，不发网络请求"""
+    snapshot = load_snapshot(snapshot_id)
+    session_registry.put(SESSION_ID, "snapshot", snapshot)
+    st.session_state.snapshot_id = snapshot_id
+    st.session_state.req = snapshot["request"]
+    st.session_state.pop("hotel_select", None)  # 酒店下拉框回到快照里选定的那一家
+    st.session_state.page = "result"
+    st.query_params["snapshot"] = snapshot_id
+
+
+def close_snapshot():
+    session_registry.discard(SESSION_ID, "snapshot")
+    st.session_state.snapshot_id = None
+    st.query_params.clear()
+
+
+# ---------- 永久链接：?snapshot=<id> ----------
+snapshot_param = st.query_params.get("snapshot")
+if snapshot_param and snapshot_param != st.session_state.get("snapshot_id"):
+    from tools.snapshot_store import SnapshotError
+
+    try:
+        open_snapshot(snapshot_param)
+    except SnapshotError as e:
+        st.session_state.snapshot_error = str(e)
+        st.query_params.clear()
+
 # ---------- 页面配置 ----------
 st.set_page_config(
     page_title="dahuang-TravelAgent",
@@ -59,6 +121,10 @@ st.title("🧳 dahuang-TravelAgent")
 st.subheader("一个基于大模型的旅游智能推荐助手")
 st.markdown('</div>', unsafe_allow_html=True)
 
+if os.getenv("SHOW_MEMORY_REPORT", "0") == "1":
+    with st.sidebar.expander("🧠 内存占用（按会话 / 候选池）", expanded=False):
+        st.json(memory_report())
+
 if st.session_state.page == "form":
     # ---------- 侧边栏表单 ----------
     with st.sidebar:
@@ -68,6 +134,8 @@ if st.session_state.page == "form":
         st.markdown("### 🚗 基本信息")
         departure = st.text_input("出发城市", "北京", help="请输入您的出发城市")
         destination = st.text_input("目的城市", "苏州", help="请输入您要前往的目的地")
+        # 目的地一确定就在后台预取城市、周边 POI 和简介，提交后结果页直接接上
+        prefetcher.schedule(SESSION_ID, destination)
         
         st.markdown("### 📅 出行时间")
         col1, col2 = st.columns(2)
@@ -96,6 +164,7 @@ if st.session_state.page == "form":
             placeholder="例如：喜欢历史文化、偏好安静环境、需要无障碍设施等...",
             help="请描述您的特殊需求或偏好"
         )
+        deterministic = st.checkbox("🎯 可复现模式", value=True, help="相同需求生成相同行程，便于缓存和对比")
         
         st.markdown("---")
         
@@ -103,6 +172,7 @@ if st.session_state.page == "form":
         with col1:
             if st.button("🔄 重置", use_container_width=True):
                 st.session_state.page = "form"
+                close_snapshot()
                 st.rerun()
         with col2:
             if st.button("🚀 生成推荐", type="primary", use_container_width=True):
@@ -119,11 +189,33 @@ if st.session_state.page == "form":
                         adults=adults,
                         children=children,
                         budget=budget,
-                        personal=personal
+                        personal=personal,
+                        deterministic=deterministic
                     )
+                    # 记录目的地访问，供缓存预热器挑选热门城市
+                    try:
+                        from tools.ttl_cache import cache
+                        cache.record_access(destination)
+                    except Exception:
+                        pass
+                    close_snapshot()
                     st.session_state.page = "result"
+                    # 可复现模式下同一请求已有快照时直接回放，不再重新调用百度和大模型
+                    if deterministic:
+                        try:
+                            from chains.trip_pipeline import request_key
+                            from tools.snapshot_store import store as snapshot_store
+
+                            snapshot_id = snapshot_store.find(request_key(TripRequest(**st.session_state.req)))
+                            if snapshot_id:
+                                open_snapshot(snapshot_id)
+                        except Exception:
+                            pass  # 快照不可用时正常规划
                     st.rerun()
     
+    if st.session_state.get("snapshot_error"):
+        st.warning(f"行程快照打开失败：{st.session_state.pop('snapshot_error')}")
+
     # ---------- 主页面内容 ----------
     st.markdown("""
     ### 👋 欢迎使用 dahuang-TravelAgent！
@@ -166,10 +258,21 @@ elif st.session_state.page == "result":
         st.error(f"参数校验失败：{e}")
         st.stop()
     
+    # 行程快照：有值时以下各步骤直接读取快照，不调用任何工具和大模型
+    try:
+        snapshot = current_snapshot()
+    except Exception as e:
+        st.warning(f"行程快照读取失败，将重新规划：{e}")
+        close_snapshot()
+        snapshot = None
+
     # ---------- 返回按钮 ----------
     if st.button("← 返回修改需求", type="secondary"):
         st.session_state.page = "form"
+        close_snapshot()
         st.rerun()
+    if snapshot:
+        st.info(f"📦 已从行程快照 `{st.session_state.snapshot_id}` 加载，未重新请求地图和大模型")
     
     st.markdown("---")
     
@@ -203,8 +306,9 @@ elif st.session_state.page == "result":
     
     # 2. 查询目的地城市信息
     with st.spinner("正在查询城市信息..."):
-        tool = CityTool()
-        result = tool._run(req.destination)
+        city_intro = None
+        result = (snapshot["city"] if snapshot
+                  else prefetcher.attach(req.destination, "city", lambda: CityTool()._run(req.destination)))
         if "error" in result:
             st.warning(f"城市信息获取失败：{result['error']}")
         else:
@@ -224,21 +328,75 @@ elif st.session_state.page == "result":
                 st.markdown(f"**📖 城市简介**")
                 # 使用大模型生成城市简介
                 with st.spinner("正在生成城市简介..."):
-                    from chains.city_intro_chain import get_city_introduction
-                    city_intro = get_city_introduction(req.destination)
+                    if snapshot:
+                        city_intro = snapshot.get("city_intro")
+                    else:
+                        from chains.city_intro_chain import get_city_introduction
+                        city_intro = prefetcher.attach(req.destination, "city_intro",
+                                                       lambda: get_city_introduction(req.destination))
                     st.info(city_intro)
-    # 3. 自选酒店（锚点）
+    # 3. 先拉取周边景点和餐厅（在标签页外部，确保作用域正确），酒店按到这些 POI 的通勤成本排序
+    with st.spinner("正在搜索周边景点..."):
+        from tools.attraction_tool import AttractionTool
+        from tools.platform_info_tool import PlatformInfoTool
+        from chains.trip_pipeline import enrich_with_platform_info
+
+        platform_tool = PlatformInfoTool()
+
+        def poi_pool(slot, items, name_key=None, poi_type=None):
+            """工具结果 → 共享只读候选池；首次驻留时为前几个 POI 补充平台信息，会话只记引用"""
+            prepare = None
+            if name_key:
+                prepare = lambda data: enrich_with_platform_info(
+                    data, name_key, req.destination, poi_type,
+                    lambda name, city, t: platform_tool._run(name=name, city=city, poi_type=t))
+            pool = intern_pool(req.destination, POOL_QUERIES[slot], items, prepare)
+            return session_registry.attach(SESSION_ID, slot, pool).items
+
+        # 快照里保存的已是补充过平台信息的数据
+        attractions_raw = (snapshot["attractions"] if snapshot else poi_pool(
+            "attractions",
+            prefetcher.attach(req.destination, "attractions",
+                              lambda: AttractionTool()._run(lat=result['latitude'], lng=result['longitude'])),
+            "景点名称", "attraction"))
+    with st.spinner("正在搜索周边餐厅..."):
+        from tools.restaurant_tool import RestaurantTool
+
+        restaurants_raw = (snapshot["restaurants"] if snapshot else poi_pool(
+            "restaurants",
+            prefetcher.attach(req.destination, "restaurants",
+                              lambda: RestaurantTool()._run(lat=result['latitude'], lng=result['longitude'])),
+            "餐厅名称", "restaurant"))
+
+    # 自选酒店（锚点）
     with tab2:
         with st.spinner("正在搜索周边酒店..."):
             from tools.hotel_tool import HotelTool
 
-            hotels = HotelTool()._run(lat=result['latitude'], lng=result['longitude'])
+            from tools.hotel_ranker import rank_hotels
+
+            selected_idx = None
+            hotels = snapshot["hotels"] if snapshot else prefetcher.attach(
+                req.destination, "hotels", lambda: HotelTool()._run(lat=result['latitude'], lng=result['longitude']))
             if hotels and "error" not in hotels[0]:
+                # 按 每日通勤时间 + 房价 排序，默认选综合成本最低的一家（快照里已是排好序的结果）
+                if not snapshot:
+                    hotels = poi_pool("hotels", rank_hotels(hotels, list(attractions_raw or []) + list(restaurants_raw or [])))
                 st.markdown("### 🏨 推荐酒店")
+                st.caption(f"共 {len(hotels)} 家候选，已按到周边景点/餐厅的通勤时间和房价综合排序")
                 # 让用户选一家
-                hotel_options = [f"{h['酒店名称']} | ¥{h['价格']} | ⭐{h['评分']}" for h in hotels]
-                selected = st.selectbox("请选择您要入住的酒店", hotel_options, index=0, key="hotel_select")
+                hotel_options = [
+                    f"{h['酒店名称']} | {h['价格']} | ⭐{h['评分']}"
+                    + (f" | 通勤约{h['日均通勤(分钟)']}分钟/天" if "日均通勤(分钟)" in h else "")
+                    for h in hotels
+                ]
+                default_idx = (snapshot.get("hotel_index") or 0) if snapshot else 0
+                selected = st.selectbox("请选择您要入住的酒店", hotel_options, index=default_idx, key="hotel_select")
                 selected_idx = hotel_options.index(selected)
+                if snapshot and selected_idx != snapshot.get("hotel_index"):
+                    # 换了酒店，快照里的行程不再适用，按新酒店重新规划
+                    close_snapshot()
+                    st.rerun()
                 hotel = hotels[selected_idx]  # 真实 Top-N 对象
 
                 # 真实坐标 & 名字
@@ -250,11 +408,14 @@ elif st.session_state.page == "result":
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("价格", f"¥{hotel['价格']}")
+                    st.metric("价格", hotel['价格'])
                 with col2:
                     st.metric("评分", f"⭐{hotel['评分']}")
                 with col3:
-                    st.metric("距离市中心", f"{hotel['距离(米)']}m")
+                    if "日均通勤(分钟)" in hotel:
+                        st.metric("日均通勤", f"{hotel['日均通勤(分钟)']}分钟")
+                    else:
+                        st.metric("距离市中心", f"{hotel['距离(米)']}m")
                 
                 st.info(f"📍 **地址**：{hotel['地址']}")
             else:
@@ -263,55 +424,22 @@ elif st.session_state.page == "result":
                 hotel_lat, hotel_lng, hotel_name = result['latitude'], result['longitude'], "市中心酒店"
                 hotel = {"酒店名称": hotel_name, "价格数值": 200}  # 默认价格
                 st.info(f"将使用默认位置：{hotel_name}")
-    # 4. 查询周边景点 + 短期记忆（点赞/删除）
-    # 先获取景点数据（在标签页外部，确保作用域正确）
-    with st.spinner("正在搜索周边景点..."):
-        from tools.attraction_tool import AttractionTool
-        from tools.platform_info_tool import PlatformInfoTool
-
-        attractions_raw = AttractionTool()._run(lat=result['latitude'], lng=result['longitude'])
-    
+    # 4. 景点推荐 + 短期记忆（点赞/删除）
     with tab3:
-        attractions = attractions_raw
+        attractions = attractions_raw  # 前 3 个景点的平台增强信息已在驻留候选池时补充
         
-        # 可选：为Top-3景点获取平台增强信息
         if attractions and "error" not in attractions[0]:
-            platform_tool = PlatformInfoTool()
-            for i, attr in enumerate(attractions[:3]):  # 只为前3个获取，避免API调用过多
-                try:
-                    platform_info = platform_tool._run(
-                        name=attr["景点名称"],
-                        city=req.destination,
-                        poi_type="attraction"
-                    )
-                    attr["平台信息"] = platform_info
-                    # 合并到推荐描述
-                    if platform_info.get("enhanced_description"):
-                        attr["推荐描述"] = f"{attr.get('推荐描述', '')} | {platform_info['enhanced_description']}"
-                except Exception as e:
-                    pass  # 如果失败，不影响主流程
-        
-        if attractions and "error" not in attractions[0]:
-            # ---------- 短期记忆 ----------
-            if "liked_attractions" not in st.session_state:
-                st.session_state.liked_attractions = set()
-            if "removed_attractions" not in st.session_state:
-                st.session_state.removed_attractions = set()
-
-            # 过滤已删除
-            filtered = [a for a in attractions if a["景点名称"] not in st.session_state.removed_attractions]
-
-            # 排序：点赞的置顶，其余保持原序
-            def sort_key(a):
-                return (0 if a["景点名称"] in st.session_state.liked_attractions else 1, attractions.index(a))
+            # ---------- 短期记忆：会话自己的点赞/删除，叠加在共享候选池之上 ----------
+            overlay = session_registry.overlay(SESSION_ID, "attractions")
 
-            filtered.sort(key=sort_key)
+            # 过滤已删除，点赞的置顶，其余保持原序
+            filtered = overlay.apply(attractions, "景点名称")
 
             st.markdown("### 🏞️ 推荐景点")
             st.caption("💡 提示：您可以点赞喜欢的景点（会优先安排），或删除不感兴趣的景点")
             
             for idx, a in enumerate(filtered[:5], 1):  # 只展示 Top-5
-                is_liked = a["景点名称"] in st.session_state.liked_attractions
+                is_liked = a["景点名称"] in overlay.liked
                 like_icon = "❤️" if is_liked else "🤍"
                 
                 with st.expander(f"{idx}. {a['景点名称']} ⭐{a.get('评分', 'N/A')} {like_icon}", expanded=False):
@@ -329,45 +457,22 @@ elif st.session_state.page == "result":
                     with col2:
                         if is_liked:
                             if st.button("取消点赞", key=f"unlike_{a['景点名称']}", use_container_width=True):
-                                st.session_state.liked_attractions.discard(a["景点名称"])
+                                overlay.liked.discard(a["景点名称"])
                                 st.rerun()
                         else:
                             if st.button("❤️ 点赞", key=f"like_{a['景点名称']}", use_container_width=True):
-                                st.session_state.liked_attractions.add(a["景点名称"])
+                                overlay.liked.add(a["景点名称"])
                                 st.rerun()
                         if st.button("🗑️ 删除", key=f"del_{a['景点名称']}", use_container_width=True):
-                            st.session_state.removed_attractions.add(a["景点名称"])
+                            overlay.removed.add(a["景点名称"])
                             st.rerun()
                         st.metric("距离", f"{a.get('距离(米)', 0)}m")
         else:
             st.warning("⚠️ 暂无周边景点数据")
-    # 5. 查询周边餐厅
-    # 先获取餐厅数据（在标签页外部，确保作用域正确）
-    with st.spinner("正在搜索周边餐厅..."):
-        from tools.restaurant_tool import RestaurantTool
-        from tools.platform_info_tool import PlatformInfoTool
-
-        restaurants_raw = RestaurantTool()._run(lat=result['latitude'], lng=result['longitude'])
-    
+    # 5. 餐厅推荐
     with tab4:
-        restaurants = restaurants_raw
+        restaurants = restaurants_raw  # 同样已带 Top-3 平台信息
         
-        # 可选：为Top-3餐厅获取平台增强信息
-        if restaurants and "error" not in restaurants[0]:
-            platform_tool = PlatformInfoTool()
-            for i, rest in enumerate(restaurants[:3]):  # 只为前3个获取，避免API调用过多
-                try:
-                    platform_info = platform_tool._run(
-                        name=rest["餐厅名称"],
-                        city=req.destination,
-                        poi_type="restaurant"
-                    )
-                    rest["平台信息"] = platform_info
-                    # 合并到推荐描述
-                    if platform_info.get("enhanced_description"):
-                        rest["推荐描述"] = f"{rest.get('推荐描述', '')} | {platform_info['enhanced_description']}"
-                except Exception as e:
-                    pass  # 如果失败，不影响主流程
         if restaurants and "error" not in restaurants[0]:
             st.markdown("### 🍴 推荐餐厅")
             st.caption("💡 为您精选的Top-5餐厅，将根据行程自动安排用餐时间")
@@ -392,138 +497,111 @@ elif st.session_state.page == "result":
             st.warning("⚠️ 暂无周边餐厅数据")
     # 6. 预算分配和行程规划
     with tab5:
-        # 6.1 预算分配
-        with st.spinner("正在生成预算分配..."):
-            from chains.budget_chain import budget_chain, parser
-
-            plan = budget_chain.invoke({
-                "departure": req.departure,
-                "destination": req.destination,
-                "adults": req.adults,
-                "children": req.children,
-                "start_date": req.start_date,
-                "end_date": req.end_date,
-                "budget": req.budget,
-                "format_instructions": parser.get_format_instructions(),
-            })
-
-            st.markdown("### 💰 预算分配建议")
-            col1, col2, col3, col4, col5 = st.columns(5)
-            with col1:
-                st.metric("住宿", f"¥{plan.accommodation}")
-            with col2:
-                st.metric("餐饮", f"¥{plan.restaurant}")
-            with col3:
-                st.metric("交通", f"¥{plan.transport}")
-            with col4:
-                st.metric("门票", f"¥{plan.attraction}")
-            with col5:
-                st.metric("备用", f"¥{plan.contingency}")
+        # 6.1 预算分配：本地规则即时算出，大模型点评在后台生成，不阻塞页面
+        trip_days = (req.end_date - req.start_date).days + 1  # 含首尾
+
+        # 获取酒店价格（从hotel字典中提取）
+        hotel_price = hotel.get("价格数值", 200)  # 默认200元/晚
+        if not hotel_price or hotel_price == 0:
+            hotel_price = 200
 
-            st.info(f"💡 **分配说明**：{plan.reason}")
+        from models.budget_plan import BudgetPlan
+        from tools.budget_allocator import allocate_budget
+
+        if snapshot:
+            plan = BudgetPlan(**snapshot["budget"])
+        else:
+            plan = allocate_budget(req.budget, trip_days, req.adults, req.children,
+                                   hotel_price=hotel_price, city=req.destination)
+
+        st.markdown("### 💰 预算分配建议")
+        col1, col2, col3, col4, col5 = st.columns(5)
+        with col1:
+            st.metric("住宿", f"¥{plan.accommodation}")
+        with col2:
+            st.metric("餐饮", f"¥{plan.restaurant}")
+        with col3:
+            st.metric("交通", f"¥{plan.transport}")
+        with col4:
+            st.metric("门票", f"¥{plan.attraction}")
+        with col5:
+            st.metric("备用", f"¥{plan.contingency}")
+
+        budget_note = st.empty()
+        budget_note.info(f"💡 **分配说明**：{plan.reason}")
+        budget_explanation = None
+        explanation = None
+        if snapshot:
+            explanation = snapshot.get("budget_explanation")
+            if explanation:
+                budget_note.info(f"💡 **分配说明**：{plan.reason}\n\n🤖 **AI 点评**：{explanation}")
+        elif os.getenv("BUDGET_LLM_EXPLAIN", "1") != "0":
+            try:
+                from chains.budget_chain import explain_budget
+
+                budget_explanation = explain_budget(plan, destination=req.destination, adults=req.adults,
+                                                    children=req.children, days=trip_days, budget=req.budget)
+            except Exception:
+                budget_explanation = None  # 点评只是锦上添花，失败时保留本地说明
         
         st.markdown("---")
         
-        trip_days = (req.end_date - req.start_date).days + 1  # 含首尾
         st.markdown(f"### 📅 行程安排（共 {trip_days} 天）")
         # 7. 生成行程（需要先处理景点和餐厅数据）
         with st.spinner("正在准备行程数据..."):
-            from tools.route_planner import greedy_daily_schedule
-            from tools.route_planner import score_activity
+            from chains.trip_pipeline import normalize_pois, plan_days
+            from tools.transport_modes import MODE_ICONS
 
-            # 使用从标签页外部获取的原始数据
-            # 注意：attraction_tool 和 restaurant_tool 返回的 location 格式是 "lng,lat"（经度,纬度）
-            attractions_list = attractions_raw if attractions_raw and "error" not in (attractions_raw[0] if attractions_raw else {}) else []
-            restaurants_list = restaurants_raw if restaurants_raw and "error" not in (restaurants_raw[0] if restaurants_raw else {}) else []
-            
-            attractions = [
-                {
-                    "name": a["景点名称"],
-                    "lat": float(a.get("location", f"{result['longitude']},{result['latitude']}").split(",")[1]) + noise(),
-                    "lng": float(a.get("location", f"{result['longitude']},{result['latitude']}").split(",")[0]) + noise(),
-                    "category": "attraction",
-                    "门票数值": a.get("门票数值", 0)  # 保留门票价格信息
-                }
-                for a in attractions_list
-            ]
-            restaurants = [
-                {
-                    "name": r["餐厅名称"],
-                    "lat": float(r.get("location", f"{result['longitude']},{result['latitude']}").split(",")[1]) + noise(),
-                    "lng": float(r.get("location", f"{result['longitude']},{result['latitude']}").split(",")[0]) + noise(),
-                    "category": "restaurant",
-                    "人均数值": r.get("人均数值", 50)  # 保留人均价格信息
-                }
-                for r in restaurants_list
-            ]
+            # 可复现模式下所有随机性（可选的坐标扰动、备用算法选餐厅）都来自请求派生的种子
+            seed = req.planning_seed() if req.deterministic else None
+            attractions, restaurants = normalize_pois(attractions_raw, restaurants_raw,
+                                                      result['latitude'], result['longitude'], seed)
         
-        # 8. 生成全程行程（动态天数，含所有 Day）
+        # 8. 生成全程行程（动态天数，含所有 Day），与 HTTP 服务共用 chains.trip_pipeline
+        from chains.day_plan_chain import plan_day_with_llm
+        from chains.trip_pipeline import day_from_dict, day_to_dict, request_key
+        from tools.trip_export import MIME_TYPES, TripExporter
+
         all_days = []
-        avail_attractions = attractions.copy()  # 剩余景点
-        avail_restaurants = restaurants.copy()  # 剩余餐厅
+        day_results = []  # 完整的 DayResult（含安排理由），写入行程快照
+        # 每排好一天就写进各导出格式（Markdown / JSON / iCalendar / GeoJSON），不用等全部生成完再拼
+        exporter = TripExporter(request_key(req)[:16], destination=req.destination,
+                                meta={"departure": req.departure, "start_date": str(req.start_date),
+                                      "end_date": str(req.end_date), "adults": req.adults, "children": req.children},
+                                hotel_price=hotel_price, nights=trip_days)
 
-        # 获取酒店价格（从hotel字典中提取）
-        hotel_price = hotel.get("价格数值", 200)  # 默认200元/晚
-        if not hotel_price or hotel_price == 0:
-            hotel_price = 200
-        
-        # 使用进度条显示生成进度
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        # 中途出错（大模型、渲染、下载按钮）也要关掉导出器，释放临时文件
+        try:
+            # 使用进度条显示生成进度
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            status_text.text(f"正在规划 Day 1/{trip_days} 行程...")
         
-        for day in range(1, trip_days + 1):
-            progress = day / trip_days
-            progress_bar.progress(progress)
-            status_text.text(f"正在规划 Day {day}/{trip_days} 行程...")
+            if snapshot:
+                day_stream = (day_from_dict(d) for d in snapshot["days"])
+            else:
+                day_stream = plan_days(req, attractions, restaurants, hotel, hotel_lat, hotel_lng, plan,
+                                       day_plan=plan_day_with_llm)
+            for day_result in day_stream:
+                day_results.append(day_result)
+                day, day_plan, plan_reason = day_result.day, day_result.plan, day_result.reason
+                start_time = day_result.start
+                progress_bar.progress(day / trip_days)
+                status_text.text(f"正在规划 Day {min(day + 1, trip_days)}/{trip_days} 行程...")
+                if day_result.llm_error:
+                    st.warning(f"AI规划失败，使用备用算法：{day_result.llm_error}")
             
-            with st.spinner(f"正在使用AI规划 Day{day} 行程..."):
-                from chains.day_plan_chain import plan_day_with_llm
-                
-                hotel_name = hotel["酒店名称"]
-                
-                # 使用大模型规划行程
-                try:
-                    llm_selection = plan_day_with_llm(
-                        day=day,
-                        destination=req.destination,
-                        personal_requirements=req.personal,
-                        avail_attractions=avail_attractions[:15],  # 限制数量避免token过多
-                        avail_restaurants=avail_restaurants[:15],
-                        hotel_name=hotel_name,
-                        adults=req.adults,
-                        children=req.children
-                    )
-                except Exception as e:
-                    st.warning(f"AI规划失败，使用备用算法：{e}")
-                    llm_selection = None
-                
-                # 生成实际行程
-                # 设置合理的开始时间（早上8点），而不是00:00:00
-                start_time = datetime.combine(req.start_date, datetime.min.time().replace(hour=8, minute=0)) + timedelta(days=day - 1)
-                day_plan, plan_reason = greedy_daily_schedule(
-                    hotel_lat, hotel_lng, hotel_name,
-                    avail_attractions,  # 剩余景点
-                    avail_restaurants,  # 剩余餐厅
-                    day_start=start_time,
-                    day=day,  # 真实日期编号
-                    hotel_price=hotel_price,  # 传递酒店价格
-                    adults=req.adults,  # 传递成人人数
-                    children=req.children,  # 传递儿童人数
-                    destination=req.destination,  # 传递目的地
-                    personal_requirements=req.personal,  # 传递个性化需求
-                    llm_selection=llm_selection  # 传递大模型选择
-                )
-                
                 all_days.append(day_plan)
-                
+                exporter.add_day(day_plan)
+            
                 # 改进行程展示
                 with st.container():
                     st.markdown(f"#### 📅 Day {day} - {start_time.strftime('%Y年%m月%d日')}")
-                    
+                
                     # 显示行程安排理由
                     if plan_reason:
                         st.info(f"💡 {plan_reason}")
-                    
+                
                     # 使用卡片样式展示行程
                     for idx, act in enumerate(day_plan.activities, 1):
                         # 修复时间显示：如果跨天，显示完整日期
@@ -532,7 +610,7 @@ elif st.session_state.page == "result":
                             end_str = act.end.strftime('%m-%d %H:%M')
                         else:
                             end_str = act.end.strftime('%H:%M')
-                        
+                    
                         # 根据活动类型选择图标
                         if act.category == "attraction":
                             icon = "🏞️"
@@ -542,60 +620,82 @@ elif st.session_state.page == "result":
                             icon = "🏨"
                         else:
                             icon = "📍"
-                        
+                    
                         # 显示活动
                         col1, col2 = st.columns([1, 10])
                         with col1:
                             st.markdown(f"**{start_str}**")
                         with col2:
                             transport_info = ""
-                            if act.transport_mode == "步行" and act.transport_duration > 0:
-                                transport_info = f" 🚶 {act.transport_duration}分钟"
+                            if act.transport_duration > 0:
+                                mode_icon = MODE_ICONS.get(act.transport_mode, "🚶")
+                                transport_info = f" {mode_icon} {act.transport_mode}{act.transport_duration}分钟"
+                                if act.transport_cost:
+                                    transport_info += f"（¥{act.transport_cost}）"
                             st.markdown(f"{icon} **{act.name}** {transport_info}")
                             if act.end != act.start:
                                 st.caption(f"预计结束时间：{end_str}")
-                
+            
                 st.markdown("---")
-                
-                # 每天剔除已选 → 下一天去不同地方
-                for a in day_plan.activities:
-                    if a.category == "attraction":
-                        # 找到对应的景点并移除
-                        found = None
-                        for x in avail_attractions:
-                            if x["name"] == a.name:
-                                found = x
-                                break
-                        if found:
-                            avail_attractions.remove(found)
-                    if a.category == "meal":
-                        # 从餐厅名称中提取餐厅名（去掉"午餐 - "或"晚餐 - "前缀）
-                        rest_name = a.name.replace("午餐 - ", "").replace("晚餐 - ", "")
-                        found = None
-                        for x in avail_restaurants:
-                            if x["name"] == rest_name:
-                                found = x
-                                break
-                        if found:
-                            avail_restaurants.remove(found)
-        
-        # 清除进度条
-        progress_bar.empty()
-        status_text.empty()
+    
+            # 清除进度条
+            progress_bar.empty()
+            status_text.empty()
+
+            # 全程地图：每天一条路线 + 浏览器端聚合的候选 POI，HTML 按行程内容哈希缓存
+            st.markdown("### 🗺️ 行程地图")
+            with st.spinner("正在绘制路线图..."):
+                import streamlit.components.v1 as components
+                from tools.map_view import map_html, trip_geojson
+
+                trip_geo = trip_geojson(all_days, attractions + restaurants,
+                                        hotel={"name": hotel["酒店名称"], "lat": hotel_lat, "lng": hotel_lng})
+                components.html(map_html(trip_geo), height=520)
         
-        # 9. 全日期 Markdown 导出（所有 Day）
-        st.markdown("---")
-        with st.spinner("正在生成行程单..."):
-            from tools.export_md import export_full_md
-
-            md_text = export_full_md(all_days)  # 传入「所有 Day」
-            st.download_button(
-                label="📥 下载全程行程单（Markdown）",
-                data=md_text,
-                file_name=f"{req.destination}行程单.md",
-                mime="text/markdown",
-                use_container_width=True
-            )
+            # 9. 全日期导出（所有 Day）：Markdown 单独下载，全部格式打包成 ZIP
+            st.markdown("---")
+            with st.spinner("正在生成行程单..."):
+                import io
+
+                exporter.finish()
+                md_text = exporter.read_text("md")
+                zip_buffer = io.BytesIO()
+                exporter.write_zip(zip_buffer, prefix=f"{req.destination}行程单/")
+                ics_bytes = exporter.read_bytes("ics")
+
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.download_button(
+                        label="📥 下载全程行程单（Markdown）",
+                        data=md_text,
+                        file_name=f"{req.destination}行程单.md",
+                        mime=MIME_TYPES["md"],
+                        use_container_width=True
+                    )
+                with col2:
+                    st.download_button(
+                        label="📆 导入日历（iCalendar）",
+                        data=ics_bytes,
+                        file_name=f"{req.destination}行程.ics",
+                        mime=MIME_TYPES["ics"],
+                        use_container_width=True
+                    )
+                with col3:
+                    st.download_button(
+                        label="🗂️ 全部格式（ZIP）",
+                        data=zip_buffer.getvalue(),
+                        file_name=f"{req.destination}行程单.zip",
+                        mime=MIME_TYPES["zip"],
+                        use_container_width=True
+                    )
+                # PDF 在后台按内容哈希生成并落盘缓存，页面不等它；下载按钮稍后填进这个占位
+                from tools.export_pdf import submit_pdf
+
+                pdf_job = submit_pdf(md_text)
+                pdf_slot = st.empty()
+                pdf_slot.caption("⏳ 正在生成 PDF 行程单...")
+        finally:
+            exporter.close()
 
         # 12. 总花费汇总（字段已存在）
         st.markdown("---")
@@ -649,26 +749,57 @@ elif st.session_state.page == "result":
                 st.success(f"✅ 预算充足，还有 ¥{remaining} 可用于额外消费。")
             else:
                 st.info(f"💡 预算使用率 {budget_usage:.1f}%，建议保留一些备用资金。")
-    # # 14. 一键 PDF 导出（纯 Python，无系统依赖）
-    # with st.spinner("正在生成 PDF..."):
-    #     from weasyprint import HTML  # 纯 Python，无 wkhtmltopdf
-    #     from tools.export_pdf import export_pdf
-    #
-    #     pdf_bytes = export_pdf(md_text)  # 前面已生成 md_text
-    #     st.download_button(
-    #         label="下载全程行程单（PDF）",
-    #         data=pdf_bytes,
-    #         file_name=f"{req.destination}行程单.pdf",
-    #         mime="application/pdf",
-    #         key=f"download_pdf_{day}"  # 唯一 key
-    #     )
-
-# 9. 地图可视化（先跳过，后续再开发）
-# with st.spinner("正在绘制路线图..."):
-#     from tools.map_view import draw_route
-#     map_obj = draw_route(hotel, attractions, restaurants, hotel_lat, hotel_lng)
-#     st.write("**🗺️ 真实路线图**")
-#     st_folium(map_obj, width=700, height=500)
+
+        # 预算点评：页面内容都渲染完之后再取结果，最多等几秒；失败或超时就保留本地说明
+        if budget_explanation is not None:
+            try:
+                explanation = budget_explanation.result(timeout=float(os.getenv("BUDGET_EXPLAIN_WAIT", "3")))
+                if explanation:
+                    budget_note.info(f"💡 **分配说明**：{plan.reason}\n\n🤖 **AI 点评**：{explanation}")
+            except Exception:
+                pass
+
+        # 行程快照：整份结果存成内容寻址的快照，给出永久链接；之后的重跑（如点赞景点）直接回放快照
+        if not snapshot:
+            try:
+                from tools.snapshot_store import store as snapshot_store
+
+                snapshot_id = snapshot_store.save({
+                    "request": req.model_dump(mode="json"),
+                    "city": result,
+                    "city_intro": city_intro,
+                    "attractions": attractions_raw,
+                    "restaurants": restaurants_raw,
+                    "hotels": hotels,
+                    "hotel_index": selected_idx,
+                    "budget": plan.model_dump(),
+                    "budget_explanation": explanation,
+                    "days": [day_to_dict(d) for d in day_results],
+                }, request_key=request_key(req) if req.deterministic else None)
+                session_registry.put(SESSION_ID, "snapshot", load_snapshot(snapshot_id))
+                st.session_state.snapshot_id = snapshot_id
+                st.query_params["snapshot"] = snapshot_id
+            except Exception as e:
+                st.caption(f"行程快照保存失败：{e}")
+        if st.session_state.get("snapshot_id"):
+            st.markdown(f"🔗 **永久链接**：[?snapshot={st.session_state.snapshot_id}](?snapshot={st.session_state.snapshot_id})"
+                        "（收藏或分享此链接，可随时秒开这份行程）")
+
+        # 14. PDF 导出：同样放到最后取结果；超时就提示稍后刷新（届时直接命中磁盘缓存）
+        try:
+            pdf_bytes = pdf_job.result(timeout=float(os.getenv("PDF_EXPORT_WAIT", "10")))
+            pdf_slot.download_button(
+                label="📄 下载全程行程单（PDF）",
+                data=pdf_bytes,
+                file_name=f"{req.destination}行程单.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
+        except TimeoutError:
+            pdf_slot.caption("⏳ PDF 仍在后台生成，稍后刷新页面即可下载")
+        except Exception as e:
+            pdf_slot.caption(f"PDF 导出不可用：{e}")
+
 #     # 9. 生成 Day1 行程（只算 Day1 示例）
 #     with st.spinner("正在排程 Day1..."):
 #         day1 = greedy_daily_schedule(
@@ -0,0 +1,246 @@
+"""
+路线规划基准：在合成城市上跑 chains.trip_pipeline.plan_days（本地贪心排程，不调大模型），
+分阶段计时并给出行程质量，结果写成 JSON，便于不同提交之间对比。
+
+分阶段计时（毫秒，取多次运行的中位数和最小值）：
+- index       BM25 索引 + 营业时间索引的构建
+- cluster     按天地理分组（cluster_days）
+- candidates  每天的候选选取与补齐（day_candidates）
+- distance    出行时间矩阵（本地估算，逐对 Haversine）
+- schedule    greedy_daily_schedule 自身，不含 distance
+- prune       plan_days 里的跨天剔除等簿记（总耗时减去以上各项）
+- total       整个 plan_days
+另外单独测 score_activity 的单次耗时（微秒，逐个候选现算距离）。
+
+质量指标：步行分钟、交通总分钟、空等分钟（相邻活动之间的空档）、路程 km、交通费、跨天重复的 POI 数。
+
+python -m benchmarks.bench_route_planner                                # 默认规模 20..10000，三种城市
+python -m benchmarks.bench_route_planner --sizes 20,200 --kinds uniform --repeat 3
+python -m benchmarks.bench_route_planner --compare benchmarks/results/route_planner-abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from benchmarks.synthetic_city import GENERATORS
+
+PHASES = ("index", "cluster", "candidates", "distance", "schedule", "prune", "total")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_SIZES = "20,100,500,2000,10000"
+REGRESSION_THRESHOLD = 0.2   # 慢 20% 以上算回退
+REGRESSION_MIN_MS = 1.0      # 绝对差不到 1ms 的波动不计
+
+
+# ---------- 计时 ----------
+class _Clock:
+    def __init__(self):
+        self.spent = {p: 0.0 for p in PHASES}
+
+    def wrap(self, phase: str, fn):
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.spent[phase] += time.perf_counter() - t0
+        return timed
+
+
+@contextmanager
+def _instrumented(clock: _Clock):
+    """临时替换 plan_days 在函数内导入的各个步骤，结束后原样恢复"""
+    from tools import day_clustering, opening_hours, poi_retriever, route_planner, travel_time
+
+    local = travel_time.LocalProvider()
+
+    class TimedProvider(travel_time.TravelTimeProvider):
+        mode = local.mode
+        matrix = staticmethod(clock.wrap("distance", local.matrix))
+
+    patches = [
+        (day_clustering, "cluster_days", clock.wrap("cluster", day_clustering.cluster_days)),
+        (day_clustering, "day_candidates", clock.wrap("candidates", day_clustering.day_candidates)),
+        (route_planner, "greedy_daily_schedule", clock.wrap("schedule", route_planner.greedy_daily_schedule)),
+        (poi_retriever, "PoiRetriever", clock.wrap("index", poi_retriever.PoiRetriever)),
+        (opening_hours, "OpeningIndex", clock.wrap("index", opening_hours.OpeningIndex)),
+        (travel_time, "provider", TimedProvider()),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    try:
+        for module, name, value in patches:
+            setattr(module, name, value)
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+# ---------- 质量 ----------
+def plan_quality(days) -> dict:
+    walk = transport = idle = cost = 0
+    meters = 0
+    seen, repeats = set(), 0
+    for plan in days:
+        acts = plan.activities
+        for act in acts:
+            transport += act.transport_duration
+            meters += act.transport_distance
+            cost += act.transport_cost
+            if act.transport_mode == "步行":
+                walk += act.transport_duration
+            if act.category in ("attraction", "meal"):
+                repeats += act.name in seen
+                seen.add(act.name)
+        for prev, nxt in zip(acts, acts[1:]):
+            idle += max(0, int((nxt.start - prev.end).total_seconds() // 60))
+    return {"walk_minutes": walk, "transport_minutes": transport, "idle_minutes": idle,
+            "km": round(meters / 1000, 2), "transport_cost": cost, "repeated_pois": repeats}
+
+
+# ---------- 单个用例 ----------
+def _request(days: int):
+    from models.trip_schema import TripRequest
+
+    start = date(2025, 5, 6)  # 固定日期（周二），营业时间判断每次一致
+    return TripRequest(departure="上海", destination="苏州", start_date=start, end_date=start + timedelta(days=days - 1),
+                       adults=2, children=1, budget=3000 * days, personal="喜欢园林和本帮菜", deterministic=True)
+
+
+def _score_us(attractions: List[dict], hotel: dict, limit: int = 2000) -> float:
+    """score_activity 单次耗时（微秒）：从酒店出发给前 limit 个景点打分"""
+    from tools.route_planner import score_activity
+
+    pois = attractions[:limit]
+    if not pois:
+        return 0.0
+    now = datetime(2025, 5, 6, 9, 0)
+    t0 = time.perf_counter()
+    for poi in pois:
+        score_activity(hotel["lat"], hotel["lng"], now, 180, poi)
+    return (time.perf_counter() - t0) / len(pois) * 1e6
+
+
+def run_case(kind: str, n: int, days: int = 3, repeat: int = 5, budget_s: float = 20.0, seed: int = 0) -> dict:
+    """同一用例至少跑 1 次、最多 repeat 次，累计超过 budget_s 秒就不再重复"""
+    from chains.trip_pipeline import plan_days
+    from tools.budget_allocator import allocate_budget
+
+    attractions, restaurants, hotel = GENERATORS[kind](n, seed)
+    req = _request(days)
+    budget = allocate_budget(req.budget, days, req.adults, req.children, hotel_price=hotel["价格数值"], city=req.destination)
+
+    runs, quality = [], None
+    started = time.perf_counter()
+    while len(runs) < max(1, repeat) and (not runs or time.perf_counter() - started < budget_s):
+        clock = _Clock()
+        with _instrumented(clock):
+            t0 = time.perf_counter()
+            result = [d.plan for d in plan_days(req, attractions, restaurants, hotel, hotel["lat"], hotel["lng"], budget)]
+            clock.spent["total"] = time.perf_counter() - t0
+        clock.spent["schedule"] -= clock.spent["distance"]  # distance 发生在 schedule 里面
+        clock.spent["prune"] = clock.spent["total"] - sum(clock.spent[p] for p in PHASES if p not in ("prune", "total"))
+        runs.append(clock.spent)
+        quality = quality or plan_quality(result)
+
+    timings = {p: {"median": round(statistics.median(r[p] for r in runs) * 1000, 3),
+                   "min": round(min(r[p] for r in runs) * 1000, 3)} for p in PHASES}
+    return {"kind": kind, "n": n, "days": days, "runs": len(runs), "timings_ms": timings,
+            "score_activity_us": round(_score_us(attractions, hotel), 3), "quality": quality}
+
+
+# ---------- 结果与对比 ----------
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """逐用例、逐阶段比较中位数；返回回退描述（质量指标变化也列出来，供人工判断）"""
+    base = {(c["kind"], c["n"], c["days"]): c for c in baseline.get("cases", [])}
+    problems = []
+    for case in current["cases"]:
+        old = base.get((case["kind"], case["n"], case["days"]))
+        if old is None:
+            continue
+        label = f"{case['kind']}/n={case['n']}"
+        for phase in PHASES:
+            new_ms, old_ms = case["timings_ms"][phase]["median"], old["timings_ms"][phase]["median"]
+            if new_ms - old_ms > REGRESSION_MIN_MS and new_ms > old_ms * (1 + threshold):
+                problems.append(f"{label} {phase}: {old_ms:.1f}ms → {new_ms:.1f}ms（×{new_ms / max(old_ms, 1e-9):.2f}）")
+        if case["quality"] != old["quality"]:
+            changed = {k: (old["quality"].get(k), v) for k, v in case["quality"].items() if old["quality"].get(k) != v}
+            problems.append(f"{label} 行程质量变化：{changed}")
+    return problems
+
+
+def format_table(cases: List[dict]) -> str:
+    head = f"{'城市':<11}{'n':>6} " + "".join(f"{p:>11}" for p in PHASES) + f"{'score µs':>10}{'步行':>6}{'空等':>6}{'km':>8}"
+    lines = [head]
+    for c in cases:
+        t, q = c["timings_ms"], c["quality"]
+        lines.append(f"{c['kind']:<11}{c['n']:>6} " + "".join(f"{t[p]['median']:>11.1f}" for p in PHASES)
+                     + f"{c['score_activity_us']:>10.1f}{q['walk_minutes']:>6}{q['idle_minutes']:>6}{q['km']:>8.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="路线规划基准（合成城市）")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="候选 POI 总数，逗号分隔（景点、餐厅各一半）")
+    parser.add_argument("--kinds", default=",".join(GENERATORS), help="城市形态：" + "/".join(GENERATORS))
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例最多重复次数")
+    parser.add_argument("--budget", type=float, default=20.0, help="每个用例的重复时间上限（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/route_planner-<commit>.json")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比，有回退时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    cases = []
+    for kind in [k.strip() for k in args.kinds.split(",") if k.strip()]:
+        if kind not in GENERATORS:
+            parser.error(f"未知城市形态：{kind}")
+        for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+            case = run_case(kind, n, days=args.days, repeat=args.repeat, budget_s=args.budget, seed=args.seed)
+            cases.append(case)
+            print(f"{kind:<11}{n:>6}  total {case['timings_ms']['total']['median']:.1f}ms（{case['runs']} 次）", flush=True)
+
+    commit = _git_commit()
+    report = {
+        "meta": {"commit": commit, "created": datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "machine": platform.machine(), "platform": platform.platform(),
+                 "days": args.days, "seed": args.seed},
+        "cases": cases,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"route_planner-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(format_table(cases))
+    print(f"结果已写入 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.threshold)
+        for line in problems:
+            print("⚠️ " + line)
+        if problems:
+            return 1
+        print("与基线相比没有回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+合成城市：生成排程用的 POI 字典（与 chains.trip_pipeline.normalize_pois 的输出同形），供基准测试使用。
+- uniform     均匀撒点的方形城区（约 11 km × 11 km）
+- clustered   若干个景区/商圈，POI 高斯分布在簇中心附近
+- waterfront  沿一条弯曲的江岸/海岸线狭长分布的城市
+景点、餐厅各占一半；开放时间混入闭馆日、全天开放、跨午夜营业等写法，覆盖营业时间索引的各条分支。
+同样的 (kind, n, seed) 总是生成完全相同的数据。
+"""
+import math
+import random
+from typing import Callable, Dict, List, Tuple
+
+CENTER = (31.30, 120.62)  # 城市中心（lat, lng）
+
+ATTRACTION_HOURS = ("08:30-17:00",) * 8 + ("周二至周日 09:00-17:00，周一闭馆", "全天开放")
+RESTAURANT_HOURS = ("10:00-21:30",) * 7 + ("11:00-14:00,17:00-21:00", "17:00-次日02:00", "暂无")
+ATTRACTION_TYPES = ("园林", "博物馆", "古镇", "公园", "寺庙", "历史街区")
+CUISINES = ("本帮菜", "苏帮菜", "面馆", "火锅", "小吃", "西餐")
+
+City = Tuple[List[dict], List[dict], dict]  # (景点, 餐厅, 酒店)
+
+
+def _attraction(i: int, lat: float, lng: float, r: random.Random) -> dict:
+    kind = r.choice(ATTRACTION_TYPES)
+    return {"name": f"景点{i}", "lat": lat, "lng": lng, "category": "attraction",
+            "门票数值": r.choice((0, 0, 30, 40, 60, 80, 120)), "评分": round(r.uniform(3.6, 4.9), 1),
+            "景点类型": kind, "标签/特色": kind, "推荐描述": "", "开放时间": r.choice(ATTRACTION_HOURS), "平台信息": {}}
+
+
+def _restaurant(i: int, lat: float, lng: float, r: random.Random) -> dict:
+    return {"name": f"餐厅{i}", "lat": lat, "lng": lng, "category": "restaurant",
+            "人均数值": r.choice((30, 50, 80, 120, 200)), "评分": round(r.uniform(3.6, 4.9), 1),
+            "菜系/标签": r.choice(CUISINES), "推荐描述": "", "营业时间": r.choice(RESTAURANT_HOURS), "平台信息": {}}
+
+
+def _build(points: List[Tuple[float, float]], r: random.Random, hotel: Tuple[float, float]) -> City:
+    half = len(points) // 2
+    attractions = [_attraction(i, lat, lng, r) for i, (lat, lng) in enumerate(points[:half])]
+    restaurants = [_restaurant(i, lat, lng, r) for i, (lat, lng) in enumerate(points[half:])]
+    return attractions, restaurants, {"酒店名称": "基准酒店", "lat": hotel[0], "lng": hotel[1], "价格数值": 300}
+
+
+def uniform_city(n: int, seed: int = 0) -> City:
+    r = random.Random(f"uniform-{n}-{seed}")
+    points = [(CENTER[0] + r.uniform(-0.05, 0.05), CENTER[1] + r.uniform(-0.05, 0.05)) for _ in range(n)]
+    r.shuffle(points)
+    return _build(points, r, CENTER)
+
+
+def clustered_city(n: int, seed: int = 0) -> City:
+    r = random.Random(f"clustered-{n}-{seed}")
+    k = max(2, round(math.sqrt(n) / 2))
+    centers = [(CENTER[0] + r.uniform(-0.06, 0.06), CENTER[1] + r.uniform(-0.06, 0.06)) for _ in range(k)]
+    points = []
+    for _ in range(n):
+        lat, lng = r.choice(centers)
+        points.append((lat + r.gauss(0, 0.006), lng + r.gauss(0, 0.006)))
+    return _build(points, r, centers[0])
+
+
+def waterfront_city(n: int, seed: int = 0) -> City:
+    """沿 S 形岸线长约 20 km、纵深几百米的狭长城市，酒店在岸线中段"""
+    r = random.Random(f"waterfront-{n}-{seed}")
+
+    def shore(t: float) -> Tuple[float, float]:
+        return CENTER[0] + 0.18 * (t - 0.5), CENTER[1] + 0.015 * math.sin(2 * math.pi * t)
+
+    points = []
+    for _ in range(n):
+        lat, lng = shore(r.random())
+        points.append((lat + r.gauss(0, 0.001), lng + abs(r.gauss(0, 0.003))))  # 只往陆地一侧散开
+    return _build(points, r, shore(0.5))
+
+
+GENERATORS: Dict[str, Callable[[int, int], City]] = {
+    "uniform": uniform_city,
+    "clustered": clustered_city,
+    "waterfront": waterfront_city,
+}
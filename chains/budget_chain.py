@@ -1,36 +1,12 @@
-import os
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from langchain_openai import ChatOpenAI  # 新路径
 from langchain_classic.prompts import ChatPromptTemplate
 from langchain_classic.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+from langchain_core.runnables import RunnableLambda
 
-try:
-    import streamlit as st  # type: ignore
-except Exception:
-    st = None  # type: ignore
-
-
-def _get_secret(name: str) -> str | None:
-    """统一从环境变量 / Streamlit secrets 读取敏感信息。"""
-    value = os.getenv(name)
-    if value:
-        return value
-    if st is not None:
-        try:
-            return st.secrets.get(name)  # type: ignore[attr-defined]
-        except Exception:
-            return None
-    return None
-
-
-class BudgetPlan(BaseModel):
-    accommodation: int = Field(description="住宿费用（元）")
-    restaurant: int = Field(description="餐饮费用（元）")
-    transport: int = Field(description="市内交通费用（元）")
-    attraction: int = Field(description="门票费用（元）")
-    contingency: int = Field(description="备用金（元）")
-    reason: str = Field(description="一句话理由")
+from chains.llm_gateway import get_chat_model, via_gateway
+from chains.structured_output import coerce_int, extract_payload, repair_json, structured_llm
+from models.budget_plan import BudgetPlan
 
 
 parser = PydanticOutputParser(pydantic_object=BudgetPlan)
@@ -43,18 +19,52 @@ prompt = ChatPromptTemplate.from_messages(
         ),
         (
             "user",
-            """出发地：{departure}，目的地：{destination}，成人{adults} 儿童{children}，{start_date} 至 {end_date}，总预算 {budget} 元。请严格按以下格式返回：{format_instructions}""",
+            """出发地：{departure}，目的地：{destination}，成人{adults} 儿童{children}，{start_date} 至 {end_date}，总预算 {budget} 元。请严格按以下 JSON 格式返回：{format_instructions}""",
         ),
     ]
 )
 
-_DEEPSEEK_API_KEY = _get_secret("DEEPSEEK_API_KEY")
+llm = get_chat_model(temperature=0)
+
+BUDGET_FIELDS = ("accommodation", "restaurant", "transport", "attraction", "contingency")
+
+
+def parse_budget(output) -> BudgetPlan:
+    """本地修复：JSON 纠错 + "1,200元" 这类数值转整数，缺理由时留空"""
+    data = repair_json(extract_payload(output))
+    values = {}
+    for field in BUDGET_FIELDS:
+        value = coerce_int(data.get(field))
+        if value is None:
+            raise ValueError(f"预算字段缺失：{field}")
+        values[field] = value
+    return BudgetPlan(reason=str(data.get("reason") or ""), **values)
+
+
+budget_chain = (prompt | via_gateway(structured_llm(llm, BudgetPlan), name="budget") | RunnableLambda(parse_budget)).with_retry(
+    retry_if_exception_type=(ValueError,), stop_after_attempt=2
+)
 
-llm = ChatOpenAI(
-    temperature=0,
-    model="deepseek-chat",
-    api_key=_DEEPSEEK_API_KEY,
-    base_url="https://api.deepseek.com",
+# ---------- 预算说明（可选的异步增强） ----------
+# 预算数字由 tools.budget_allocator 本地算出；大模型只负责在后台补一段说明，页面不等它
+explain_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", "你是资深旅行规划师，用一两句话点评下面的预算分配是否合理，并给出一条实用建议。"),
+        (
+            "user",
+            """目的地：{destination}，成人{adults} 儿童{children}，共 {days} 天，总预算 {budget} 元。
+分配：住宿 {accommodation}，餐饮 {restaurant}，交通 {transport}，门票 {attraction}，备用 {contingency}（元）。直接输出点评内容。""",
+        ),
+    ]
 )
 
-budget_chain = prompt | llm | parser
\ No newline at end of file
+explain_chain = explain_prompt | via_gateway(llm, name="budget_explain")
+
+_explain_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="budget-explain")
+
+
+def explain_budget(plan: BudgetPlan, destination: str, adults: int, children: int, days: int, budget: int) -> Future:
+    """后台生成预算说明，立即返回 Future（结果为字符串）；调用方自行决定等多久、失败时是否忽略"""
+    payload = {"destination": destination, "adults": adults, "children": children, "days": days, "budget": budget,
+               **plan.model_dump(include=set(BUDGET_FIELDS))}
+    return _explain_pool.submit(lambda: explain_chain.invoke(payload).content.strip())
@@ -1,25 +1,7 @@
-import os
-
-from langchain_openai import ChatOpenAI
 from langchain_classic.prompts import ChatPromptTemplate
 
-try:
-    import streamlit as st  # type: ignore
-except Exception:
-    st = None  # type: ignore
-
-
-def _get_secret(name: str) -> str | None:
-    value = os.getenv(name)
-    if value:
-        return value
-    if st is not None:
-        try:
-            return st.secrets.get(name)  # type: ignore[attr-defined]
-        except Exception:
-            return None
-    return None
-
+from chains.llm_gateway import get_chat_model, via_gateway
+from tools import city_pack, ttl_cache
 
 prompt = ChatPromptTemplate.from_messages([
     ("system", "你是一位资深的旅游文化专家，擅长用简洁优美的语言介绍城市。"),
@@ -32,25 +14,25 @@ prompt = ChatPromptTemplate.from_messages([
 要求：总字数不超过200字，语言简洁优美，突出城市特色。直接输出简介内容，不要添加任何前缀或格式说明。"""),
 ])
 
-_DEEPSEEK_API_KEY = _get_secret("DEEPSEEK_API_KEY")
+llm = get_chat_model(temperature=0.7)
 
-llm = ChatOpenAI(
-    temperature=0.7,
-    model="deepseek-chat",
-    api_key=_DEEPSEEK_API_KEY,
-    base_url="https://api.deepseek.com",
-)
-
-city_intro_chain = prompt | llm
+city_intro_chain = prompt | via_gateway(llm, name="city_intro")
 
 
 def get_city_introduction(city: str) -> str:
-    """获取城市简介"""
+    """获取城市简介（优先读预计算城市包）"""
+    packed = city_pack.lookup_intro(city)
+    if packed:
+        return packed
     try:
-        result = city_intro_chain.invoke({"city": city})
-        content = result.content.strip()
-        if len(content) > 200:
-            content = content[:200] + "..."
-        return content
+        return ttl_cache.cache.cached_call("city_intro", city, lambda: _generate_intro(city), ttl=ttl_cache.INTRO_TTL)
     except Exception as e:
-        return f"无法生成城市简介：{str(e)}"
\ No newline at end of file
+        return f"无法生成城市简介：{str(e)}"
+
+
+def _generate_intro(city: str) -> str:
+    result = city_intro_chain.invoke({"city": city})
+    content = result.content.strip()
+    if len(content) > 200:
+        content = content[:200] + "..."
+    return content
\ No newline at end of file
@@ -1,30 +1,13 @@
-import os
+import hashlib
 from typing import List
 
-from langchain_openai import ChatOpenAI
 from langchain_classic.prompts import ChatPromptTemplate
 from langchain_classic.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
-try:
-    # 可选引入，用于在 Streamlit Cloud 中从 secrets 读取密钥
-    import streamlit as st  # type: ignore
-except Exception:  # 本地非 Streamlit 环境时忽略
-    st = None  # type: ignore
-
-
-def _get_secret(name: str) -> str | None:
-    """统一从环境变量 / Streamlit secrets 读取敏感信息，避免明文写死在代码里。"""
-    value = os.getenv(name)
-    if value:
-        return value
-    if st is not None:
-        try:
-            # 在本地运行时 st.secrets 可能不存在
-            return st.secrets.get(name)  # type: ignore[attr-defined]
-        except Exception:
-            return None
-    return None
+from chains.llm_gateway import get_chat_model, via_gateway
+from chains.structured_output import coerce_int, extract_payload, nearest_name, repair_json, structured_llm
+from tools import ttl_cache
 
 
 class SelectedAttraction(BaseModel):
@@ -46,25 +29,45 @@ class DayPlanSelection(BaseModel):
     overall_reason: str = Field(description="整体行程安排理由")
 
 
-parser = PydanticOutputParser(pydantic_object=DayPlanSelection)
+class PickedCandidate(BaseModel):
+    id: int = Field(description="候选编号（列表中方括号内的数字）")
+    reason: str = Field(description="选择理由")
+
+
+class DayPlanIdSelection(BaseModel):
+    """大模型实际返回的结构：用整数编号引用候选，省 token 且无需模糊匹配名称"""
+    morning_attraction: PickedCandidate = Field(description="上午景点（景点编号）")
+    lunch: PickedCandidate = Field(description="午餐餐厅（餐厅编号）")
+    afternoon_attraction: PickedCandidate = Field(description="下午景点（景点编号）")
+    dinner: PickedCandidate = Field(description="晚餐餐厅（餐厅编号）")
+    overall_reason: str = Field(description="整体行程安排理由")
+
+
+parser = PydanticOutputParser(pydantic_object=DayPlanIdSelection)
+
+MAX_CANDIDATES = 15  # 限制数量避免token过多
+MAX_RETRIES = 1      # 本地修复失败后最多再请求一次
+
+
+def format_attractions(avail_attractions: List[dict]) -> str:
+    return "\n".join([
+        f"[{i}] {attr['name']} (评分: {attr.get('评分', 'N/A')}, 门票: {attr.get('门票', '免费')}, 距离: {attr.get('距离(米)', 0)}米)"
+        for i, attr in enumerate(avail_attractions[:MAX_CANDIDATES])
+    ])
+
+
+def format_restaurants(avail_restaurants: List[dict]) -> str:
+    return "\n".join([
+        f"[{i}] {rest['name']} (评分: {rest.get('评分', 'N/A')}, 人均: {rest.get('人均(元)', 'N/A')}, 菜系: {rest.get('菜系/标签', 'N/A')}, 距离: {rest.get('距离(米)', 0)}米)"
+        for i, rest in enumerate(avail_restaurants[:MAX_CANDIDATES])
+    ])
+
 
 def create_day_plan_prompt(day: int, destination: str, personal_requirements: str, 
                           avail_attractions: List[dict], avail_restaurants: List[dict],
                           hotel_name: str, adults: int, children: int):
     """创建每日行程规划的提示词"""
     
-    # 格式化景点列表
-    attractions_text = "\n".join([
-        f"- {attr['name']} (评分: {attr.get('评分', 'N/A')}, 门票: {attr.get('门票', '免费')}, 距离: {attr.get('距离(米)', 0)}米)"
-        for attr in avail_attractions[:15]  # 限制数量避免token过多
-    ])
-    
-    # 格式化餐厅列表
-    restaurants_text = "\n".join([
-        f"- {rest['name']} (评分: {rest.get('评分', 'N/A')}, 人均: {rest.get('人均(元)', 'N/A')}, 菜系: {rest.get('菜系/标签', 'N/A')}, 距离: {rest.get('距离(米)', 0)}米)"
-        for rest in avail_restaurants[:15]  # 限制数量避免token过多
-    ])
-    
     prompt = ChatPromptTemplate.from_messages([
         ("system", """你是资深旅行规划师，擅长根据用户需求、景点特色、餐厅口碑、距离等因素，为游客规划合理的每日行程。
 
@@ -82,7 +85,7 @@ def create_day_plan_prompt(day: int, destination: str, personal_requirements: st
 - 考虑价格合理性
 - 确保行程流畅，不走回头路
 
-请为每个选择提供理由，并给出整体行程安排的理由。"""),
+候选用方括号内的编号引用（id 字段填编号，不要填名称）。请为每个选择提供理由，并给出整体行程安排的理由，只输出 JSON。"""),
         ("user", """目的地：{destination}
 第{day}天行程规划
 
@@ -96,61 +99,88 @@ def create_day_plan_prompt(day: int, destination: str, personal_requirements: st
 可选餐厅列表：
 {restaurants_text}
 
-请严格按以下格式返回：{format_instructions}""")
+请严格按以下 JSON 格式返回：{format_instructions}""")
     ])
     
     return prompt
 
 
-_DEEPSEEK_API_KEY = _get_secret("DEEPSEEK_API_KEY")
-if not _DEEPSEEK_API_KEY:
-    # 不在这里直接抛异常，以免整个应用启动失败，由调用方捕获更友好地提示
-    # 在没有配置密钥时，后续调用大模型会报错并在界面显示提示信息
-    pass
-
-llm = ChatOpenAI(
-    temperature=0.7,  # 稍微提高温度以获得更多创意
-    model="deepseek-chat",
-    api_key=_DEEPSEEK_API_KEY,
-    base_url="https://api.deepseek.com",
-)
+def _resolve_pick(item, candidates: List[dict]) -> tuple[str, str]:
+    """把一个选择项解析成 (候选名称, 理由)；编号优先，缺失或越界时按名称就近匹配"""
+    names = [c["name"] for c in candidates[:MAX_CANDIDATES]]
+    if isinstance(item, dict):
+        raw_id, name, reason = item.get("id"), item.get("name"), str(item.get("reason") or "")
+    else:
+        raw_id, name, reason = item, item, ""
+    # 只有纯数字（或 "[3]" 这种写法）才当作编号，避免把 "7天酒店" 误读成 7 号
+    idx = coerce_int(raw_id)
+    if idx is not None and 0 <= idx < len(names) and (not isinstance(raw_id, str) or raw_id.strip(" []").isdigit()):
+        return names[idx], reason
+    matched = nearest_name(name, names)
+    if matched is None:
+        raise ValueError(f"无法匹配候选：{item}")
+    return matched, reason
+
+
+def resolve_selection(payload, avail_attractions: List[dict], avail_restaurants: List[dict]) -> DayPlanSelection:
+    """本地修复并把编号映射回候选名称，失败抛 ValueError"""
+    data = repair_json(payload)
+    morning, morning_reason = _resolve_pick(data.get("morning_attraction"), avail_attractions)
+    lunch, lunch_reason = _resolve_pick(data.get("lunch"), avail_restaurants)
+    afternoon, afternoon_reason = _resolve_pick(data.get("afternoon_attraction"), avail_attractions)
+    dinner, dinner_reason = _resolve_pick(data.get("dinner"), avail_restaurants)
+    return DayPlanSelection(
+        morning_attraction=SelectedAttraction(name=morning, reason=morning_reason),
+        lunch=SelectedRestaurant(name=lunch, meal_type="午餐", reason=lunch_reason),
+        afternoon_attraction=SelectedAttraction(name=afternoon, reason=afternoon_reason),
+        dinner=SelectedRestaurant(name=dinner, meal_type="晚餐", reason=dinner_reason),
+        overall_reason=str(data.get("overall_reason") or ""),
+    )
+
+
+# 稍微提高温度以获得更多创意；实例由网关统一管理，缺少密钥时在调用时报错并由调用方提示
+llm = get_chat_model(temperature=0.7)
+# 可复现模式：温度 0 + 固定种子，结果再按提示词缓存，保证相同输入得到相同选择
+deterministic_llm = get_chat_model(temperature=0, seed=0)
 
 def plan_day_with_llm(day: int, destination: str, personal_requirements: str,
                      avail_attractions: List[dict], avail_restaurants: List[dict],
-                     hotel_name: str, adults: int, children: int):
-    """使用大模型规划一天的行程"""
+                     hotel_name: str, adults: int, children: int, deterministic: bool = False):
+    """使用大模型规划一天的行程，返回名称已对齐候选列表的 DayPlanSelection"""
     
     prompt = create_day_plan_prompt(day, destination, personal_requirements,
                                    avail_attractions, avail_restaurants,
                                    hotel_name, adults, children)
     
-    chain = prompt | llm | parser
-    
-    result = chain.invoke({
+    model = deterministic_llm if deterministic else llm
+    name = "day_plan_deterministic" if deterministic else "day_plan"
+    chain = prompt | via_gateway(structured_llm(model, DayPlanIdSelection), name=name)
+    inputs = {
         "day": day,
         "destination": destination,
         "personal_requirements": personal_requirements or "无特殊要求",
-        "attractions_text": "\n".join([
-            f"- {attr['name']} (评分: {attr.get('评分', 'N/A')}, 门票: {attr.get('门票', '免费')}, 距离: {attr.get('距离(米)', 0)}米)"
-            for attr in avail_attractions[:15]
-        ]),
-        "restaurants_text": "\n".join([
-            f"- {rest['name']} (评分: {rest.get('评分', 'N/A')}, 人均: {rest.get('人均(元)', 'N/A')}, 菜系: {rest.get('菜系/标签', 'N/A')}, 距离: {rest.get('距离(米)', 0)}米)"
-            for rest in avail_restaurants[:15]
-        ]),
+        "attractions_text": format_attractions(avail_attractions),
+        "restaurants_text": format_restaurants(avail_restaurants),
         "hotel_name": hotel_name,
         "adults": adults,
         "children": children,
         "format_instructions": parser.get_format_instructions()
-    })
-    
-    return result
-
-
-
-
-
-
-
-
-
+    }
+
+    def _invoke() -> DayPlanSelection:
+        last_error = None
+        for _ in range(MAX_RETRIES + 1):
+            output = chain.invoke(inputs)
+            try:
+                # 先本地修复，修不好才花一次重试
+                return resolve_selection(extract_payload(output), avail_attractions, avail_restaurants)
+            except ValueError as e:
+                last_error = e
+        raise ValueError(f"大模型输出无法解析：{last_error}")
+
+    if not deterministic:
+        return _invoke()
+    key = hashlib.sha256(prompt.invoke(inputs).to_string().encode("utf-8")).hexdigest()
+    cached = ttl_cache.cache.cached_call("day_plan", key, lambda: _invoke().model_dump(),
+                                     ttl=ttl_cache.DAY_PLAN_TTL, stale_ttl=0)
+    return DayPlanSelection(**cached)
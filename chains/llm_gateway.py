@@ -0,0 +1,258 @@
+"""
+进程级异步大模型网关：
+- 所有 chain 共用同一组 ChatOpenAI 实例，统一从这里发请求
+- 并发上限：同时在途的上游请求不超过 LLM_MAX_CONCURRENCY
+- 单飞（single-flight）：相同请求在途时只发一次上游调用，结果共享给所有等待者
+- 优先级通道：interactive（用户交互）优先于 batch（预生成/预热），batch 永远留一个并发位给 interactive
+- 背压：排队数超过 LLM_MAX_QUEUE 时，batch 直接拒绝，interactive 最多等待 LLM_QUEUE_TIMEOUT 秒
+- 容错（tools.resilience）：所有用途共用一个熔断器，DeepSeek 连续出错时直接失败；
+  LLM_HEDGE=1 时 interactive 请求超过该用途近期 p95 仍未返回会发一份对冲请求（默认关闭：对冲要多付一份 token）；
+  对冲副本同样要占一个并发位，排在已排队的 interactive 请求之后，不会突破 LLM_MAX_CONCURRENCY
+网关跑在独立的后台事件循环线程上，Streamlit 的同步代码通过 invoke() 阻塞等待结果。
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import hashlib
+import os
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Optional
+
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_openai import ChatOpenAI
+
+from tools import resilience
+
+try:
+    import streamlit as st  # type: ignore
+except Exception:
+    st = None  # type: ignore
+
+
+def _get_secret(name: str) -> str | None:
+    """统一从环境变量 / Streamlit secrets 读取敏感信息。"""
+    value = os.getenv(name)
+    if value:
+        return value
+    if st is not None:
+        try:
+            return st.secrets.get(name)  # type: ignore[attr-defined]
+        except Exception:
+            return None
+    return None
+
+
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_RETRIES = int(os.getenv("LLM_UPSTREAM_RETRIES", "0"))  # ChatOpenAI 自己已经会重试连接错误
+
+LANE_INTERACTIVE = "interactive"
+LANE_BATCH = "batch"
+_LANE_PRIORITY = {LANE_INTERACTIVE: 0, LANE_BATCH: 1}  # 数字越小越优先
+
+# 当前调用所属通道，批量预生成时用 batch_lane() 切换
+_current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("llm_lane", default=LANE_INTERACTIVE)
+
+
+class GatewayOverloaded(RuntimeError):
+    """排队已满，网关拒绝新的请求"""
+
+
+@contextlib.contextmanager
+def batch_lane():
+    """在 with 块内发起的大模型调用走 batch 低优先级通道"""
+    token = _current_lane.set(LANE_BATCH)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(temperature: float = 0.7, model: str = "deepseek-chat", seed: Optional[int] = None) -> ChatOpenAI:
+    """进程内共享的模型实例（按温度/模型/种子区分），连接池也随之共享"""
+    return ChatOpenAI(
+        temperature=temperature,
+        model=model,
+        seed=seed,
+        api_key=_get_secret("DEEPSEEK_API_KEY"),
+        base_url="https://api.deepseek.com",
+    )
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.stats = {"upstream_calls": 0, "coalesced": 0, "rejected": 0}
+        self.breaker = resilience.CircuitBreaker()
+
+    # ---------- 后台事件循环 ----------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def _run():
+                    asyncio.set_event_loop(loop)
+                    self._cond = asyncio.Condition()
+                    self._lanes = {lane: deque() for lane in _LANE_PRIORITY}
+                    self._active = {lane: 0 for lane in _LANE_PRIORITY}
+                    self._inflight: dict[str, asyncio.Future] = {}
+                    loop.create_task(self._dispatch())
+                    ready.set()
+                    loop.run_forever()
+
+                threading.Thread(target=_run, name="llm-gateway", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    def _next_lane(self) -> Optional[str]:
+        """按优先级挑一个可以开跑的通道；batch 最多占用 max_concurrency-1 个并发位"""
+        if sum(self._active.values()) >= self.max_concurrency:
+            return None
+        if self._lanes[LANE_INTERACTIVE]:
+            return LANE_INTERACTIVE
+        if self._lanes[LANE_BATCH] and self._active[LANE_BATCH] < max(1, self.max_concurrency - 1):
+            return LANE_BATCH
+        return None
+
+    async def _dispatch(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._next_lane() is not None)
+                lane = self._next_lane()
+                job = self._lanes[lane].popleft()
+                self._active[lane] += 1
+                self._cond.notify_all()  # 唤醒等待排队空间的请求
+            asyncio.get_running_loop().create_task(self._execute(lane, job))
+
+    def _upstream(self, name: str) -> resilience.Upstream:
+        """延迟分布按用途区分（行程生成和一句话摘要差很多），熔断器共用"""
+        return resilience.upstream(f"deepseek:{name}", retries=LLM_RETRIES, hedge=LLM_HEDGE, breaker=self.breaker)
+
+    async def _acquire_extra(self, lane: str):
+        """对冲副本占用的额外并发位：有空位且没有 interactive 请求在排队时才拿到"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: sum(self._active.values()) < self.max_concurrency
+                                      and not self._lanes[LANE_INTERACTIVE])
+            self._active[lane] += 1
+
+    async def _release_extra(self, lane: str):
+        async with self._cond:
+            self._active[lane] -= 1
+            self._cond.notify_all()
+
+    async def _execute(self, lane: str, job):
+        key, name, runnable, payload, future = job
+        running = 0
+
+        async def _call():
+            # 本任务已有一份在跑时再被调用就是对冲副本（重试是串行的，不会走到这里），要另占一个并发位
+            nonlocal running
+            extra = running > 0
+            running += 1
+            try:
+                if not extra:
+                    return await asyncio.wait_for(runnable.ainvoke(payload), timeout=REQUEST_TIMEOUT)
+                await self._acquire_extra(lane)
+                try:
+                    return await asyncio.wait_for(runnable.ainvoke(payload), timeout=REQUEST_TIMEOUT)
+                finally:
+                    await self._release_extra(lane)
+            finally:
+                running -= 1
+
+        try:
+            self.stats["upstream_calls"] += 1
+            result = await self._upstream(name).call(_call, hedge=lane == LANE_INTERACTIVE)
+            if not future.done():
+                future.set_result(result)
+        except BaseException as e:  # noqa: BLE001 结果统一交给等待者处理
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self._inflight.pop(key, None)
+            async with self._cond:
+                self._active[lane] -= 1
+                self._cond.notify_all()
+
+    async def _submit(self, key: str, runnable: Runnable, payload: Any, lane: str, name: str):
+        lane = lane if lane in _LANE_PRIORITY else LANE_INTERACTIVE
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.stats["coalesced"] += 1
+        else:
+            async with self._cond:
+                if self._queued() >= self.max_queue:
+                    if lane == LANE_BATCH:
+                        self.stats["rejected"] += 1
+                        raise GatewayOverloaded("大模型网关繁忙，批量请求被拒绝")
+                    try:
+                        await asyncio.wait_for(
+                            self._cond.wait_for(lambda: self._queued() < self.max_queue), timeout=QUEUE_TIMEOUT
+                        )
+                    except asyncio.TimeoutError:
+                        self.stats["rejected"] += 1
+                        raise GatewayOverloaded("大模型网关排队超时，请稍后重试")
+                # 等待期间可能已有相同请求入队
+                shared = self._inflight.get(key)
+                if shared is None:
+                    shared = asyncio.get_running_loop().create_future()
+                    self._inflight[key] = shared
+                    self._lanes[lane].append((key, name, runnable, payload, shared))
+                    self._cond.notify_all()
+                else:
+                    self.stats["coalesced"] += 1
+        # shield：某个等待者取消不影响共享的上游调用
+        return await asyncio.shield(shared)
+
+    # ---------- 对外接口 ----------
+    def submit(self, key: str, runnable: Runnable, payload: Any, lane: Optional[str] = None,
+               name: str = "default") -> concurrent.futures.Future:
+        """提交请求，返回可在任意线程等待的 Future；name 是用途，用于分开统计上游延迟"""
+        loop = self._ensure_loop()
+        coro = self._submit(key, runnable, payload, lane or _current_lane.get(), name)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def invoke(self, key: str, runnable: Runnable, payload: Any, lane: Optional[str] = None, name: str = "default") -> Any:
+        return self.submit(key, runnable, payload, lane, name).result()
+
+    async def ainvoke(self, key: str, runnable: Runnable, payload: Any, lane: Optional[str] = None,
+                      name: str = "default") -> Any:
+        return await asyncio.wrap_future(self.submit(key, runnable, payload, lane, name))
+
+
+gateway = LLMGateway()
+
+
+def _request_key(name: str, payload: Any) -> str:
+    text = payload.to_string() if hasattr(payload, "to_string") else repr(payload)
+    return hashlib.sha256(f"{name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def via_gateway(runnable: Runnable, name: str) -> Runnable:
+    """
+    把模型（或 with_structured_output 包装后的模型）挂到网关上。
+    name 用于区分不同用途/参数的调用，与提示词一起组成单飞键。
+    """
+    def _call(payload):
+        return gateway.invoke(_request_key(name, payload), runnable, payload, name=name)
+
+    async def _acall(payload):
+        return await gateway.ainvoke(_request_key(name, payload), runnable, payload, name=name)
+
+    return RunnableLambda(_call, afunc=_acall, name=f"gateway:{name}")
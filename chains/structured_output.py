@@ -0,0 +1,106 @@
+"""
+结构化输出 + 本地修复：
+优先走 JSON mode / function calling，解析失败时先在本地修复（JSON 纠错、字段类型转换、
+名称就近匹配），修不好才花一次重试，避免一次格式错误就浪费整个大模型调用。
+"""
+import difflib
+import json
+import os
+import re
+from typing import Any, List, Optional
+
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel
+
+# json_mode（DeepSeek 支持）/ function_calling / text（端点都不支持时的纯文本兜底）
+STRUCTURED_MODE = os.getenv("LLM_STRUCTURED_MODE", "json_mode")
+
+
+def structured_llm(llm, schema: type[BaseModel]):
+    """按配置包装模型；include_raw=True 保证解析失败时仍能拿到原始输出做修复"""
+    if STRUCTURED_MODE == "text":
+        return llm
+    return llm.with_structured_output(schema, method=STRUCTURED_MODE, include_raw=True)
+
+
+def extract_payload(output: Any) -> Any:
+    """从模型输出中取出待解析的内容：已解析的 dict、工具调用参数或原始文本"""
+    if isinstance(output, dict) and "raw" in output:
+        parsed = output.get("parsed")
+        if parsed is not None:
+            return parsed.model_dump() if isinstance(parsed, BaseModel) else parsed
+        output = output["raw"]
+    if isinstance(output, BaseMessage):
+        tool_calls = getattr(output, "tool_calls", None) or []
+        if tool_calls:
+            return tool_calls[0].get("args", {})
+        invalid = getattr(output, "invalid_tool_calls", None) or []
+        if invalid:
+            return invalid[0].get("args") or ""
+        return output.content
+    return output
+
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PY_LITERALS = {r"\bTrue\b": "true", r"\bFalse\b": "false", r"\bNone\b": "null"}
+
+
+def repair_json(text: Any) -> dict:
+    """
+    常见格式问题的本地修复：
+    1. 去掉 ```json 代码块包裹和前后说明文字
+    2. 中文引号/冒号、尾逗号、Python 字面量、单引号
+    修复失败抛 ValueError
+    """
+    if isinstance(text, dict):
+        return text
+    text = str(text or "")
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("输出中没有 JSON 对象")
+    text = text[start:end + 1]
+
+    candidates = [text]
+    fixed = text.replace("“", '"').replace("”", '"').replace("：", ":")
+    fixed = _TRAILING_COMMA.sub(r"\1", fixed)
+    for pattern, repl in _PY_LITERALS.items():
+        fixed = re.sub(pattern, repl, fixed)
+    candidates.append(fixed)
+    candidates.append(re.sub(r"'", '"', fixed))
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    raise ValueError("JSON 修复失败")
+
+
+def coerce_int(value: Any) -> Optional[int]:
+    """把 "1,200元"、"¥800"、"3"、3.0 之类转成整数，无法转换返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r"-?\d+(?:\.\d+)?", str(value or "").replace(",", ""))
+    return int(float(match.group())) if match else None
+
+
+def nearest_name(name: Any, names: List[str], cutoff: float = 0.6) -> Optional[str]:
+    """名称就近匹配：精确 → 包含关系 → difflib 相似度"""
+    if not name or not names:
+        return None
+    name = str(name).strip()
+    if name in names:
+        return name
+    contained = [n for n in names if name in n or n in name]
+    if contained:
+        return min(contained, key=lambda n: abs(len(n) - len(name)))
+    matches = difflib.get_close_matches(name, names, n=1, cutoff=cutoff)
+    return matches[0] if matches else None
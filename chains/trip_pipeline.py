@@ -0,0 +1,294 @@
+"""
+行程规划流水线：Streamlit 页面和 HTTP 服务（api_server.py）共用同一套步骤
+城市信息 → 景点/餐厅/酒店 → 酒店排序 → 本地预算分配 → 按天生成 DayPlan。
+- 外部调用（百度工具、平台信息、大模型选点）都通过 Backend 注入，压测/离线场景可以整体替换
+- plan_days 是生成器，每排好一天就 yield 一次，调用方据此渲染页面或推送进度
+"""
+import hashlib
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional
+
+from models.budget_plan import BudgetPlan
+from models.day_plan import DayPlan
+from models.trip_schema import TripRequest
+
+DEFAULT_HOTEL_PRICE = 200
+PLATFORM_TOP_N = 3  # 只为前几个 POI 拉平台信息，避免调用过多
+
+
+@dataclass
+class Backend:
+    city: Callable[[str], dict]
+    attractions: Callable[[float, float], list]
+    restaurants: Callable[[float, float], list]
+    hotels: Callable[[float, float], list]
+    platform_info: Optional[Callable[[str, str, str], dict]] = None
+    day_plan: Optional[Callable[..., object]] = None  # 签名同 plan_day_with_llm；为 None 时只用本地算法
+
+
+def default_backend() -> Backend:
+    from chains.day_plan_chain import plan_day_with_llm
+    from tools.attraction_tool import AttractionTool
+    from tools.city_tool import CityTool
+    from tools.hotel_tool import HotelTool
+    from tools.platform_info_tool import PlatformInfoTool
+    from tools.restaurant_tool import RestaurantTool
+
+    platform_tool = PlatformInfoTool()
+    return Backend(
+        city=CityTool()._run,
+        attractions=lambda lat, lng: AttractionTool()._run(lat=lat, lng=lng),
+        restaurants=lambda lat, lng: RestaurantTool()._run(lat=lat, lng=lng),
+        hotels=lambda lat, lng: HotelTool()._run(lat=lat, lng=lng),
+        platform_info=lambda name, city, poi_type: platform_tool._run(name=name, city=city, poi_type=poi_type),
+        day_plan=plan_day_with_llm,
+    )
+
+
+@dataclass
+class DayResult:
+    day: int
+    start: datetime
+    plan: DayPlan
+    reason: str
+    llm_error: Optional[str] = None  # 大模型规划失败、退回备用算法时的错误信息
+
+
+@dataclass
+class TripResult:
+    request: TripRequest
+    city: dict
+    hotel: dict
+    budget: BudgetPlan
+    days: List[DayResult] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "request": self.request.model_dump(mode="json"),
+            "city": self.city,
+            "hotel": self.hotel,
+            "budget": self.budget.model_dump(),
+            "days": [day_to_dict(d) for d in self.days],
+        }
+
+
+def day_to_dict(result: DayResult) -> dict:
+    return {"day": result.day, "start": result.start.isoformat(), "reason": result.reason,
+            "llm_error": result.llm_error, **result.plan.model_dump(mode="json")}
+
+
+def day_from_dict(data: dict) -> DayResult:
+    """day_to_dict 的逆操作（快照回放用）"""
+    plan = DayPlan(**{k: v for k, v in data.items() if k in DayPlan.model_fields})
+    return DayResult(day=data["day"], start=datetime.fromisoformat(data["start"]), plan=plan,
+                     reason=data.get("reason") or "", llm_error=data.get("llm_error"))
+
+
+def request_key(req: TripRequest) -> str:
+    """请求内容哈希：结果缓存、去重在途任务都用它"""
+    return hashlib.sha256(req.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def valid(items) -> list:
+    """工具返回 [{"error": ...}] 时视为空列表"""
+    return items if items and "error" not in items[0] else []
+
+
+def enrich_with_platform_info(items: list, name_key: str, city: str, poi_type: str,
+                              platform_info: Optional[Callable[[str, str, str], dict]], n: int = PLATFORM_TOP_N):
+    """为前 n 个 POI 补充平台信息并合并到推荐描述，失败不影响主流程"""
+    if platform_info is None:
+        return
+    for item in valid(items)[:n]:
+        try:
+            info = platform_info(item[name_key], city, poi_type)
+        except Exception:
+            continue
+        item["平台信息"] = info
+        if info.get("enhanced_description"):
+            item["推荐描述"] = f"{item.get('推荐描述', '')} | {info['enhanced_description']}"
+
+
+def normalize_pois(attractions_raw: list, restaurants_raw: list, center_lat: float, center_lng: float,
+                   seed: Optional[int] = None, jitter: Optional[float] = None):
+    """工具原始结果 → 排程用的 POI 字典（带 lat/lng/category 和提示词展示字段）；
+    坐标默认用工具返回的真实 location，jitter（度，默认 POI_COORD_JITTER=0）> 0 时才加扰动"""
+    from tools.route_planner import coordinate_jitter
+
+    def poi_coord(poi, name_key):
+        # 注意：attraction_tool 和 restaurant_tool 返回的 location 格式是 "lng,lat"（经度,纬度）
+        lng, lat = poi.get("location", f"{center_lng},{center_lat}").split(",")
+        d_lat, d_lng = coordinate_jitter(poi[name_key], seed, jitter)
+        return float(lat) + d_lat, float(lng) + d_lng
+
+    attractions = [
+        {
+            "name": a["景点名称"],
+            "lat": lat,
+            "lng": lng,
+            "category": "attraction",
+            "门票数值": a.get("门票数值", 0),  # 保留门票价格信息
+            # 以下字段供提示词展示和本地语义预筛选使用
+            "评分": a.get("评分"),
+            "门票": a.get("门票", "免费"),
+            "距离(米)": a.get("距离(米)", 0),
+            "景点类型": a.get("景点类型", ""),
+            "标签/特色": a.get("标签/特色", ""),
+            "推荐描述": a.get("推荐描述", ""),
+            "开放时间": a.get("开放时间", "暂无"),
+            "平台信息": a.get("平台信息", {}),
+        }
+        for a in valid(attractions_raw)
+        for lat, lng in [poi_coord(a, "景点名称")]
+    ]
+    restaurants = [
+        {
+            "name": r["餐厅名称"],
+            "lat": lat,
+            "lng": lng,
+            "category": "restaurant",
+            "人均数值": r.get("人均数值", 50),  # 保留人均价格信息
+            "评分": r.get("评分"),
+            "人均(元)": r.get("人均(元)", "N/A"),
+            "距离(米)": r.get("距离(米)", 0),
+            "菜系/标签": r.get("菜系/标签", ""),
+            "推荐描述": r.get("推荐描述", ""),
+            "推荐招牌菜": r.get("推荐招牌菜", ""),
+            "营业时间": r.get("营业时间", "暂无"),
+            "平台信息": r.get("平台信息", {}),
+        }
+        for r in valid(restaurants_raw)
+        for lat, lng in [poi_coord(r, "餐厅名称")]
+    ]
+    return attractions, restaurants
+
+
+def hotel_price_of(hotel: dict) -> int:
+    return hotel.get("价格数值") or DEFAULT_HOTEL_PRICE
+
+
+def plan_days(req: TripRequest, attractions: List[dict], restaurants: List[dict], hotel: dict,
+              hotel_lat: float, hotel_lng: float, budget: BudgetPlan,
+              day_plan: Optional[Callable[..., object]] = None) -> Iterator[DayResult]:
+    """逐天排程：按天地理分组 → BM25 预筛选 → 大模型选点（可选）→ 贪心排程 + 营业时间校验"""
+    from tools.day_clustering import cluster_days, day_candidates
+    from tools.opening_hours import OpeningIndex
+    from tools.poi_retriever import PoiRetriever
+    from tools.route_planner import greedy_daily_schedule
+
+    trip_days = (req.end_date - req.start_date).days + 1  # 含首尾
+    hotel_name = hotel["酒店名称"]
+    hotel_price = hotel_price_of(hotel)
+    # 可复现模式下所有随机性（可选的坐标扰动、备用算法选餐厅）都来自请求派生的种子
+    seed = req.planning_seed() if req.deterministic else None
+    plan_rng = random.Random(seed)  # seed 为 None 时使用系统熵，即非可复现模式
+
+    # 本地 BM25 索引：按个性化需求从全部候选中挑 Top-K 给大模型
+    attraction_retriever = PoiRetriever(attractions)
+    restaurant_retriever = PoiRetriever(restaurants)
+    # 按天地理分组：每天只在自己的簇里选点，避免一天之内横跨全城
+    day_clusters = cluster_days(attractions, restaurants, trip_days, hotel_lat, hotel_lng,
+                                seed=seed if seed is not None else 0)
+    # 营业时间索引：排程时剔除/替换计划时段内不开放的景点和餐厅
+    opening_index = OpeningIndex(attractions + restaurants)
+
+    avail_attractions = attractions.copy()  # 剩余景点
+    avail_restaurants = restaurants.copy()  # 剩余餐厅
+    for day in range(1, trip_days + 1):
+        # 当天候选：本簇剩余的景点/餐厅，不够时从全局剩余中就近补齐
+        day_attractions, day_restaurants = day_candidates(day_clusters[day - 1], avail_attractions, avail_restaurants)
+
+        llm_selection, llm_error = None, None
+        if day_plan is not None:
+            try:
+                llm_selection = day_plan(
+                    day=day,
+                    destination=req.destination,
+                    personal_requirements=req.personal,
+                    avail_attractions=attraction_retriever.top_k(day_attractions, req.personal, k=15),
+                    avail_restaurants=restaurant_retriever.top_k(day_restaurants, req.personal, k=15),
+                    hotel_name=hotel_name,
+                    adults=req.adults,
+                    children=req.children,
+                    deterministic=req.deterministic
+                )
+            except Exception as e:
+                llm_error = str(e)
+
+        # 早上8点出发
+        start_time = datetime.combine(req.start_date, datetime.min.time().replace(hour=8, minute=0)) + timedelta(days=day - 1)
+        plan, reason = greedy_daily_schedule(
+            hotel_lat, hotel_lng, hotel_name,
+            day_attractions,
+            day_restaurants,
+            day_start=start_time,
+            day=day,
+            hotel_price=hotel_price,
+            adults=req.adults,
+            children=req.children,
+            destination=req.destination,
+            personal_requirements=req.personal,
+            llm_selection=llm_selection,
+            rng=plan_rng,
+            transport_budget=budget.transport / trip_days,  # 每天的市内交通预算，用于选择步行/地铁/打车
+            opening_index=opening_index
+        )
+        yield DayResult(day=day, start=start_time, plan=plan, reason=reason, llm_error=llm_error)
+
+        # 每天剔除已选 → 下一天去不同地方
+        used = {a.name for a in plan.activities if a.category == "attraction"}
+        used_meals = {a.name.replace("午餐 - ", "").replace("晚餐 - ", "")
+                      for a in plan.activities if a.category == "meal"}
+        avail_attractions = [x for x in avail_attractions if x["name"] not in used]
+        avail_restaurants = [x for x in avail_restaurants if x["name"] not in used_meals]
+
+
+def run_trip(req: TripRequest, backend: Optional[Backend] = None,
+             on_stage: Optional[Callable[[str], None]] = None,
+             on_day: Optional[Callable[[DayResult], None]] = None) -> TripResult:
+    """无界面的完整流水线：酒店取综合成本最低的一家，其余步骤与页面一致"""
+    from tools.budget_allocator import allocate_budget
+    from tools.hotel_ranker import rank_hotels
+
+    backend = backend or default_backend()
+    stage = on_stage or (lambda name: None)
+
+    stage("city")
+    city = backend.city(req.destination)
+    if "error" in city:
+        raise ValueError(f"城市信息获取失败：{city['error']}")
+    lat, lng = city["latitude"], city["longitude"]
+
+    stage("pois")
+    attractions_raw = backend.attractions(lat, lng)
+    restaurants_raw = backend.restaurants(lat, lng)
+    enrich_with_platform_info(attractions_raw, "景点名称", req.destination, "attraction", backend.platform_info)
+    enrich_with_platform_info(restaurants_raw, "餐厅名称", req.destination, "restaurant", backend.platform_info)
+
+    stage("hotel")
+    hotels = valid(backend.hotels(lat, lng))
+    if hotels:
+        # 按 每日通勤时间 + 房价 排序，取综合成本最低的一家
+        hotel = rank_hotels(hotels, valid(attractions_raw) + valid(restaurants_raw))[0]
+        hotel_lat, hotel_lng = float(hotel.get("lat", lat)), float(hotel.get("lng", lng))
+    else:
+        # 兜底：用城市中心
+        hotel = {"酒店名称": "市中心酒店", "价格数值": DEFAULT_HOTEL_PRICE}
+        hotel_lat, hotel_lng = lat, lng
+
+    stage("budget")
+    trip_days = (req.end_date - req.start_date).days + 1
+    budget = allocate_budget(req.budget, trip_days, req.adults, req.children,
+                             hotel_price=hotel_price_of(hotel), city=req.destination)
+
+    stage("days")
+    seed = req.planning_seed() if req.deterministic else None
+    attractions, restaurants = normalize_pois(attractions_raw, restaurants_raw, lat, lng, seed)
+    result = TripResult(request=req, city=city, hotel=hotel, budget=budget)
+    for day in plan_days(req, attractions, restaurants, hotel, hotel_lat, hotel_lng, budget, backend.day_plan):
+        result.days.append(day)
+        if on_day is not None:
+            on_day(day)
+    return result
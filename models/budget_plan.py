@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+
+
+class BudgetPlan(BaseModel):
+    accommodation: int = Field(description="住宿费用（元）")
+    restaurant: int = Field(description="餐饮费用（元）")
+    transport: int = Field(description="市内交通费用（元）")
+    attraction: int = Field(description="门票费用（元）")
+    contingency: int = Field(description="备用金（元）")
+    reason: str = Field(description="一句话理由")
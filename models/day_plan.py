@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 
 class Activity(BaseModel):
     name: str
@@ -8,7 +8,11 @@ class Activity(BaseModel):
     end: datetime
     transport_mode: str = "步行"
     transport_duration: int = 0
+    transport_distance: int = 0  # 米
+    transport_cost: int = 0  # 元
     category: str
+    lat: Optional[float] = None  # 活动地点坐标，地图/导出用
+    lng: Optional[float] = None
 
 class DayPlan(BaseModel):
     day: int
@@ -1,3 +1,5 @@
+import hashlib
+
 from pydantic import BaseModel, Field, validator
 from datetime import date
 
@@ -10,9 +12,15 @@ class TripRequest(BaseModel):
     children:       int = Field(..., ge=0, le=20)
     budget:         int = Field(..., ge=100)
     personal:       str = "无"
+    deterministic:  bool = Field(True, description="可复现模式：相同请求生成相同行程")
 
     @validator("end_date")
     def check_dates(cls, v, values):
         if "start_date" in values and v < values["start_date"]:
             raise ValueError("返回日期不能早于出发日期")
-        return v
\ No newline at end of file
+        return v
+
+    def planning_seed(self) -> int:
+        """由请求内容派生的随机种子，可复现模式下行程中的所有随机性都来自它"""
+        digest = hashlib.sha256(self.model_dump_json().encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big")
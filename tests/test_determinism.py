@@ -0,0 +1,48 @@
+"""可复现模式的金标准测试：离线替身 + 本地出行时间，同一请求两次运行、跨进程都得到逐字节相同的 DayPlan。
+改动排程逻辑后确认新结果无误，用 UPDATE_GOLDEN=1 重新生成金标准文件。"""
+import dataclasses
+import json
+import os
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from chains.trip_pipeline import day_to_dict, run_trip
+from models.trip_schema import TripRequest
+from tools import load_test, travel_time
+
+GOLDEN = Path(__file__).parent / "golden" / "determinism.json"
+
+REQUEST = TripRequest(departure="上海", destination="苏州", start_date=date(2026, 5, 1), end_date=date(2026, 5, 3),
+                      adults=2, children=1, budget=6000, personal="喜欢园林，不想太累", deterministic=True)
+
+
+def _backend(llm_fails: bool):
+    backend = load_test.StubBackend(baidu="const:0", llm="const:0").backend()
+    if llm_fails:
+        backend = dataclasses.replace(backend, day_plan=None)  # 全部走备用算法（随机选餐厅）
+    return backend
+
+
+def _plan(llm_fails: bool) -> bytes:
+    days = [day_to_dict(d) for d in run_trip(REQUEST, backend=_backend(llm_fails)).days]
+    return json.dumps(days, ensure_ascii=False, sort_keys=True, indent=1).encode("utf-8")
+
+
+@pytest.fixture(autouse=True)
+def stub_travel(monkeypatch):
+    monkeypatch.setattr(travel_time, "provider", travel_time.provider)  # 测试结束后还原
+    load_test.install_stub_travel("const:0")
+
+
+@pytest.mark.parametrize("case, llm_fails", [("llm", False), ("fallback", True)])
+def test_day_plans_match_golden(case, llm_fails):
+    first, second = _plan(llm_fails), _plan(llm_fails)
+    assert first == second
+    golden = json.loads(GOLDEN.read_text(encoding="utf-8")) if GOLDEN.exists() else {}
+    if os.getenv("UPDATE_GOLDEN") == "1":
+        golden[case] = json.loads(first)
+        GOLDEN.write_text(json.dumps(golden, ensure_ascii=False, sort_keys=True, indent=1) + "\n", encoding="utf-8")
+    assert case in golden, "缺少金标准，先用 UPDATE_GOLDEN=1 生成"
+    assert first == json.dumps(golden[case], ensure_ascii=False, sort_keys=True, indent=1).encode("utf-8")
@@ -0,0 +1,26 @@
+"""地名库前缀匹配的回归用例：以城市名开头的地点、省名都不能被解析成城市中心"""
+import pytest
+
+from tools.gazetteer import lookup
+
+
+@pytest.mark.parametrize("query", ["南京路", "上海迪士尼", "广州塔", "大连理工大学", "吉林省", "江苏", "江苏省"])
+def test_not_a_city(query):
+    assert lookup(query) is None
+
+
+@pytest.mark.parametrize("query, city", [
+    ("苏州", "苏州"),
+    ("苏州市", "苏州"),
+    ("江苏省苏州市", "苏州"),
+    ("苏州市姑苏区", "苏州"),
+    ("吉林", "吉林"),
+    ("吉林市", "吉林"),
+    ("吉林省吉林市", "吉林"),
+    ("延边州", "延边"),
+    ("锡林郭勒盟", "锡林郭勒"),
+    ("hangzhou", "杭州"),
+])
+def test_city(query, city):
+    place = lookup(query)
+    assert place is not None and place.name == city
@@ -0,0 +1,119 @@
+"""开放时间解析和 OpeningIndex 的用例：闭馆日、分段营业、跨午夜、全天/暂无、季节规则、ensure_open 换点"""
+from datetime import date
+
+import pytest
+
+from tools.opening_hours import DAY_MINUTES, OpeningIndex, parse_opening_hours
+
+MONDAY = date(2026, 5, 4)
+TUESDAY = date(2026, 5, 5)
+SUNDAY = date(2026, 5, 10)
+WINTER_MONDAY = date(2026, 12, 7)
+
+
+def hm(text: str) -> int:
+    h, m = text.split(":")
+    return int(h) * 60 + int(m)
+
+
+def test_closed_on_monday():
+    hours = parse_opening_hours("周二至周日 09:00-17:00，周一闭馆")
+    assert hours.intervals_on(MONDAY) == []
+    assert hours.intervals_on(TUESDAY) == [(hm("09:00"), hm("17:00"))]
+    assert hours.is_open(SUNDAY, hm("10:00"), hm("16:00"))
+    assert not hours.is_open(TUESDAY, hm("16:00"), hm("18:00"))
+
+
+def test_closing_day_only():
+    hours = parse_opening_hours("每周一闭馆")
+    assert hours.known
+    assert not hours.is_open(MONDAY, hm("10:00"), hm("11:00"))
+    assert hours.is_open(TUESDAY, hm("10:00"), hm("11:00"))
+
+
+def test_split_hours():
+    hours = parse_opening_hours("10:00-14:00,17:00-21:00")
+    assert hours.intervals_on(TUESDAY) == [(hm("10:00"), hm("14:00")), (hm("17:00"), hm("21:00"))]
+    assert hours.is_open(TUESDAY, hm("12:00"), hm("13:00"))
+    assert not hours.is_open(TUESDAY, hm("15:00"), hm("16:00"))
+    assert not hours.is_open(TUESDAY, hm("13:30"), hm("17:30"))  # 跨过中间歇业不算全程营业
+
+
+@pytest.mark.parametrize("text", ["11:00-次日02:00", "11:00-02:00", "11点-凌晨2点"])
+def test_overnight(text):
+    hours = parse_opening_hours(text)
+    assert hours.intervals_on(TUESDAY) == [(hm("11:00"), DAY_MINUTES + hm("02:00"))]
+    assert hours.is_open(TUESDAY, hm("22:00"), DAY_MINUTES + hm("01:00"))
+
+
+@pytest.mark.parametrize("text", ["全天开放", "24小时营业"])
+def test_all_day(text):
+    hours = parse_opening_hours(text)
+    assert hours.known
+    assert hours.intervals_on(MONDAY) == [(0, DAY_MINUTES)]
+
+
+@pytest.mark.parametrize("text", ["暂无", "", None, "以实际为准"])
+def test_unknown_is_open(text):
+    hours = parse_opening_hours(text)
+    assert not hours.known
+    assert hours.is_open(MONDAY, 0, DAY_MINUTES)
+
+
+def test_seasonal_rules():
+    hours = parse_opening_hours("4月1日-10月31日 08:00-17:30；11月1日-3月31日 08:30-17:00")
+    assert hours.intervals_on(MONDAY) == [(hm("08:00"), hm("17:30"))]
+    assert hours.intervals_on(WINTER_MONDAY) == [(hm("08:30"), hm("17:00"))]
+    assert hours.intervals_on(date(2027, 2, 1)) == [(hm("08:30"), hm("17:00"))]  # 跨年的淡季区间
+
+
+def test_seasonal_rule_beats_general():
+    hours = parse_opening_hours("旺季 08:00-18:00 淡季 08:30-17:00")
+    assert hours.intervals_on(MONDAY) == [(hm("08:00"), hm("18:00"))]
+    assert hours.intervals_on(WINTER_MONDAY) == [(hm("08:30"), hm("17:00"))]
+
+
+def test_stop_entry_note_ignored():
+    hours = parse_opening_hours("08:00-17:00（16:30停止入园）")
+    assert hours.intervals_on(TUESDAY) == [(hm("08:00"), hm("17:00"))]
+
+
+# ---------- OpeningIndex ----------
+def _poi(name, hours, lat=31.30, lng=120.60):
+    return {"name": name, "lat": lat, "lng": lng, "开放时间": hours}
+
+
+@pytest.fixture
+def pool():
+    return [
+        _poi("博物馆", "周二至周日 09:00-17:00，周一闭馆"),
+        _poi("近处园林", "08:00-17:30", lat=31.301, lng=120.601),
+        _poi("远处园林", "08:00-17:30", lat=31.40, lng=120.70),
+        _poi("夜市", "18:00-次日01:00", lat=31.3005, lng=120.6005),
+        _poi("未知", "暂无", lat=31.50, lng=120.90),
+    ]
+
+
+def test_open_between(pool):
+    index = OpeningIndex(pool)
+    names = lambda pois: sorted(p["name"] for p in pois)
+    assert names(index.open_between(MONDAY, hm("10:00"), hm("12:00"))) == ["未知", "近处园林", "远处园林"]
+    assert names(index.open_between(TUESDAY, hm("10:00"), hm("12:00"))) == ["博物馆", "未知", "近处园林", "远处园林"]
+    assert names(index.open_between(TUESDAY, hm("19:00"), hm("20:00"))) == ["夜市", "未知"]
+    near = index.open_between(TUESDAY, hm("10:00"), hm("12:00"), near=(31.30, 120.60), radius=1000)
+    assert names(near) == ["博物馆", "近处园林"]
+
+
+def test_ensure_open_swaps_in_nearest_open_poi(pool):
+    index = OpeningIndex(pool)
+    museum = pool[0]
+    assert index.ensure_open(museum, pool, TUESDAY, hm("10:00"), hm("12:00")) is museum
+    assert index.ensure_open(museum, pool, MONDAY, hm("10:00"), hm("12:00"))["name"] == "近处园林"
+    swapped = index.ensure_open(museum, pool, MONDAY, hm("10:00"), hm("12:00"), exclude=[pool[1]])
+    assert swapped["name"] == "远处园林"
+
+
+def test_ensure_open_keeps_choice_without_alternative():
+    museum = _poi("博物馆", "周二至周日 09:00-17:00，周一闭馆")
+    index = OpeningIndex([museum])
+    assert index.ensure_open(museum, [museum], MONDAY, hm("10:00"), hm("12:00")) is museum
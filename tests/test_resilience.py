@@ -0,0 +1,234 @@
+"""熔断器状态转换、错误分类和对冲上限：用假协程和假时钟，不发任何网络请求"""
+import asyncio
+
+import pytest
+
+from tools import resilience
+from tools.resilience import (PERMANENT, RETRYABLE, CircuitBreaker, CircuitOpenError, Upstream, UpstreamError,
+                              classify, classify_baidu)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", c)
+    return c
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BACKOFF", 0)
+
+
+def _opened(clock, failures=2, reset_after=30):
+    breaker = CircuitBreaker(failures=failures, reset_after=reset_after)
+    for _ in range(failures):
+        breaker.record_failure()
+    return breaker
+
+
+# ---------- 熔断器 ----------
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failures=3, reset_after=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failures=2, reset_after=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = _opened(clock)
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # 探测还没结束，其他请求继续被拒
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _opened(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_release_lets_next_request_probe(clock):
+    breaker = _opened(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+# ---------- Upstream.call ----------
+def _failing(error, calls):
+    async def factory():
+        calls.append(1)
+        raise error
+    return factory
+
+
+def test_permanent_error_does_not_retry_or_trip():
+    up = Upstream("test:permanent", retries=2, hedge=False, breaker=CircuitBreaker(failures=1))
+    calls = []
+    with pytest.raises(UpstreamError):
+        asyncio.run(up.call(_failing(UpstreamError("参数错误", kind=PERMANENT), calls)))
+    assert len(calls) == 1
+    assert up.breaker.state == CircuitBreaker.CLOSED and up.breaker.failures == 0
+    assert up.stats["failures"] == 0
+
+
+def test_permanent_error_on_probe_keeps_half_open(clock):
+    up = Upstream("test:probe", retries=0, hedge=False, breaker=_opened(clock))
+    clock.now += 30
+    with pytest.raises(UpstreamError):
+        asyncio.run(up.call(_failing(UpstreamError("查无结果", kind=PERMANENT), [])))
+    assert up.breaker.state == CircuitBreaker.HALF_OPEN
+    assert up.breaker.allow()  # 下一个请求可以继续探测
+
+
+def test_retryable_errors_retry_then_trip():
+    up = Upstream("test:retry", retries=1, hedge=False, breaker=CircuitBreaker(failures=2))
+    calls = []
+    for expected_state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(up.call(_failing(asyncio.TimeoutError(), calls)))
+        assert up.breaker.state == expected_state
+    assert len(calls) == 4  # 每次调用 1 次重试
+    assert up.stats["failures"] == 4 and up.stats["retries"] == 2
+
+
+def test_open_breaker_rejects_without_calling():
+    up = Upstream("test:open", retries=0, hedge=False, breaker=CircuitBreaker(failures=1, reset_after=60))
+    up.breaker.record_failure()
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(up.call(_failing(RuntimeError("不该被调用"), calls)))
+    assert calls == [] and up.stats["rejected"] == 1
+
+
+def test_retry_override():
+    up = Upstream("test:override", retries=3, hedge=False, breaker=CircuitBreaker(failures=10))
+    calls = []
+    with pytest.raises(ConnectionError):
+        asyncio.run(up.call(_failing(ConnectionError(), calls), retries=0))
+    assert len(calls) == 1
+
+
+# ---------- 错误分类 ----------
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(status_code)
+        self.status_code = status_code
+
+
+class ConnectTimeout(Exception):
+    pass
+
+
+@pytest.mark.parametrize("error, kind", [
+    (UpstreamError("x", kind=PERMANENT), PERMANENT),
+    (UpstreamError("x"), RETRYABLE),
+    (asyncio.TimeoutError(), RETRYABLE),
+    (ConnectionResetError(), RETRYABLE),
+    (_StatusError(503), RETRYABLE),
+    (_StatusError(429), RETRYABLE),
+    (_StatusError(400), PERMANENT),
+    (_StatusError(401), PERMANENT),
+    (ConnectTimeout(), RETRYABLE),
+    (ValueError("bad"), PERMANENT),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+@pytest.mark.parametrize("body, kind", [
+    ({"status": 1, "message": "服务器内部错误"}, RETRYABLE),
+    ({"status": 1, "message": "无相关结果"}, PERMANENT),
+    ({"status": 402}, RETRYABLE),
+    ({"status": 2, "message": "参数错误"}, PERMANENT),
+    ({"status": 240}, PERMANENT),
+    ({"status": resilience.UNAVAILABLE_STATUS}, RETRYABLE),
+    ({}, RETRYABLE),
+])
+def test_classify_baidu(body, kind):
+    assert classify_baidu(body) == kind
+
+
+# ---------- 对冲 ----------
+def _warm(up, latency=0.01, n=resilience.HEDGE_MIN_SAMPLES):
+    up._latencies.extend([latency] * n)
+
+
+def test_no_hedge_without_samples():
+    up = Upstream("test:cold", hedge=True)
+    _warm(up, n=resilience.HEDGE_MIN_SAMPLES - 1)
+    assert up.hedge_delay() is None
+
+
+def test_hedge_delay_uses_p95_with_floor():
+    up = Upstream("test:p95", hedge=True)
+    _warm(up, latency=0.001)
+    assert up.hedge_delay() == resilience.HEDGE_MIN_DELAY
+    up._latencies.clear()
+    _warm(up, latency=0.2)
+    assert up.hedge_delay() == pytest.approx(0.2)
+    assert up.hedge_delay(hedge=False) is None
+    assert Upstream("test:off", hedge=False).hedge_delay() is None
+
+
+def test_hedge_ratio_cap():
+    up = Upstream("test:cap", hedge=True)
+    _warm(up)
+    up.stats["calls"] = 10
+    up.stats["hedges"] = int(resilience.HEDGE_MAX_RATIO * 10)
+    assert up.hedge_delay() is not None
+    up.stats["hedges"] += 1
+    assert up.hedge_delay() is None
+
+
+def test_hedge_wins_and_cancels_slow_copy(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_MIN_DELAY", 0.01)
+    up = Upstream("test:hedge", retries=0, hedge=True)
+    _warm(up, latency=0.01)
+    started, cancelled = [], []
+
+    async def factory():
+        n = len(started)
+        started.append(n)
+        try:
+            await asyncio.sleep(5 if n == 0 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return n
+
+    assert asyncio.run(up.call(factory)) == 1
+    assert started == [0, 1] and cancelled == [0]
+    assert up.stats["hedges"] == 1 and up.stats["hedge_wins"] == 1
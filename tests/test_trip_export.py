@@ -0,0 +1,60 @@
+"""流式导出：Markdown 与 export_full_md 一致、iCalendar 按 75 字节折行、JSON 总结里的住宿费"""
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from tools.export_md import export_full_md
+from tools.route_planner import greedy_daily_schedule
+from tools.travel_time import LocalProvider
+from tools.trip_export import TripExporter
+
+HOTEL = (31.30, 120.60)
+
+
+@pytest.fixture(scope="module")
+def plans():
+    rnd = random.Random(1)
+    point = lambda: (HOTEL[0] + rnd.uniform(-0.03, 0.03), HOTEL[1] + rnd.uniform(-0.03, 0.03))
+    # 名字故意很长、带逗号分号，检验 ICS 转义和多字节折行
+    attractions = [{"name": f"拙政园·东园,中园;西园{i}号观景台与苏州园林博物馆联票游览", "lat": lat, "lng": lng,
+                    "category": "attraction", "门票数值": 70} for i, (lat, lng) in enumerate(point() for _ in range(8))]
+    restaurants = [{"name": f"松鹤楼{i}", "lat": lat, "lng": lng, "category": "restaurant", "人均数值": 90}
+                   for i, (lat, lng) in enumerate(point() for _ in range(8))]
+    start = datetime(2026, 5, 1, 8)
+    return [greedy_daily_schedule(HOTEL[0], HOTEL[1], "苏州站酒店", attractions, restaurants,
+                                  start + timedelta(days=day - 1), day, rng=random.Random(day),
+                                  travel=LocalProvider())[0]
+            for day in (1, 2)]
+
+
+def _export(plans, **kwargs):
+    with TripExporter("t1", destination="苏州", **kwargs) as exporter:
+        for plan in plans:
+            exporter.add_day(plan)
+        exporter.finish()
+        return {fmt: exporter.read_text(fmt) for fmt in exporter.formats}
+
+
+def test_markdown_matches_export_full_md(plans):
+    assert _export(plans)["md"] == export_full_md(plans)
+
+
+def test_ics_lines_folded_to_75_bytes(plans):
+    ics = _export(plans)["ics"]
+    lines = ics.split("\r\n")
+    assert lines[-1] == ""
+    assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+    unfolded = ics.replace("\r\n ", "")
+    for act in plans[0].activities:
+        assert "SUMMARY:" + act.name.replace(",", "\\,").replace(";", "\\;") in unfolded
+    assert unfolded.count("BEGIN:VEVENT") == sum(len(p.activities) for p in plans)
+
+
+def test_summary_accommodation_from_hotel_price(plans):
+    summary = json.loads(_export(plans, hotel_price=300, nights=2)["json"])["summary"]
+    assert summary["accommodation"] == 600
+    assert summary["restaurant"] == sum(p.restaurant for p in plans)
+    assert json.loads(_export(plans, hotel_price=300)["json"])["summary"]["accommodation"] == 600  # 默认按天数
+    assert "accommodation" not in json.loads(_export(plans)["json"])["summary"]
@@ -0,0 +1,77 @@
+"""
+本地预算分配：按天数、人数、酒店价格和城市物价系数直接算出五项预算，微秒级返回，不依赖网络。
+口径与 greedy_daily_schedule 的实际计费一致：儿童门票/餐饮按半价，住宿 = 房价 × 天数，
+备用金为非住宿费用的 10%。算出的基础需求低于总预算时，结余按比例加到餐饮/门票/交通（最多翻倍），
+其余进备用金；超出总预算时先压缩可调整的三项，住宿（已选定酒店）最后才动。
+"""
+from typing import Optional
+
+from models.budget_plan import BudgetPlan
+from tools import gazetteer
+
+# 城市物价系数（相对全国热门旅游城市平均水平）
+CITY_PRICE_LEVEL = {
+    "北京": 1.3, "上海": 1.3, "深圳": 1.25, "广州": 1.2,
+    "杭州": 1.15, "三亚": 1.2, "厦门": 1.1, "南京": 1.1, "苏州": 1.1, "成都": 1.0, "重庆": 0.95,
+    "西安": 0.95, "武汉": 1.0, "青岛": 1.05, "天津": 1.05, "长沙": 0.95, "丽江": 1.05, "大理": 1.0,
+    "桂林": 0.9, "昆明": 0.95, "哈尔滨": 0.95, "拉萨": 1.1, "张家界": 0.95, "黄山": 1.0,
+}
+DEFAULT_PRICE_LEVEL = 0.9
+
+# 每人每天的基础花费（元，物价系数 1.0 时）
+MEAL_PER_PERSON_DAY = 120        # 午餐 + 晚餐
+ATTRACTION_PER_PERSON_DAY = 80   # 两个景点门票
+TRANSPORT_PER_PERSON_DAY = 35    # 地铁/打车混合
+CHILD_FACTOR = 0.5
+CONTINGENCY_RATE = 0.1
+MAX_UPLIFT = 2.0                 # 结余最多把可调整项抬高到基础需求的 2 倍
+
+FLEXIBLE = ("restaurant", "attraction", "transport")
+
+
+def price_level(city: str) -> float:
+    place = gazetteer.lookup(city)
+    name = place.name if place else city
+    return CITY_PRICE_LEVEL.get(name, DEFAULT_PRICE_LEVEL)
+
+
+def allocate_budget(budget: int, days: int, adults: int, children: int = 0,
+                    hotel_price: Optional[int] = None, city: str = "") -> BudgetPlan:
+    days = max(1, days)
+    level = price_level(city) if city else DEFAULT_PRICE_LEVEL
+    people = adults + children * CHILD_FACTOR
+    hotel_price = hotel_price or 200
+
+    need = {
+        "restaurant": MEAL_PER_PERSON_DAY * level * people * days,
+        "attraction": ATTRACTION_PER_PERSON_DAY * level * people * days,
+        "transport": TRANSPORT_PER_PERSON_DAY * level * (adults + children) * days,
+    }
+    accommodation = float(hotel_price * days)
+    flexible_need = sum(need.values())
+    total_need = accommodation + flexible_need * (1 + CONTINGENCY_RATE)
+
+    if total_need <= budget:
+        # 结余：可调整项按比例上调（不超过 MAX_UPLIFT 倍），剩余进备用金
+        spare = budget - total_need
+        uplift = min(MAX_UPLIFT - 1, spare / (flexible_need * (1 + CONTINGENCY_RATE)))
+        alloc = {k: v * (1 + uplift) for k, v in need.items()}
+        note = "预算充足"
+    else:
+        # 超支：先压缩可调整项（保留备用金比例），仍不够时住宿也按比例压缩
+        room = budget - accommodation
+        if room > 0:
+            scale = room / (flexible_need * (1 + CONTINGENCY_RATE))
+            alloc = {k: v * scale for k, v in need.items()}
+        else:
+            scale = budget / total_need
+            accommodation *= scale
+            alloc = {k: v * scale for k, v in need.items()}
+        note = "预算偏紧，已按比例压缩"
+
+    values = {k: int(v) for k, v in alloc.items()}
+    values["accommodation"] = int(accommodation)
+    values["contingency"] = max(0, budget - sum(values.values()))  # 取整误差和结余都归入备用金
+    reason = (f"{note}：{days}天 · {adults}成人{children}儿童 · 酒店¥{hotel_price}/晚 · "
+              f"{city or '目的地'}物价系数{level:.2f}，按餐饮/门票/交通的人均日花费估算，其余留作备用金")
+    return BudgetPlan(reason=reason, **values)
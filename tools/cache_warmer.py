@@ -0,0 +1,167 @@
+"""
+缓存预热器：为热门目的地在 TTL 过期前刷新城市、酒店、景点、餐厅和城市简介缓存，
+避免每天第一个用户撞上冷缓存。
+
+城市来源：配置列表（WARM_CITIES，逗号分隔）+ 访问日志中按最近度 × 频次排名靠前的城市。
+每轮受调用预算（上游请求数）和速率（次/秒）限制；条目距过期不到 refresh_ahead 秒才刷新。
+
+单次运行：python -m tools.cache_warmer
+定时运行：python -m tools.cache_warmer --every 30   （每 30 分钟一轮）
+"""
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from tools import city_pack, gazetteer, ttl_cache
+
+WARM_CITIES = [c.strip() for c in os.getenv("WARM_CITIES", "").split(",") if c.strip()]
+TOP_N = int(os.getenv("WARM_TOP_N", "20"))
+MAX_CALLS = int(os.getenv("WARM_MAX_CALLS", "200"))        # 每轮最多刷新的条目数
+CALLS_PER_SECOND = float(os.getenv("WARM_RATE", "2"))      # 上游速率上限
+REFRESH_AHEAD = int(os.getenv("WARM_REFRESH_AHEAD", str(6 * 3600)))
+
+
+@dataclass
+class WarmReport:
+    cities: List[str] = field(default_factory=list)
+    refreshed: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    fresh: int = 0
+    skipped_budget: int = 0
+    covered_by_pack: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        lines = [
+            f"预热城市 {len(self.cities)} 个，刷新 {len(self.refreshed)} 条，失败 {len(self.failed)} 条，"
+            f"仍新鲜 {self.fresh} 条，超出预算跳过 {self.skipped_budget} 条，城市包覆盖 {len(self.covered_by_pack)} 个"
+        ]
+        lines += [f"  ❌ {entry}：{error}" for entry, error in self.failed.items()]
+        return "\n".join(lines)
+
+
+def _error_message(result) -> Optional[str]:
+    """工具以 {"error": ...} / [{"error": ...}] 表示失败，城市简介失败时返回提示文本"""
+    if isinstance(result, str):
+        return result if result.startswith("无法生成城市简介") else None
+    if not ttl_cache.is_error(result):
+        return None
+    return str((result[0] if isinstance(result, list) else result or {}).get("error", "未知错误"))
+
+
+def pick_cities(configured: Optional[List[str]] = None, top_n: int = TOP_N) -> List[str]:
+    """配置城市在前，再按访问日志补充，去重保序"""
+    cities = list(configured if configured is not None else WARM_CITIES)
+    cities += ttl_cache.cache.top_cities(limit=top_n)
+    return list(dict.fromkeys(cities))
+
+
+class CacheWarmer:
+    def __init__(self, max_calls: int = MAX_CALLS, calls_per_second: float = CALLS_PER_SECOND,
+                 refresh_ahead: int = REFRESH_AHEAD):
+        self.max_calls = max_calls
+        self.interval = 1.0 / calls_per_second if calls_per_second > 0 else 0.0
+        self.refresh_ahead = refresh_ahead
+        self._calls = 0
+        self._last_call = 0.0
+
+    def _needs_refresh(self, ns: str, key: str) -> bool:
+        expires = ttl_cache.cache.expires_at(ns, key)
+        return expires is None or expires - time.time() < self.refresh_ahead
+
+    def _refresh(self, report: WarmReport, label: str, ns: str, key: str, call: Callable[[], object]):
+        if not self._needs_refresh(ns, key):
+            report.fresh += 1
+            return
+        if self._calls >= self.max_calls:
+            report.skipped_budget += 1
+            return
+        wait = self._last_call + self.interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self._calls += 1
+        self._last_call = time.time()
+        try:
+            with ttl_cache.refreshing():
+                result = call()
+        except Exception as e:
+            report.failed[label] = str(e)
+            return
+        error = _error_message(result)
+        if error:
+            report.failed[label] = error
+        else:
+            report.refreshed.append(label)
+
+    def warm_city(self, city: str, report: WarmReport):
+        from chains.city_intro_chain import get_city_introduction
+        from chains.llm_gateway import batch_lane
+        from tools.attraction_tool import AttractionTool
+        from tools.city_tool import CityTool
+        from tools.hotel_tool import CACHE_NS as HOTEL_NS, HotelTool
+        from tools.restaurant_tool import RestaurantTool
+
+        # 已有新鲜城市包的城市不走缓存，无需预热
+        if city_pack.store.get(city):
+            report.covered_by_pack.append(city)
+            return
+
+        city_tool = CityTool()
+        # 内置地名库能解析的城市不经过 "city" 缓存，无需刷新
+        if gazetteer.lookup(city) is None:
+            self._refresh(report, f"{city}/城市", "city", city, lambda: city_tool._run(city))
+        try:
+            info = city_tool._run(city)  # 地名库或刚刷新的缓存命中，不会再请求百度
+        except Exception as e:
+            report.failed[f"{city}/城市"] = str(e)
+            return
+        if "error" in info:
+            report.failed.setdefault(f"{city}/城市", info["error"])
+            return  # 拿不到经纬度，后面的周边搜索无从谈起
+        lat, lng = info["latitude"], info["longitude"]
+
+        for label, ns, tool, radius in (
+            ("酒店", HOTEL_NS, HotelTool(), 3000),
+            ("景点", "attractions", AttractionTool(), 10000),
+            ("餐厅", "restaurants", RestaurantTool(), 10000),
+        ):
+            self._refresh(report, f"{city}/{label}", ns, ttl_cache.poi_key(lat, lng, radius),
+                          lambda tool=tool, radius=radius: tool._run(lat=lat, lng=lng, radius=radius))
+
+        def _intro():
+            with batch_lane():
+                return get_city_introduction(city)
+
+        self._refresh(report, f"{city}/简介", "city_intro", city, _intro)
+
+    def run(self, cities: Optional[List[str]] = None) -> WarmReport:
+        self._calls = 0
+        report = WarmReport(cities=pick_cities(cities))
+        for city in report.cities:
+            self.warm_city(city, report)
+        return report
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="热门目的地缓存预热")
+    parser.add_argument("cities", nargs="*", help="额外指定的城市（默认读取 WARM_CITIES）")
+    parser.add_argument("--every", type=float, default=0, help="每隔多少分钟运行一轮，0 表示只运行一次")
+    parser.add_argument("--max-calls", type=int, default=MAX_CALLS)
+    parser.add_argument("--rate", type=float, default=CALLS_PER_SECOND)
+    args = parser.parse_args(argv)
+
+    configured = (args.cities or []) + WARM_CITIES
+    warmer = CacheWarmer(max_calls=args.max_calls, calls_per_second=args.rate)
+    while True:
+        started = time.time()
+        report = warmer.run(configured)
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {report.summary()}", flush=True)
+        if args.every <= 0:
+            return 1 if report.failed else 0
+        time.sleep(max(0.0, args.every * 60 - (time.time() - started)))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
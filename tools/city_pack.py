@@ -0,0 +1,233 @@
+"""
+预计算城市包（city pack）：
+热门目的地的地理编码、酒店/景点/餐厅、平台增强信息和城市简介离线打包，
+在线时 CityTool / 各搜索工具 / 城市简介优先读包，只有未覆盖或过期的城市才实时调用。
+
+存储格式（单文件、只读、mmap 共享）：
+    [header 32B] magic "CPK1" | version u16 | 保留 u16 | index_offset u64 | index_length u64 | 保留 u64
+    [blob ...]   每个城市一段 zlib 压缩的 JSON
+    [index]      JSON：{城市: {offset, length, built_at, lat, lng}}
+多个 worker 进程 mmap 同一个文件，由操作系统页缓存共享；重新构建时写临时文件后原子替换。
+
+构建：python -m tools.city_pack build 苏州 杭州 成都
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+DATA_DIR = os.getenv("TRAVEL_AGENT_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+PACK_PATH = os.getenv("CITY_PACK_PATH", os.path.join(DATA_DIR, "city_packs.bin"))
+MAX_AGE_DAYS = float(os.getenv("CITY_PACK_MAX_AGE_DAYS", "30"))
+MATCH_RADIUS_M = 300  # 查询中心与包中心相距不超过该距离才认为是同一次搜索
+DECODED_CACHE_SIZE = 64  # 每个存储最多缓存多少个解压后的城市包
+
+MAGIC = b"CPK1"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHQQQ")
+
+POI_KINDS = ("hotels", "attractions", "restaurants")
+
+_building = False  # 构建时跳过读包，保证拿到实时数据
+
+
+def _distance(lat1, lng1, lat2, lng2) -> float:
+    from tools.route_planner import distance_meters
+    try:
+        return distance_meters(lat1, lng1, lat2, lng2)
+    except ValueError:
+        return float("inf")
+
+
+class CityPackStore:
+    """只读城市包存储，文件被替换（mtime 变化）时自动重新映射"""
+
+    def __init__(self, path: str = PACK_PATH, max_age_days: float = MAX_AGE_DAYS):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._mm: Optional[mmap.mmap] = None
+        self._index: Dict[str, dict] = {}
+        self._decoded: "OrderedDict[tuple, Optional[dict]]" = OrderedDict()  # (city, mtime) → 解压后的包，LRU
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._mm, self._index, self._mtime = None, {}, None
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, index_offset, index_length, _ = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            self._mm, self._index, self._mtime = None, {}, mtime
+            return
+        self._index = json.loads(mm[index_offset:index_offset + index_length])
+        self._mm, self._mtime = mm, mtime
+        self._decoded.clear()
+
+    def _load(self, city: str, mtime) -> Optional[dict]:
+        key = (city, mtime)
+        if key in self._decoded:
+            self._decoded.move_to_end(key)
+            return self._decoded[key]
+        entry = self._index.get(city)
+        if not entry or self._mm is None:
+            return None
+        blob = self._mm[entry["offset"]:entry["offset"] + entry["length"]]
+        pack = self._decoded[key] = json.loads(zlib.decompress(blob))
+        if len(self._decoded) > DECODED_CACHE_SIZE:
+            self._decoded.popitem(last=False)
+        return pack
+
+    def cities(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._index)
+
+    def get(self, city: str) -> Optional[dict]:
+        """读取新鲜的城市包，不存在或过期返回 None"""
+        if _building:
+            return None
+        with self._lock:
+            self._refresh()
+            entry = self._index.get(city)
+            if not entry or time.time() - entry["built_at"] > self.max_age:
+                return None
+            return self._load(city, self._mtime)
+
+    def find_near(self, lat: float, lng: float) -> Optional[dict]:
+        """按搜索中心找对应的城市包（工具只拿得到经纬度）"""
+        if _building:
+            return None
+        with self._lock:
+            self._refresh()
+            names = [c for c, e in self._index.items() if _distance(lat, lng, e["lat"], e["lng"]) <= MATCH_RADIUS_M]
+        for city in names:
+            pack = self.get(city)
+            if pack:
+                return pack
+        return None
+
+
+store = CityPackStore()
+
+
+def lookup_city(city: str) -> Optional[dict]:
+    pack = store.get(city)
+    return dict(pack["city_info"]) if pack and pack.get("city_info") else None
+
+
+def lookup_intro(city: str) -> Optional[str]:
+    pack = store.get(city)
+    return pack.get("intro") if pack else None
+
+
+def lookup_pois(kind: str, lat: float, lng: float, radius: int, limit: Optional[int] = None) -> Optional[List[dict]]:
+    """命中城市包时按半径过滤后返回 POI 列表（拷贝，调用方可随意修改）；
+    给了 limit 时，构建时请求的条数不足 limit 的包（如候选数调大之前建的）不用"""
+    pack = store.find_near(lat, lng)
+    if not pack or not pack.get(kind) or radius > pack.get("radius", {}).get(kind, 0):
+        return None
+    if limit is not None and pack.get("limit", {}).get(kind, 0) < limit:
+        return None
+    items = [dict(p) for p in pack[kind] if p.get("距离(米)", 0) <= radius]
+    return items or None
+
+
+def write_packs(packs: Dict[str, dict], path: str = PACK_PATH) -> str:
+    """合并写入：保留未重建的城市，写临时文件后原子替换"""
+    existing = CityPackStore(path, max_age_days=float("inf"))
+    merged = {city: existing._load(city, None) for city in existing.cities()}
+    merged.update(packs)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    index = {}
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        for city, pack in merged.items():
+            if not pack:
+                continue
+            blob = zlib.compress(json.dumps(pack, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+            info = pack["city_info"]
+            index[city] = {"offset": f.tell(), "length": len(blob), "built_at": pack["built_at"],
+                           "lat": info["latitude"], "lng": info["longitude"]}
+            f.write(blob)
+        index_bytes = json.dumps(index, ensure_ascii=False).encode("utf-8")
+        index_offset = f.tell()
+        f.write(index_bytes)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, index_offset, len(index_bytes), 0))
+    os.replace(tmp, path)
+    return path
+
+
+def build_pack(city: str) -> dict:
+    """实时调用各工具生成一个城市包"""
+    from chains.city_intro_chain import get_city_introduction
+    from chains.llm_gateway import batch_lane
+    from tools.attraction_tool import AttractionTool
+    from tools.city_tool import CityTool
+    from tools.hotel_tool import MAX_CANDIDATES, HotelTool
+    from tools.platform_info_tool import PlatformInfoTool
+    from tools.restaurant_tool import RestaurantTool
+
+    global _building
+    _building = True
+    try:
+        info = CityTool()._run(city)
+        if "error" in info:
+            raise RuntimeError(info["error"])
+        lat, lng = info["latitude"], info["longitude"]
+        tools = {"hotels": HotelTool(), "attractions": AttractionTool(), "restaurants": RestaurantTool()}
+        radius = {"hotels": 3000, "attractions": 10000, "restaurants": 10000}
+        pack = {"city": city, "built_at": time.time(), "city_info": info, "radius": radius,
+                "limit": {"hotels": MAX_CANDIDATES}}
+        platform_tool = PlatformInfoTool()
+        for kind, tool in tools.items():
+            items = tool._run(lat=lat, lng=lng, radius=radius[kind])
+            items = [i for i in items if "error" not in i]
+            if kind != "hotels":
+                name_key, poi_type = ("景点名称", "attraction") if kind == "attractions" else ("餐厅名称", "restaurant")
+                for item in items:
+                    item["平台信息"] = platform_tool._run(name=item[name_key], city=city, poi_type=poi_type)
+            pack[kind] = items
+        with batch_lane():
+            intro = get_city_introduction(city)
+        if not intro.startswith("无法生成城市简介"):
+            pack["intro"] = intro
+        return pack
+    finally:
+        _building = False
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) < 2 or argv[0] != "build":
+        print("用法：python -m tools.city_pack build 城市1 城市2 ...")
+        return 2
+    packs = {}
+    for city in argv[1:]:
+        try:
+            packs[city] = build_pack(city)
+            print(f"✅ {city}：酒店 {len(packs[city]['hotels'])}，景点 {len(packs[city]['attractions'])}，"
+                  f"餐厅 {len(packs[city]['restaurants'])}")
+        except Exception as e:
+            print(f"❌ {city}：{e}")
+    if packs:
+        print(f"已写入 {write_packs(packs)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,10 +1,11 @@
 import os
 from typing import Optional
 
-import requests
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from tools import city_pack, gazetteer, http_client, resilience, ttl_cache
+
 try:
     import streamlit as st  # type: ignore
 except Exception:
@@ -35,25 +36,45 @@ class CityTool(BaseTool):
     args_schema: Optional[type] = CityInfoInput
 
     def _run(self, city: str):
+        return http_client.run_sync(self._arun(city=city))
+
+    async def _arun(self, city: str):
+        # 0. 热门城市优先读预计算城市包
+        packed = city_pack.lookup_city(city)
+        if packed:
+            return packed
+        # 1. 已知城市走内置地名库，微秒级，无需请求百度
+        place = gazetteer.lookup(city)
+        if place is not None:
+            return {
+                "city":      city,
+                "latitude":  place.latitude,
+                "longitude": place.longitude,
+                "timezone":  "UTC+8",
+                "summary":   place.formatted_address
+            }
+        return await ttl_cache.cache.acached_call("city", city, lambda: self._fetch(city), ttl=ttl_cache.CITY_TTL)
+
+    async def _fetch(self, city: str):
         if not BAIDU_AK:
             return {"error": "未配置百度地图密钥（BAIDU_AK）。请在环境变量或 Streamlit secrets 中设置。"}
 
-        # 1. 百度地图地理编码拿经纬度
+        # 2. 百度地图地理编码拿经纬度
         geo_url = "http://api.map.baidu.com/geocoding/v3/"
         params = {
             "ak": BAIDU_AK,
             "address": city,
             "output": "json"
         }
-        r = requests.get(geo_url, params=params, timeout=5).json()
+        r = await http_client.get_json(geo_url, params)
         if r.get("status") != 0 or not r.get("result") or not r["result"].get("location"):
-            return {"error": f"百度地理编码失败：{r.get('message', 'unknown')}"}
+            return resilience.baidu_error(r, "百度地理编码失败：")
 
         location = r["result"]["location"]
         lng = float(location["lng"])
         lat = float(location["lat"])
 
-        # 2. 百度地图逆地理编码拿行政区划+简介
+        # 3. 百度地图逆地理编码拿行政区划+简介
         regeo_url = "http://api.map.baidu.com/reverse_geocoding/v3/"
         params2 = {
             "ak": BAIDU_AK,
@@ -61,9 +82,9 @@ class CityTool(BaseTool):
             "output": "json",
             "pois": 0  # 不返回周边POI
         }
-        r2 = requests.get(regeo_url, params=params2, timeout=5).json()
+        r2 = await http_client.get_json(regeo_url, params2)
         if r2.get("status") != 0 or not r2.get("result"):
-            return {"error": f"百度逆地理编码失败：{r2.get('message', 'unknown')}"}
+            return resilience.baidu_error(r2, "百度逆地理编码失败：")
 
         address = r2["result"].get("formatted_address", "")  # 省市区拼接
         return {
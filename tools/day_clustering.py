@@ -0,0 +1,120 @@
+"""
+按天地理分组：把候选景点和餐厅划分成 trip_days 个紧凑、大小均衡的簇，每天只在自己的簇里选点。
+- 距离矩阵一次性向量化计算（复用 hotel_ranker.distance_matrix）
+- 均衡 k-medoids：景点、餐厅分别按容量 ceil(n/k) 分配到最近的中心点，保证每天都有景点和餐厅
+- 锚定酒店：更新中心点时加上 "离酒店距离 × anchor_weight" 的惩罚，簇不会被拉到城市另一头
+- 固定迭代次数，中心点不再变化时提前结束；种子固定时结果可复现
+"""
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from tools.hotel_ranker import distance_matrix
+
+ITERATIONS = 12
+ANCHOR_WEIGHT = 0.3  # 中心点离酒店每远 1 米，相当于簇内每个点多走 0.3 米
+
+
+@dataclass
+class DayCluster:
+    attractions: List[dict]
+    restaurants: List[dict]
+    center: tuple  # (lat, lng)，簇的中心点（medoid）
+
+
+def _balanced_assign(cost: np.ndarray, k: int) -> np.ndarray:
+    """cost: (n, k)。按代价从小到大贪心分配，每簇最多 ceil(n/k) 个点"""
+    n = cost.shape[0]
+    labels = np.full(n, -1)
+    if n == 0:
+        return labels
+    capacity = np.full(k, math.ceil(n / k))
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        i, c = divmod(int(flat), k)
+        if labels[i] < 0 and capacity[c] > 0:
+            labels[i] = c
+            capacity[c] -= 1
+    return labels
+
+
+def _init_medoids(d: np.ndarray, to_hotel: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """k-medoids++：第一个取离酒店最近的点，其余按到已选中心点距离的平方加权抽样"""
+    medoids = [int(np.argmin(to_hotel))]
+    while len(medoids) < k:
+        weight = d[:, medoids].min(axis=1) ** 2
+        if weight.sum() <= 0:
+            break
+        medoids.append(int(rng.choice(len(weight), p=weight / weight.sum())))
+    return np.array(medoids)
+
+
+def cluster_days(attractions: Sequence[dict], restaurants: Sequence[dict], days: int,
+                 hotel_lat: float, hotel_lng: float, seed: Optional[int] = 0,
+                 iterations: int = ITERATIONS, anchor_weight: float = ANCHOR_WEIGHT) -> List[DayCluster]:
+    """POI 需带 lat / lng。返回 days 个 DayCluster，离酒店近的簇排在前面"""
+    days = max(1, days)
+    pois = list(attractions) + list(restaurants)
+    if not pois:
+        return [DayCluster([], [], (hotel_lat, hotel_lng)) for _ in range(days)]
+
+    points = np.array([(p["lat"], p["lng"]) for p in pois], dtype=np.float64)
+    d = distance_matrix(points, points)
+    to_hotel = distance_matrix(points, np.array([[hotel_lat, hotel_lng]]))[:, 0]
+    groups = [np.arange(len(attractions)), np.arange(len(attractions), len(pois))]
+    k = min(days, len(pois))
+
+    rng = np.random.default_rng(seed)
+    medoids = _init_medoids(d, to_hotel, k, rng)
+    k = len(medoids)
+    labels = np.empty(len(pois), dtype=int)
+    for _ in range(iterations):
+        for idx in groups:
+            labels[idx] = _balanced_assign(d[np.ix_(idx, medoids)], k)
+        updated = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            if len(members) == 0:
+                continue
+            cost = d[np.ix_(members, members)].sum(axis=0) + anchor_weight * len(members) * to_hotel[members]
+            updated[c] = members[int(np.argmin(cost))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    for idx in groups:
+        labels[idx] = _balanced_assign(d[np.ix_(idx, medoids)], k)
+
+    order = np.argsort(to_hotel[medoids], kind="stable")
+    clusters = []
+    for c in order:
+        members = np.flatnonzero(labels == c)
+        clusters.append(DayCluster(
+            attractions=[pois[i] for i in members if i < len(attractions)],
+            restaurants=[pois[i] for i in members if i >= len(attractions)],
+            center=tuple(points[medoids[c]]),
+        ))
+    # 天数多于 POI 数时，多出来的天先给空簇，由 day_candidates 从剩余候选中补齐
+    clusters += [DayCluster([], [], (hotel_lat, hotel_lng)) for _ in range(days - len(clusters))]
+    return clusters
+
+
+def _top_up(own: List[dict], avail: List[dict], center: tuple, minimum: int) -> List[dict]:
+    remaining = {id(p) for p in avail}
+    picked = [p for p in own if id(p) in remaining]
+    if len(picked) >= minimum or len(picked) == len(avail):
+        return picked
+    taken = {id(p) for p in picked}
+    rest = [p for p in avail if id(p) not in taken]
+    dist = distance_matrix(np.array([(p["lat"], p["lng"]) for p in rest]), np.array([center]))[:, 0]
+    return picked + [rest[i] for i in np.argsort(dist, kind="stable")[:minimum - len(picked)]]
+
+
+def day_candidates(cluster: DayCluster, avail_attractions: List[dict], avail_restaurants: List[dict],
+                   min_attractions: int = 2, min_restaurants: int = 2):
+    """
+    当天的候选 = 本簇中尚未被前几天用掉的 POI；不够排一天（2 个景点 + 2 家餐厅）时，
+    从全局剩余候选里按离本簇中心的距离补齐。
+    """
+    return (_top_up(cluster.attractions, avail_attractions, cluster.center, min_attractions),
+            _top_up(cluster.restaurants, avail_restaurants, cluster.center, min_restaurants))
@@ -1,29 +1,54 @@
+from tools.transport_modes import MODE_ICONS
+
+MD_HEADER = "# 全程旅行行程单\n\n"
+
+
+def md_day(day):
+    """
+    单天的 Markdown 段落。
+    返回：(文本, 路程 km, 交通分钟, 步行 km)，供调用方累加全程总结
+    """
+    lines = [f"## Day {day.day} 行程"]
+    day_km = 0.0
+    day_min = 0
+    day_walk_km = 0.0
+    for act in day.activities:
+        # 有交通段的活动显示交通方式、用时和费用
+        if act.transport_duration > 0:
+            icon = MODE_ICONS.get(act.transport_mode, "🚶")
+            fare = f" ¥{act.transport_cost}" if act.transport_cost else ""
+            lines.append(f"- {act.start.strftime('%m-%d %H:%M')} - {act.end.strftime('%H:%M')}　{act.name}　{icon}{act.transport_mode} {act.transport_duration}min{fare}")
+            day_km += act.transport_distance / 1000   # 出行时间矩阵给出的实际路程（米）
+            day_min += act.transport_duration
+            if act.transport_mode == "步行":
+                day_walk_km += act.transport_distance / 1000
+        else:
+            lines.append(f"- {act.start.strftime('%m-%d %H:%M')} - {act.end.strftime('%H:%M')}　{act.name}")
+    lines.append(f"> 本日交通：{day_km:.2f} km · {day_min} min（步行 {day_walk_km:.2f} km）· 交通费 ¥{day.transport}")
+    lines.append("")
+    return "\n".join(lines) + "\n", day_km, day_min, day_walk_km
+
+
+def md_footer(total_km, total_min, total_walk_km):
+    return f"---\n**全程总结**：总路程 {total_km:.2f} km（步行 {total_walk_km:.2f} km）· 交通总时长 {total_min} min"
+
+
 def export_full_md(itinerary_days):
     """
     itinerary_days: List[DayPlan]  # 每天一个 DayPlan
-    返回：Markdown 文本
+    返回：Markdown 文本（逐天生成、边写边导出请用 tools.trip_export.TripExporter）
     """
-    lines = ["# 全程旅行行程单", ""]
+    parts = [MD_HEADER]
     total_km = 0.0
     total_min = 0
+    total_walk_km = 0.0
 
     for day in itinerary_days:
-        lines.append(f"## Day {day.day} 行程")
-        day_km = 0.0
-        day_min = 0
-        for act in day.activities:
-            # 只对步行活动显示步行时间和符号
-            if act.transport_mode == "步行" and act.transport_duration > 0:
-                lines.append(f"- {act.start.strftime('%m-%d %H:%M')} - {act.end.strftime('%H:%M')}　{act.name}　🚶{act.transport_duration}min")
-                day_km += act.transport_duration * 80 / 1000   # 80 m/min → km（简化）
-                day_min += act.transport_duration
-            else:
-                lines.append(f"- {act.start.strftime('%m-%d %H:%M')} - {act.end.strftime('%H:%M')}　{act.name}")
-        lines.append(f"> 本日步行：{day_km:.2f} km · {day_min} min")
+        text, day_km, day_min, day_walk_km = md_day(day)
+        parts.append(text)
         total_km += day_km
         total_min += day_min
-        lines.append("")
+        total_walk_km += day_walk_km
 
-    lines.append("---")
-    lines.append(f"**全程总结**：总步行 {total_km:.2f} km · 总时长 {total_min} min**")
-    return "\n".join(lines)
\ No newline at end of file
+    parts.append(md_footer(total_km, total_min, total_walk_km))
+    return "".join(parts)
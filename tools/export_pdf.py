@@ -1,21 +1,158 @@
 # tools/export_pdf.py
-def export_pdf(md_text):
+"""
+PDF 行程单导出：Markdown → HTML → WeasyPrint。
+- 渲染放在后台线程，按 Markdown 内容哈希去重：同一份行程单只渲染一次，页面先继续渲染，文件好了再出下载按钮
+- 结果写入磁盘缓存（DATA_DIR/pdf_cache），按最近访问时间淘汰，总大小不超过 PDF_CACHE_MAX_MB
+- FontConfiguration、样式表和图片缓存每个渲染线程只建一次（WeasyPrint 的这些对象不能跨线程共用）；
+  字体按子集嵌入（full_fonts=False）
+- HTML 只由 Markdown 决定（不带生成时间），同一个缓存键总是对应同一份 PDF
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+DATA_DIR = os.getenv("TRAVEL_AGENT_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(DATA_DIR, "pdf_cache"))
+PDF_CACHE_MAX_BYTES = int(float(os.getenv("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))
+
+PAGE_CSS = """
+@page { size: A4; margin: 18mm 16mm; }
+body { font-family: "SimHei", "Noto Sans CJK SC", "WenQuanYi Micro Hei", sans-serif; font-size: 11pt; }
+h1 { font-size: 20pt; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border: 1px solid #ccc; padding: 4px 6px; }
+"""
+
+_pool = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf-export")
+_pending = {}  # key → Future，在途任务去重
+_lock = threading.Lock()
+_renderers = threading.local()  # 每个 pdf-export 线程一份 _Renderer
+
+
+def pdf_key(md_text: str) -> str:
+    return hashlib.sha256(md_text.encode("utf-8")).hexdigest()
+
+
+def render_html(md_text: str) -> str:
     import markdown
-    import tempfile
-    import os
-    from datetime import datetime
 
     # Markdown → HTML
     html = markdown.markdown(md_text, extensions=['extra'])
-    html_full = f"""
+    return f"""
     <html><head><meta charset="utf-8"/><title>行程单</title></head>
-    <body style="font-family:SimHei; margin:40px;">
+    <body>
     <h1>全程旅行行程单</h1><hr>{html}<hr>
-    <p style="text-align:right; color:gray;">生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
     </body></html>
     """
 
-    # 纯 Python → 直接写 PDF（无 wkhtmltopdf）
-    from weasyprint import HTML
-    pdf_bytes = HTML(string=html_full).write_pdf()
-    return pdf_bytes
\ No newline at end of file
+
+class _Renderer:
+    """线程级 WeasyPrint 资源：字体配置（含字体发现）和编译好的样式表每个线程只初始化一次"""
+
+    def __init__(self):
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(string=PAGE_CSS, font_config=self.font_config)
+        self.cache = {}  # WeasyPrint 的图片缓存，跨次渲染复用
+
+    def write_pdf(self, html: str) -> bytes:
+        # 纯 Python → 直接写 PDF（无 wkhtmltopdf）
+        from weasyprint import HTML
+
+        return HTML(string=html).write_pdf(stylesheets=[self.stylesheet], font_config=self.font_config,
+                                           full_fonts=False, cache=self.cache)
+
+
+def _get_renderer() -> _Renderer:
+    renderer = getattr(_renderers, "renderer", None)
+    if renderer is None:
+        renderer = _renderers.renderer = _Renderer()
+    return renderer
+
+
+# ---------- 磁盘缓存 ----------
+def _cache_path(key: str) -> str:
+    return os.path.join(PDF_CACHE_DIR, f"{key}.pdf")
+
+
+def cached_pdf(md_text: str) -> Optional[bytes]:
+    """已生成过就直接返回（并刷新访问时间），否则 None"""
+    path = _cache_path(pdf_key(md_text))
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+
+def _store(key: str, data: bytes):
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, _cache_path(key))  # 原子替换，读者不会看到半个文件
+    _evict()
+
+
+def _evict():
+    """按最近访问时间淘汰，直到总大小不超过上限"""
+    entries = []
+    for name in os.listdir(PDF_CACHE_DIR):
+        if not name.endswith(".pdf"):
+            continue
+        try:
+            st = os.stat(os.path.join(PDF_CACHE_DIR, name))
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= PDF_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(os.path.join(PDF_CACHE_DIR, name))
+            total -= size
+        except OSError:
+            pass
+
+
+# ---------- 对外接口 ----------
+def _render(key: str, md_text: str) -> bytes:
+    try:
+        data = _get_renderer().write_pdf(render_html(md_text))
+        try:
+            _store(key, data)
+        except OSError:
+            pass  # 缓存写失败不影响本次下载
+        return data
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+
+
+def submit_pdf(md_text: str) -> Future:
+    """后台生成 PDF，立即返回 Future（结果为 bytes）；命中磁盘缓存或已有在途任务时直接复用"""
+    key = pdf_key(md_text)
+    data = cached_pdf(md_text)
+    if data is not None:
+        future = Future()
+        future.set_result(data)
+        return future
+    with _lock:
+        future = _pending.get(key)
+        if future is None:
+            future = _pending[key] = _pool.submit(_render, key, md_text)
+        return future
+
+
+def export_pdf(md_text):
+    """同步版本：等待后台任务完成"""
+    return submit_pdf(md_text).result()
@@ -0,0 +1,354 @@
+"""
+内置城市地名库（gazetteer）：
+直辖市、省会及地级城市（含常见自治州/地区/盟）的名称、别名、拼音、所属省份和中心点坐标，
+CityTool 对已知城市直接本地解析，省掉百度「地理编码 + 逆地理编码」两次往返；未知地名再走百度。
+
+查找顺序：精确（名称/全称/别名）→ 去掉省份前缀 → 前缀树最长匹配（"苏州市姑苏区" → 苏州）→ 拼音。
+拼音有歧义（如 suzhou = 苏州/宿州）时返回 None，交给百度处理。
+
+坐标按 WGS-84 录入，加载时转换为百度 BD-09，与百度接口返回的坐标系一致。
+"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# 名称|拼音|省份|纬度|经度|全称（空则为 名称+市）|别名（逗号分隔，只收指代城市本身的别称/驻地名，
+# 不收离市中心较远的景区名，否则周边搜索会以错误的中心展开）
+_DATA = """
+北京|beijing|北京市|39.9042|116.4074|北京市|北平,京
+上海|shanghai|上海市|31.2304|121.4737|上海市|沪,魔都
+天津|tianjin|天津市|39.0842|117.2009|天津市|津
+重庆|chongqing|重庆市|29.5630|106.5516|重庆市|渝
+香港|xianggang|香港特别行政区|22.3193|114.1694|香港特别行政区|hongkong
+澳门|aomen|澳门特别行政区|22.1987|113.5439|澳门特别行政区|macau,macao
+台北|taibei|台湾省|25.0330|121.5654||
+石家庄|shijiazhuang|河北省|38.0428|114.5149||
+唐山|tangshan|河北省|39.6309|118.1802||
+秦皇岛|qinhuangdao|河北省|39.9354|119.6005||
+邯郸|handan|河北省|36.6256|114.5391||
+保定|baoding|河北省|38.8739|115.4646||
+张家口|zhangjiakou|河北省|40.8244|114.8875||
+承德|chengde|河北省|40.9515|117.9634||
+廊坊|langfang|河北省|39.5380|116.6838||
+太原|taiyuan|山西省|37.8706|112.5489||
+大同|datong|山西省|40.0768|113.3001||
+晋中|jinzhong|山西省|37.6870|112.7528||
+运城|yuncheng|山西省|35.0264|111.0070||
+忻州|xinzhou|山西省|38.4167|112.7341||
+临汾|linfen|山西省|36.0880|111.5190||
+呼和浩特|huhehaote|内蒙古自治区|40.8426|111.7492||呼市
+包头|baotou|内蒙古自治区|40.6574|109.8402||
+鄂尔多斯|eerduosi|内蒙古自治区|39.6086|109.7809||
+赤峰|chifeng|内蒙古自治区|42.2578|118.8869||
+呼伦贝尔|hulunbeier|内蒙古自治区|49.2116|119.7657||海拉尔
+锡林郭勒|xilinguole|内蒙古自治区|43.9332|116.0479|锡林郭勒盟|锡林浩特
+阿拉善|alashan|内蒙古自治区|38.8510|105.7287|阿拉善盟|
+沈阳|shenyang|辽宁省|41.8057|123.4315||
+大连|dalian|辽宁省|38.9140|121.6147||
+鞍山|anshan|辽宁省|41.1087|122.9946||
+丹东|dandong|辽宁省|40.0006|124.3545||
+锦州|jinzhou|辽宁省|41.0951|121.1270||
+长春|changchun|吉林省|43.8171|125.3235||
+吉林|jilin|吉林省|43.8378|126.5496||
+延边|yanbian|吉林省|42.8912|129.5092|延边朝鲜族自治州|延吉
+哈尔滨|haerbin|黑龙江省|45.8038|126.5350||冰城
+齐齐哈尔|qiqihaer|黑龙江省|47.3543|123.9182||
+牡丹江|mudanjiang|黑龙江省|44.5527|129.6332||
+大庆|daqing|黑龙江省|46.5893|125.1036||
+黑河|heihe|黑龙江省|50.2453|127.5286||
+南京|nanjing|江苏省|32.0603|118.7969||金陵
+无锡|wuxi|江苏省|31.4912|120.3119||
+徐州|xuzhou|江苏省|34.2044|117.2858||
+常州|changzhou|江苏省|31.8107|119.9741||
+苏州|suzhou|江苏省|31.2990|120.5853||姑苏
+南通|nantong|江苏省|31.9802|120.8943||
+连云港|lianyungang|江苏省|34.5967|119.2216||
+淮安|huaian|江苏省|33.6104|119.0153||
+盐城|yancheng|江苏省|33.3475|120.1633||
+扬州|yangzhou|江苏省|32.3942|119.4129||
+镇江|zhenjiang|江苏省|32.1877|119.4250||
+泰州|taizhou|江苏省|32.4555|119.9229||
+宿迁|suqian|江苏省|33.9630|118.2752||
+杭州|hangzhou|浙江省|30.2741|120.1551||
+宁波|ningbo|浙江省|29.8683|121.5440||
+温州|wenzhou|浙江省|27.9938|120.6994||
+嘉兴|jiaxing|浙江省|30.7461|120.7555||
+湖州|huzhou|浙江省|30.8927|120.0868||
+绍兴|shaoxing|浙江省|29.9958|120.5861||
+金华|jinhua|浙江省|29.0790|119.6474||
+衢州|quzhou|浙江省|28.9700|118.8595||
+舟山|zhoushan|浙江省|29.9853|122.2072||
+台州|taizhou|浙江省|28.6564|121.4208||
+丽水|lishui|浙江省|28.4676|119.9229||
+合肥|hefei|安徽省|31.8206|117.2272||
+芜湖|wuhu|安徽省|31.3525|118.4331||
+蚌埠|bengbu|安徽省|32.9166|117.3894||
+安庆|anqing|安徽省|30.5430|117.0635||
+黄山|huangshan|安徽省|29.7147|118.3375||
+宿州|suzhou|安徽省|33.6461|116.9640||
+福州|fuzhou|福建省|26.0745|119.2965||榕城
+厦门|xiamen|福建省|24.4798|118.0894||鹭岛
+莆田|putian|福建省|25.4540|119.0078||
+泉州|quanzhou|福建省|24.8741|118.6757||
+漳州|zhangzhou|福建省|24.5130|117.6472||
+南平|nanping|福建省|26.6418|118.1784||
+龙岩|longyan|福建省|25.0751|117.0174||
+宁德|ningde|福建省|26.6657|119.5479||
+南昌|nanchang|江西省|28.6820|115.8579||
+景德镇|jingdezhen|江西省|29.2689|117.1784||
+九江|jiujiang|江西省|29.7050|116.0019||
+赣州|ganzhou|江西省|25.8312|114.9355||
+上饶|shangrao|江西省|28.4545|117.9433||
+抚州|fuzhou|江西省|27.9492|116.3582||
+济南|jinan|山东省|36.6512|117.1201||泉城
+青岛|qingdao|山东省|36.0671|120.3826||
+淄博|zibo|山东省|36.8131|118.0549||
+烟台|yantai|山东省|37.4638|121.4479||
+潍坊|weifang|山东省|36.7069|119.1618||
+济宁|jining|山东省|35.4148|116.5872||
+泰安|taian|山东省|36.2000|117.0876||
+威海|weihai|山东省|37.5131|122.1204||
+日照|rizhao|山东省|35.4164|119.5269||
+临沂|linyi|山东省|35.1046|118.3564||
+郑州|zhengzhou|河南省|34.7466|113.6254||
+开封|kaifeng|河南省|34.7972|114.3076||
+洛阳|luoyang|河南省|34.6197|112.4540||
+安阳|anyang|河南省|36.0976|114.3925||
+新乡|xinxiang|河南省|35.3030|113.9268||
+南阳|nanyang|河南省|32.9907|112.5283||
+武汉|wuhan|湖北省|30.5928|114.3055||
+十堰|shiyan|湖北省|32.6292|110.7980||
+宜昌|yichang|湖北省|30.6919|111.2865||
+襄阳|xiangyang|湖北省|32.0090|112.1224||
+荆州|jingzhou|湖北省|30.3349|112.2397||
+恩施|enshi|湖北省|30.2720|109.4882|恩施土家族苗族自治州|
+长沙|changsha|湖南省|28.2282|112.9388||星城
+株洲|zhuzhou|湖南省|27.8274|113.1339||
+湘潭|xiangtan|湖南省|27.8297|112.9440||
+衡阳|hengyang|湖南省|26.8938|112.5719||
+岳阳|yueyang|湖南省|29.3570|113.1289||
+常德|changde|湖南省|29.0317|111.6985||
+张家界|zhangjiajie|湖南省|29.1170|110.4792||
+湘西|xiangxi|湖南省|28.3119|109.7389|湘西土家族苗族自治州|吉首
+广州|guangzhou|广东省|23.1291|113.2644||羊城,穗
+韶关|shaoguan|广东省|24.8104|113.5972||
+深圳|shenzhen|广东省|22.5431|114.0579||鹏城
+珠海|zhuhai|广东省|22.2710|113.5767||
+汕头|shantou|广东省|23.3535|116.6822||
+佛山|foshan|广东省|23.0218|113.1219||
+江门|jiangmen|广东省|22.5787|113.0819||
+湛江|zhanjiang|广东省|21.2707|110.3594||
+肇庆|zhaoqing|广东省|23.0469|112.4651||
+惠州|huizhou|广东省|23.1115|114.4152||
+清远|qingyuan|广东省|23.6820|113.0560||
+东莞|dongguan|广东省|23.0207|113.7518||
+中山|zhongshan|广东省|22.5176|113.3926||
+潮州|chaozhou|广东省|23.6567|116.6226||
+南宁|nanning|广西壮族自治区|22.8170|108.3665||
+柳州|liuzhou|广西壮族自治区|24.3264|109.4281||
+桂林|guilin|广西壮族自治区|25.2736|110.2900||
+北海|beihai|广西壮族自治区|21.4733|109.1192||
+玉林|yulin|广西壮族自治区|22.6541|110.1811||
+海口|haikou|海南省|20.0440|110.1999||
+三亚|sanya|海南省|18.2528|109.5119||
+成都|chengdu|四川省|30.5728|104.0668||蓉城,蓉
+泸州|luzhou|四川省|28.8718|105.4423||
+绵阳|mianyang|四川省|31.4678|104.6796||
+乐山|leshan|四川省|29.5521|103.7656||
+宜宾|yibin|四川省|28.7513|104.6417||
+阿坝|aba|四川省|31.8994|102.2214|阿坝藏族羌族自治州|
+甘孜|ganzi|四川省|30.0498|101.9623|甘孜藏族自治州|康定
+凉山|liangshan|四川省|27.8816|102.2673|凉山彝族自治州|西昌
+贵阳|guiyang|贵州省|26.6470|106.6302||筑城
+遵义|zunyi|贵州省|27.7255|106.9272||
+安顺|anshun|贵州省|26.2456|105.9476||
+黔东南|qiandongnan|贵州省|26.5834|107.9829|黔东南苗族侗族自治州|凯里
+昆明|kunming|云南省|25.0389|102.7183||
+曲靖|qujing|云南省|25.4900|103.7962||
+玉溪|yuxi|云南省|24.3518|102.5430||
+保山|baoshan|云南省|25.1120|99.1618||
+丽江|lijiang|云南省|26.8721|100.2299||
+大理|dali|云南省|25.6065|100.2676|大理白族自治州|
+红河|honghe|云南省|23.3639|103.3756|红河哈尼族彝族自治州|蒙自
+西双版纳|xishuangbanna|云南省|22.0017|100.7973|西双版纳傣族自治州|版纳,景洪
+迪庆|diqing|云南省|27.8269|99.7065|迪庆藏族自治州|香格里拉
+拉萨|lasa|西藏自治区|29.6520|91.1721||
+日喀则|rikaze|西藏自治区|29.2670|88.8811||
+林芝|linzhi|西藏自治区|29.6490|94.3615||
+西安|xian|陕西省|34.3416|108.9398||
+宝鸡|baoji|陕西省|34.3619|107.2378||
+咸阳|xianyang|陕西省|34.3296|108.7093||
+延安|yanan|陕西省|36.5853|109.4898||
+汉中|hanzhong|陕西省|33.0676|107.0238||
+榆林|yulin|陕西省|38.2852|109.7346||
+兰州|lanzhou|甘肃省|36.0611|103.8343||
+嘉峪关|jiayuguan|甘肃省|39.7731|98.2899||
+天水|tianshui|甘肃省|34.5809|105.7249||
+张掖|zhangye|甘肃省|38.9259|100.4498||
+酒泉|jiuquan|甘肃省|39.7324|98.4945||
+甘南|gannan|甘肃省|34.9834|102.9110|甘南藏族自治州|
+西宁|xining|青海省|36.6171|101.7782||
+海东|haidong|青海省|36.5029|102.1040||
+海西|haixi|青海省|37.3747|97.3708|海西蒙古族藏族自治州|德令哈
+银川|yinchuan|宁夏回族自治区|38.4872|106.2309||
+石嘴山|shizuishan|宁夏回族自治区|39.0133|106.3839||
+固原|guyuan|宁夏回族自治区|36.0160|106.2424||
+中卫|zhongwei|宁夏回族自治区|37.5000|105.1968||
+乌鲁木齐|wulumuqi|新疆维吾尔自治区|43.8256|87.6168||
+克拉玛依|kelamayi|新疆维吾尔自治区|45.5799|84.8892||
+吐鲁番|tulufan|新疆维吾尔自治区|42.9513|89.1895||
+哈密|hami|新疆维吾尔自治区|42.8185|93.5151||
+喀什|kashi|新疆维吾尔自治区|39.4704|75.9898|喀什地区|
+伊犁|yili|新疆维吾尔自治区|43.9169|81.3241|伊犁哈萨克自治州|伊宁
+阿勒泰|aletai|新疆维吾尔自治区|47.8448|88.1396|阿勒泰地区|
+"""
+
+_PROVINCE_SUFFIX = re.compile(r"(省|市|壮族自治区|回族自治区|维吾尔自治区|自治区|特别行政区)$")
+# 前缀匹配后允许剩下的部分：空、行政区划后缀，或者后缀 + 下辖区县（"苏州市姑苏区"）；
+# "南京路"、"广州塔"、"大连理工大学" 这类以城市名开头的地点交给百度
+_ADMIN_REMAINDER = re.compile(r"^(市|地区|盟|自治州|州)?$|^(市|地区|盟|自治州|州)[\u4e00-\u9fff]{1,4}(区|县|市|旗)$")
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    pinyin: str
+    province: str
+    full_name: str
+    latitude: float   # BD-09
+    longitude: float  # BD-09
+
+    @property
+    def formatted_address(self) -> str:
+        """与百度逆地理编码的 formatted_address 风格一致：省份 + 城市全称"""
+        return self.full_name if self.province == self.full_name else f"{self.province}{self.full_name}"
+
+
+# ---------- 坐标转换：WGS-84 → GCJ-02 → BD-09 ----------
+_A = 6378245.0
+_EE = 0.00669342162296594323
+
+
+def _transform_lat(x: float, y: float) -> float:
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(y * math.pi) + 40.0 * math.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (160.0 * math.sin(y / 12.0 * math.pi) + 320.0 * math.sin(y * math.pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _transform_lng(x: float, y: float) -> float:
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(x * math.pi) + 40.0 * math.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (150.0 * math.sin(x / 12.0 * math.pi) + 300.0 * math.sin(x / 30.0 * math.pi)) * 2.0 / 3.0
+    return ret
+
+
+def wgs84_to_bd09(lat: float, lng: float) -> Tuple[float, float]:
+    # WGS-84 → GCJ-02
+    d_lat = _transform_lat(lng - 105.0, lat - 35.0)
+    d_lng = _transform_lng(lng - 105.0, lat - 35.0)
+    rad_lat = lat / 180.0 * math.pi
+    magic = 1 - _EE * math.sin(rad_lat) ** 2
+    sqrt_magic = math.sqrt(magic)
+    d_lat = (d_lat * 180.0) / ((_A * (1 - _EE)) / (magic * sqrt_magic) * math.pi)
+    d_lng = (d_lng * 180.0) / (_A / sqrt_magic * math.cos(rad_lat) * math.pi)
+    g_lat, g_lng = lat + d_lat, lng + d_lng
+    # GCJ-02 → BD-09
+    z = math.sqrt(g_lng * g_lng + g_lat * g_lat) + 0.00002 * math.sin(g_lat * math.pi * 3000.0 / 180.0)
+    theta = math.atan2(g_lat, g_lng) + 0.000003 * math.cos(g_lng * math.pi * 3000.0 / 180.0)
+    return z * math.sin(theta) + 0.006, z * math.cos(theta) + 0.0065
+
+
+# ---------- 索引 ----------
+class _TrieNode:
+    __slots__ = ("children", "place")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.place: Optional[Place] = None
+
+
+class Gazetteer:
+    def __init__(self, data: str = _DATA):
+        self._exact: Dict[str, Place] = {}
+        self._pinyin: Dict[str, List[Place]] = {}
+        self._trie = _TrieNode()
+        self._provinces: List[str] = []
+        self._province_names: set = set()
+
+        provinces = set()
+        for line in data.strip().splitlines():
+            name, pinyin, province, lat, lng, full_name, aliases = line.split("|")
+            bd_lat, bd_lng = wgs84_to_bd09(float(lat), float(lng))
+            place = Place(name, pinyin, province, full_name or f"{name}市", round(bd_lat, 6), round(bd_lng, 6))
+            keys = {name, place.full_name} | {a for a in aliases.split(",") if a}
+            for key in keys:
+                self._exact.setdefault(key, place)
+                if len(key) >= 2:  # 单字简称（沪、渝…）只做精确匹配，避免前缀误判
+                    self._insert(key, place)
+            for key in {pinyin} | {a for a in aliases.split(",") if a.isascii()}:
+                self._pinyin.setdefault(key, []).append(place)
+            provinces.add(province)
+        # 省份前缀（含简称形式，如"江苏省"和"江苏"），按长度降序便于最长匹配
+        prefixes = set()
+        for province in provinces:
+            prefixes.add(province)
+            short = _PROVINCE_SUFFIX.sub("", province)
+            if short and short not in self._exact:
+                prefixes.add(short)
+        self._provinces = sorted(prefixes, key=len, reverse=True)
+        self._province_names = {p for p in prefixes if p not in self._exact}
+
+    def _insert(self, key: str, place: Place):
+        node = self._trie
+        for ch in key:
+            node = node.children.setdefault(ch, _TrieNode())
+        if node.place is None:
+            node.place = place
+
+    def _longest_prefix(self, text: str) -> Optional[Place]:
+        """最长的城市名前缀，且剩余部分只能是行政区划后缀（见 _ADMIN_REMAINDER）"""
+        node, found = self._trie, None
+        for i, ch in enumerate(text):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.place is not None and _ADMIN_REMAINDER.match(text[i + 1:]):
+                found = node.place
+        return found
+
+    def lookup(self, query: str) -> Optional[Place]:
+        """解析城市名，未命中或有歧义时返回 None"""
+        text = re.sub(r"\s+", "", query or "")
+        if not text:
+            return None
+        if text in self._exact:
+            return self._exact[text]
+        # 省名本身（"吉林省"、"江苏"）不是城市，不能解析成同名的地级市
+        if text in self._province_names:
+            return None
+        # 去掉省份前缀："江苏省苏州市" → "苏州市"
+        for prefix in self._provinces:
+            if text.startswith(prefix) and len(text) > len(prefix):
+                text = text[len(prefix):]
+                if text in self._exact:
+                    return self._exact[text]
+                break
+        place = self._longest_prefix(text)
+        if place is not None:
+            return place
+        # 拼音：大小写/空格/末尾 shi 不敏感，多个同音城市时放弃
+        key = re.sub(r"[^a-z]", "", text.lower())
+        key = re.sub(r"shi$", "", key) if key not in self._pinyin else key
+        candidates = self._pinyin.get(key, [])
+        return candidates[0] if len(candidates) == 1 else None
+
+
+gazetteer = Gazetteer()
+
+
+def lookup(city: str) -> Optional[Place]:
+    return gazetteer.lookup(city)
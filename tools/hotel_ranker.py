@@ -0,0 +1,71 @@
+"""
+酒店选址排序：
+用 numpy 一次算出 酒店 × POI（景点 + 餐厅）的球面距离矩阵，取每家酒店最近 k 个 POI 的平均距离
+估算每天往返的通勤时间，再与房价折算成同一口径（元）排序。
+几百家酒店 × 几千个 POI 也只是一次矩阵运算，毫秒级完成。
+"""
+import os
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from tools.travel_time import DETOUR_FACTOR
+
+EARTH_RADIUS = 6371000  # 米
+K_NEAREST = int(os.getenv("HOTEL_RANK_K", "8"))
+TRANSFER_SPEED = 250   # 米/分钟，步行与公交/打车的混合平均速度
+TRANSFERS_PER_DAY = 2  # 每天从酒店出发、回到酒店各一次
+VALUE_OF_TIME = float(os.getenv("HOTEL_VALUE_OF_TIME", "1.0"))  # 元/分钟，通勤时间折算成本
+
+
+def poi_points(items: Iterable[dict]) -> List[Tuple[float, float]]:
+    """工具返回的 POI 列表 → [(lat, lng)]；location 字段是 "lng,lat" 格式，解析失败的跳过"""
+    points = []
+    for item in items:
+        if "error" in item:
+            continue
+        try:
+            if "lat" in item and "lng" in item:
+                points.append((float(item["lat"]), float(item["lng"])))
+            else:
+                lng, lat = item["location"].split(",")
+                points.append((float(lat), float(lng)))
+        except (KeyError, ValueError, AttributeError):
+            continue
+    return points
+
+
+def distance_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """a: (n, 2)、b: (m, 2) 的 (lat, lng) 度数 → (n, m) 的球面距离（米）"""
+    lat1, lng1 = np.radians(a[:, 0])[:, None], np.radians(a[:, 1])[:, None]
+    lat2, lng2 = np.radians(b[:, 0])[None, :], np.radians(b[:, 1])[None, :]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def rank_hotels(hotels: List[dict], pois: Iterable[dict], k: int = K_NEAREST,
+                value_of_time: float = VALUE_OF_TIME, default_price: int = 200) -> List[dict]:
+    """
+    返回按 综合成本 = 每日通勤分钟 × value_of_time + 房价 升序排列的酒店（拷贝，附加
+    "日均通勤(分钟)"、"综合成本" 字段）。没有 POI 时保持原顺序。
+    """
+    hotels = [dict(h) for h in hotels if "error" not in h]
+    points = poi_points(pois)
+    if not hotels or not points:
+        return hotels
+
+    h = np.array([(float(x.get("lat", 0)), float(x.get("lng", 0))) for x in hotels])
+    p = np.array(points)
+    d = distance_matrix(h, p)
+    k = max(1, min(k, p.shape[0]))
+    nearest = np.partition(d, k - 1, axis=1)[:, :k].mean(axis=1)  # 最近 k 个 POI 的平均距离
+    minutes = nearest * DETOUR_FACTOR / TRANSFER_SPEED * TRANSFERS_PER_DAY
+    prices = np.array([x.get("价格数值") or default_price for x in hotels], dtype=np.float64)
+    cost = minutes * value_of_time + prices
+
+    order = np.lexsort((prices, cost))  # 综合成本相同时便宜的在前
+    for i, x in enumerate(hotels):
+        x["日均通勤(分钟)"] = int(round(minutes[i]))
+        x["综合成本"] = int(round(cost[i]))
+    return [hotels[i] for i in order]
+
@@ -1,11 +1,12 @@
 import math
 import os
 
-import requests
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Optional
 
+from tools import city_pack, http_client, resilience, ttl_cache
+
 try:
     import streamlit as st  # type: ignore
 except Exception:
@@ -26,15 +27,19 @@ def _get_baidu_ak() -> str | None:
 
 
 BAIDU_AK = _get_baidu_ak()
+MAX_CANDIDATES = int(os.getenv("HOTEL_CANDIDATES", "60"))  # 候选酒店数，交给 hotel_ranker 按行程排序
+PAGE_SIZE = 20  # 百度地点检索单页上限
+CACHE_NS = "hotels:v2"  # 候选数从 5 提到 60 后换了命名空间，旧的 5 条缓存不再命中
 
 class HotelSearchInput(BaseModel):
     lat: float = Field(description="纬度")
     lng: float = Field(description="经度")
     radius: int = Field(3000, description="搜索半径（米）")
+    limit: int = Field(MAX_CANDIDATES, description="最多返回的酒店数")
 
 class HotelTool(BaseTool):
     name: Optional[str] = "hotel_search"
-    description: Optional[str] = "根据经纬度搜索周边酒店（Top-5，百度地图版）"
+    description: Optional[str] = "根据经纬度搜索周边酒店候选（按距离排序，百度地图版）"
     args_schema: Optional[type] = HotelSearchInput
 
     def _calculate_distance(self, lat1, lng1, lat2, lng2):
@@ -46,24 +51,53 @@ class HotelTool(BaseTool):
         c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
         return R * c
 
-    def _run(self, lat: float, lng: float, radius: int = 3000):
+    def _run(self, lat: float, lng: float, radius: int = 3000, limit: int = MAX_CANDIDATES):
+        return http_client.run_sync(self._arun(lat=lat, lng=lng, radius=radius, limit=limit))
+
+    async def _arun(self, lat: float, lng: float, radius: int = 3000, limit: int = MAX_CANDIDATES):
+        # 命中预计算城市包时直接返回，不再请求百度
+        packed = city_pack.lookup_pois("hotels", lat, lng, radius, limit=limit)
+        if packed:
+            return packed[:limit]
+        key = ttl_cache.poi_key(lat, lng, radius)
+        if limit != MAX_CANDIDATES:
+            key = f"{key}|{limit}"
+        return await ttl_cache.cache.acached_call(
+            CACHE_NS, key, lambda: self._fetch(lat, lng, radius, limit), ttl=ttl_cache.POI_TTL,
+        )
+
+    async def _search(self, lat: float, lng: float, radius: int, limit: int):
+        """按页拉取，直到凑够 limit 个或没有更多结果"""
+        results = []
+        for page_num in range(-(-limit // PAGE_SIZE)):
+            params = {
+                "ak": BAIDU_AK,
+                "query": "酒店",
+                "location": f"{lat},{lng}",  # 百度地图格式：纬度,经度
+                "radius": radius,
+                "output": "json",
+                "scope": 2,  # 返回详细信息
+                "page_size": min(PAGE_SIZE, limit),
+                "page_num": page_num
+            }
+            r = await http_client.get_json("http://api.map.baidu.com/place/v2/search", params)
+            if r.get("status") != 0:
+                if results:
+                    break  # 后续页失败时保留已拿到的结果
+                return r
+            page = r.get("results", [])
+            results += page
+            if len(page) < params["page_size"]:
+                break
+        return {"status": 0, "results": results[:limit]}
+
+    async def _fetch(self, lat: float, lng: float, radius: int, limit: int = MAX_CANDIDATES):
         if not BAIDU_AK:
             return [{"error": "未配置百度地图密钥（BAIDU_AK）。请在环境变量或 Streamlit secrets 中设置。"}]
 
-        url = "http://api.map.baidu.com/place/v2/search"
-        params = {
-            "ak": BAIDU_AK,
-            "query": "酒店",
-            "location": f"{lat},{lng}",  # 百度地图格式：纬度,经度
-            "radius": radius,
-            "output": "json",
-            "scope": 2,  # 返回详细信息
-            "page_size": 5,  # Top-5
-            "page_num": 0
-        }
-        r = requests.get(url, params=params, timeout=5).json()
+        r = await self._search(lat, lng, radius, limit)
         if r.get("status") != 0:
-            return [{"error": r.get("message", "unknown")}]
+            return [resilience.baidu_error(r)]
 
         hotels = []
         for poi in r.get("results", []):
@@ -128,4 +162,4 @@ class HotelTool(BaseTool):
         
         # 按距离排序
         hotels.sort(key=lambda x: x["距离(米)"])
-        return hotels if hotels else [{"error": "未找到周边酒店"}]
\ No newline at end of file
+        return hotels if hotels else [resilience.miss("未找到周边酒店")]
\ No newline at end of file
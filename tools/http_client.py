@@ -0,0 +1,107 @@
+"""
+工具共用的异步 HTTP 客户端：
+- 每个事件循环一个 httpx.AsyncClient（连接池、keep-alive 复用），同一循环上的所有工具调用共享
+- get_json：带超时的 GET，协程被取消时底层请求一并取消；经 tools.resilience 按接口熔断、重试和对冲，
+  上游不可用时返回 status=-1 的百度格式结果，工具照常按错误处理（不缓存）
+- run_sync：同步代码（Streamlit、缓存预热器）把协程丢到后台事件循环线程上执行并阻塞等待结果，
+  超时后取消协程；调用方的 contextvars（如 ttl_cache.refreshing）会随之带过去；submit 只提交不等待
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+import weakref
+from typing import Any, Awaitable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from tools import resilience
+
+REQUEST_TIMEOUT = float(os.getenv("HTTP_REQUEST_TIMEOUT", "5"))   # 单次请求
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))             # 一次工具调用（含分页、多次请求）
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def client() -> httpx.AsyncClient:
+    """当前事件循环上的共享客户端（AsyncClient 不能跨事件循环使用）"""
+    loop = asyncio.get_running_loop()
+    c = _clients.get(loop)
+    if c is None or c.is_closed:
+        c = httpx.AsyncClient(
+            timeout=httpx.Timeout(REQUEST_TIMEOUT),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS // 2),
+        )
+        _clients[loop] = c
+    return c
+
+
+def upstream_name(url: str) -> str:
+    """熔断和延迟统计按接口区分：api.map.baidu.com/place/v2/search → baidu:place/v2/search"""
+    parts = urlsplit(url)
+    host = "baidu" if parts.netloc.endswith("map.baidu.com") else parts.netloc
+    return f"{host}:{parts.path.strip('/')}"
+
+
+async def _get_once(url: str, params: dict, timeout: float) -> dict:
+    r = await client().get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+    if isinstance(data, dict) and data.get("status", 0) != 0 and resilience.classify_baidu(data) == resilience.RETRYABLE:
+        raise resilience.UpstreamError(f"百度接口暂时出错（status={data['status']}）：{data.get('message', '')}")
+    return data
+
+
+async def get_json(url: str, params: dict, timeout: Optional[float] = None,
+                   hedge: Optional[bool] = None, retries: Optional[int] = None) -> dict:
+    """hedge / retries 覆盖该上游的对冲和重试设置（见 resilience.Upstream.call）"""
+    name = upstream_name(url)
+    try:
+        return await resilience.upstream(name).call(lambda: _get_once(url, params, timeout or REQUEST_TIMEOUT),
+                                                    hedge=hedge, retries=retries)
+    except Exception as e:
+        if resilience.classify(e) == resilience.PERMANENT and not isinstance(e, httpx.HTTPStatusError):
+            raise
+        if isinstance(e, resilience.UpstreamError):
+            message = str(e)
+        elif isinstance(e, httpx.HTTPStatusError):
+            message = f"{name} 暂不可用：HTTP {e.response.status_code}"  # 不带 URL，里面有 AK
+        else:
+            message = f"{name} 暂不可用：{type(e).__name__}"
+        return {"status": resilience.UNAVAILABLE_STATUS, "message": message}
+
+
+async def aclose():
+    """关闭当前事件循环上的客户端（自建事件循环退出前调用）"""
+    c = _clients.pop(asyncio.get_running_loop(), None)
+    if c is not None:
+        await c.aclose()
+
+
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="http-client", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def submit(coro: Awaitable[Any]) -> concurrent.futures.Future:
+    """把协程丢到后台事件循环上，不等待；返回的 Future 可在任意线程等待或 cancel()"""
+    return asyncio.run_coroutine_threadsafe(coro, _ensure_loop())
+
+
+def run_sync(coro: Awaitable[Any], timeout: Optional[float] = TOOL_TIMEOUT) -> Any:
+    """在后台事件循环上执行协程并等待结果；超时则取消协程并抛出 TimeoutError"""
+    future = submit(coro)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"工具调用超时（{timeout} 秒）")
@@ -0,0 +1,333 @@
+"""
+并发压测：N 个模拟用户同时跑规划流水线（chains.trip_pipeline.run_trip，与页面同一套步骤），
+百度工具、平台信息、出行时间矩阵和大模型选点全部换成离线替身，延迟按可配置的分布随机抽样。
+并发按梯度逐级加压，每级报告吞吐量、各阶段 p50/p95/p99、错误数，并找出饱和点：
+- 吞吐饱和：加并发后吞吐增幅不足 SATURATION_GAIN
+- 延迟崩塌：总耗时 p95 超过最低并发那一级的 LATENCY_KNEE 倍
+
+请求样本：JSON 数组或每行一个 TripRequest 的 JSONL 文件；不给时按内置城市随机生成。
+延迟分布写法（毫秒）：const:50 | uniform:20:80 | normal:100:30 | lognormal:中位数:sigma | exp:均值
+
+python -m tools.load_test --levels 1,2,4,8,16 --duration 15 --baidu lognormal:80:0.5 --llm lognormal:1500:0.4
+python -m tools.load_test --requests trips.jsonl --json load_report.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Sequence
+
+from chains.trip_pipeline import Backend, run_trip
+from models.trip_schema import TripRequest
+
+STAGES = ("city", "pois", "hotel", "budget", "days", "total")
+SATURATION_GAIN = float(os.getenv("LOAD_SATURATION_GAIN", "0.1"))
+LATENCY_KNEE = float(os.getenv("LOAD_LATENCY_KNEE", "2.0"))
+SAMPLE_CITIES = ("苏州", "杭州", "成都", "西安", "厦门")
+
+
+# ---------- 延迟分布 ----------
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """分布描述 → 抽样函数（返回秒）"""
+    kind, *args = spec.split(":")
+    try:
+        a = [float(x) / 1000 for x in args]
+        if kind == "lognormal" and len(a) == 2:
+            a[1] *= 1000  # sigma 没有单位
+    except ValueError:
+        raise ValueError(f"无法解析延迟分布：{spec}")
+    if kind == "const" and len(a) == 1:
+        return lambda rng: a[0]
+    if kind == "uniform" and len(a) == 2:
+        return lambda rng: rng.uniform(a[0], a[1])
+    if kind == "normal" and len(a) == 2:
+        return lambda rng: max(0.0, rng.gauss(a[0], a[1]))
+    if kind == "lognormal" and len(a) == 2:
+        return lambda rng: rng.lognormvariate(math.log(a[0]), a[1]) if a[0] > 0 else 0.0
+    if kind == "exp" and len(a) == 1:
+        return lambda rng: rng.expovariate(1 / a[0]) if a[0] > 0 else 0.0
+    raise ValueError(f"无法解析延迟分布：{spec}")
+
+
+# ---------- 离线替身 ----------
+class StubBackend:
+    """
+    离线替身：字段与真实工具一致，坐标围绕城市中心随机散布（按城市名固定种子，同一城市每次一样），
+    每次调用先按分布 sleep 一段时间模拟网络/大模型耗时（sleep 会释放 GIL，与真实 I/O 一致）。
+    """
+
+    def __init__(self, baidu: str = "lognormal:80:0.5", llm: str = "lognormal:1500:0.4",
+                 platform: Optional[str] = None, llm_error_rate: float = 0.0,
+                 n_attractions: int = 40, n_restaurants: int = 40, n_hotels: int = 20, seed: int = 0):
+        self.baidu = parse_latency(baidu)
+        self.llm = parse_latency(llm)
+        self.platform = parse_latency(platform or baidu)
+        self.llm_error_rate = llm_error_rate
+        self.sizes = (n_attractions, n_restaurants, n_hotels)
+        self.seed = seed
+        self._local = threading.local()
+
+    @property
+    def rng(self) -> random.Random:
+        rng = getattr(self._local, "rng", None)
+        if rng is None:
+            rng = self._local.rng = random.Random(f"{self.seed}-{threading.get_ident()}")
+        return rng
+
+    def _wait(self, dist):
+        time.sleep(dist(self.rng))
+
+    def city(self, name: str) -> dict:
+        from tools import gazetteer
+
+        self._wait(self.baidu)
+        place = gazetteer.lookup(name)
+        if place is not None:
+            lat, lng = place.latitude, place.longitude
+        else:
+            r = random.Random(name)
+            lat, lng = r.uniform(22, 40), r.uniform(104, 121)
+        return {"city": name, "latitude": lat, "longitude": lng, "timezone": "UTC+8", "summary": name}
+
+    def _scatter(self, kind: str, lat: float, lng: float, n: int, spread: float):
+        r = random.Random(f"{kind}-{lat:.4f}-{lng:.4f}")
+        return [(i, lat + r.uniform(-spread, spread), lng + r.uniform(-spread, spread), r) for i in range(n)]
+
+    def attractions(self, lat: float, lng: float) -> list:
+        self._wait(self.baidu)
+        return [{"景点名称": f"景点{i}", "location": f"{y},{x}", "地址": f"景点路{i}号", "评分": round(r.uniform(3.8, 4.9), 1),
+                 "门票": "¥40", "门票数值": r.choice((0, 30, 40, 60, 120)), "距离(米)": i * 150,
+                 "景点类型": r.choice(("历史", "园林", "博物馆", "公园")), "开放时间": "08:00-17:30",
+                 "推荐游玩时长": "1-2小时", "标签/特色": "暂无"}
+                for i, x, y, r in self._scatter("a", lat, lng, self.sizes[0], 0.06)]
+
+    def restaurants(self, lat: float, lng: float) -> list:
+        self._wait(self.baidu)
+        return [{"餐厅名称": f"餐厅{i}", "location": f"{y},{x}", "地址": f"美食街{i}号", "评分": round(r.uniform(3.8, 4.9), 1),
+                 "人均(元)": "80", "人均数值": r.choice((40, 60, 80, 120, 200)), "距离(米)": i * 120,
+                 "菜系/标签": r.choice(("本帮菜", "面馆", "火锅", "小吃")), "营业时间": "10:00-21:30"}
+                for i, x, y, r in self._scatter("r", lat, lng, self.sizes[1], 0.06)]
+
+    def hotels(self, lat: float, lng: float) -> list:
+        self._wait(self.baidu)
+        return [{"酒店名称": f"酒店{i}", "lat": x, "lng": y, "地址": f"迎宾路{i}号", "评分": round(r.uniform(4.0, 4.9), 1),
+                 "价格": "¥300", "价格数值": r.randint(180, 800), "距离(米)": i * 200}
+                for i, x, y, r in self._scatter("h", lat, lng, self.sizes[2], 0.03)]
+
+    def platform_info(self, name: str, city: str, poi_type: str) -> dict:
+        self._wait(self.platform)
+        return {"name": name, "enhanced_description": ""}
+
+    def day_plan(self, day, destination, personal_requirements, avail_attractions, avail_restaurants,
+                 hotel_name, adults, children, deterministic=False):
+        """
+        模拟大模型选点：取 BM25 预筛后的前几个候选，按比例随机失败以走备用算法。
+        排程只读取 DayPlanSelection 的 name/reason 属性，这里用 SimpleNamespace 代替，
+        免得导入 day_plan_chain 时创建大模型客户端（离线环境没有 API Key）。
+        """
+        self._wait(self.llm)
+        if self.rng.random() < self.llm_error_rate or len(avail_attractions) < 2 or len(avail_restaurants) < 2:
+            raise RuntimeError("模拟大模型失败")
+        a, r = avail_attractions, avail_restaurants
+        pick = lambda item, **extra: SimpleNamespace(name=item["name"], reason="压测替身", **extra)
+        return SimpleNamespace(morning_attraction=pick(a[0]), lunch=pick(r[0], meal_type="午餐"),
+                               afternoon_attraction=pick(a[1]), dinner=pick(r[1], meal_type="晚餐"),
+                               overall_reason="压测替身")
+
+    def backend(self) -> Backend:
+        return Backend(city=self.city, attractions=self.attractions, restaurants=self.restaurants,
+                       hotels=self.hotels, platform_info=self.platform_info, day_plan=self.day_plan)
+
+
+def install_stub_travel(latency: str):
+    """出行时间矩阵换成本地估算 + 模拟百度算路延迟（每次 matrix 调用 sleep 一次）"""
+    from tools import travel_time
+
+    dist = parse_latency(latency)
+    rng = random.Random(0)  # 只用来抽延迟，多线程共用无妨
+
+    class StubTravelProvider(travel_time.LocalProvider):
+        def matrix(self, origins, destinations):
+            time.sleep(dist(rng))
+            return super().matrix(origins, destinations)
+
+    travel_time.provider = StubTravelProvider()
+
+
+# ---------- 请求样本 ----------
+def load_requests(path: Optional[str], n: int = 50, seed: int = 0) -> List[TripRequest]:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            text = f.read().strip()
+        rows = json.loads(text) if text.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+        return [TripRequest(**row) for row in rows]
+    r = random.Random(seed)
+    start = date.today() + timedelta(days=7)
+    return [
+        TripRequest(departure="北京", destination=r.choice(SAMPLE_CITIES), start_date=start,
+                    end_date=start + timedelta(days=r.choice((0, 1, 2, 2, 3, 4))), adults=r.randint(1, 4),
+                    children=r.randint(0, 2), budget=r.choice((2000, 5000, 8000, 15000)),
+                    personal=r.choice(("无", "喜欢历史文化", "带娃，偏好公园", "想吃本地小吃")), deterministic=r.random() < 0.7)
+        for _ in range(n)
+    ]
+
+
+# ---------- 统计 ----------
+def percentile(values: Sequence[float], q: float) -> float:
+    """线性插值分位数；空列表返回 0"""
+    if not values:
+        return 0.0
+    xs = sorted(values)
+    pos = (len(xs) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    elapsed: float = 0.0
+    completed: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    llm_fallbacks: int = 0
+    samples: Dict[str, List[float]] = field(default_factory=lambda: {s: [] for s in STAGES})
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def stage_stats(self) -> Dict[str, Dict[str, float]]:
+        return {s: {"p50": round(percentile(v, 0.5) * 1000, 1), "p95": round(percentile(v, 0.95) * 1000, 1),
+                    "p99": round(percentile(v, 0.99) * 1000, 1), "n": len(v)}
+                for s, v in self.samples.items()}
+
+    def to_dict(self) -> dict:
+        return {"concurrency": self.concurrency, "elapsed_s": round(self.elapsed, 2), "completed": self.completed,
+                "throughput_per_s": round(self.throughput, 3), "errors": self.errors,
+                "llm_fallbacks": self.llm_fallbacks, "stages_ms": self.stage_stats()}
+
+
+def _run_one(req: TripRequest, backend: Backend, result: LevelResult, lock: threading.Lock):
+    marks = []
+    fallbacks = []
+    t0 = time.perf_counter()
+    try:
+        run_trip(req, backend, on_stage=lambda name: marks.append((name, time.perf_counter())),
+                 on_day=lambda d: d.llm_error and fallbacks.append(1))
+    except Exception as e:
+        with lock:
+            key = type(e).__name__
+            result.errors[key] = result.errors.get(key, 0) + 1
+        return
+    end = time.perf_counter()
+    bounds = marks + [("total", end)]
+    with lock:
+        for (name, start), (_, stop) in zip(bounds, bounds[1:]):
+            result.samples[name].append(stop - start)
+        result.samples["total"].append(end - t0)
+        result.completed += 1
+        result.llm_fallbacks += len(fallbacks)
+
+
+def run_level(concurrency: int, requests: Sequence[TripRequest], backend: Backend, duration: float,
+              think: Callable[[random.Random], float] = lambda rng: 0.0, seed: int = 0) -> LevelResult:
+    """闭环压测一级：每个用户循环「抽请求 → 跑流水线 → 思考时间」，到点后不再发新请求，等在途的跑完"""
+    result = LevelResult(concurrency)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(index: int):
+        rng = random.Random(f"{seed}-{concurrency}-{index}")
+        while time.perf_counter() < deadline:
+            _run_one(rng.choice(requests), backend, result, lock)
+            pause = think(rng)
+            if pause:
+                time.sleep(pause)
+
+    threads = [threading.Thread(target=user, args=(i,), name=f"load-user-{i}", daemon=True) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    result.elapsed = time.perf_counter() - t0
+    return result
+
+
+def find_saturation(levels: List[LevelResult], gain: float = SATURATION_GAIN, knee: float = LATENCY_KNEE) -> dict:
+    """吞吐饱和点：第一次加并发后吞吐增幅 < gain；延迟崩塌点：总耗时 p95 > 最低一级的 knee 倍"""
+    throughput_at = latency_at = None
+    base_p95 = percentile(levels[0].samples["total"], 0.95) if levels else 0.0
+    for prev, cur in zip(levels, levels[1:]):
+        if throughput_at is None and cur.throughput < prev.throughput * (1 + gain):
+            throughput_at = cur.concurrency
+    for cur in levels[1:]:
+        if latency_at is None and base_p95 and percentile(cur.samples["total"], 0.95) > base_p95 * knee:
+            latency_at = cur.concurrency
+    best = max(levels, key=lambda x: x.throughput) if levels else None
+    return {"throughput_saturates_at": throughput_at, "latency_collapses_at": latency_at,
+            "peak_throughput_per_s": round(best.throughput, 3) if best else 0.0,
+            "peak_concurrency": best.concurrency if best else None}
+
+
+def format_report(levels: List[LevelResult], saturation: dict) -> str:
+    lines = []
+    for lv in levels:
+        stats = lv.stage_stats()
+        errors = sum(lv.errors.values())
+        lines.append(f"并发 {lv.concurrency:>3}：完成 {lv.completed} 次，吞吐 {lv.throughput:.2f} 次/秒，"
+                     f"错误 {errors}，大模型退回备用 {lv.llm_fallbacks} 天")
+        for s in STAGES:
+            st = stats[s]
+            lines.append(f"    {s:<7} p50 {st['p50']:>8.1f}ms  p95 {st['p95']:>8.1f}ms  p99 {st['p99']:>8.1f}ms")
+    lines.append(f"峰值吞吐 {saturation['peak_throughput_per_s']} 次/秒（并发 {saturation['peak_concurrency']}）；"
+                 f"吞吐饱和于并发 {saturation['throughput_saturates_at'] or '未出现'}，"
+                 f"延迟崩塌于并发 {saturation['latency_collapses_at'] or '未出现'}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="规划流水线并发压测（离线替身）")
+    parser.add_argument("--requests", help="TripRequest 样本文件（JSON 数组或 JSONL）")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="并发梯度，逗号分隔")
+    parser.add_argument("--duration", type=float, default=15, help="每级持续秒数")
+    parser.add_argument("--baidu", default="lognormal:80:0.5", help="百度工具延迟分布")
+    parser.add_argument("--platform", default=None, help="平台信息延迟分布（默认同 --baidu）")
+    parser.add_argument("--route", default="lognormal:60:0.4", help="出行时间矩阵（算路）延迟分布")
+    parser.add_argument("--llm", default="lognormal:1500:0.4", help="大模型选点延迟分布")
+    parser.add_argument("--llm-error-rate", type=float, default=0.05, help="大模型失败比例（走备用算法）")
+    parser.add_argument("--think", default="const:0", help="用户两次请求之间的思考时间分布")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="把完整报告写成 JSON")
+    args = parser.parse_args(argv)
+
+    stub = StubBackend(baidu=args.baidu, llm=args.llm, platform=args.platform,
+                       llm_error_rate=args.llm_error_rate, seed=args.seed)
+    install_stub_travel(args.route)
+    backend = stub.backend()
+    requests = load_requests(args.requests, seed=args.seed)
+    think = parse_latency(args.think)
+
+    levels = []
+    for n in [int(x) for x in args.levels.split(",") if x.strip()]:
+        levels.append(run_level(n, requests, backend, args.duration, think, seed=args.seed))
+        print(format_report(levels[-1:], find_saturation(levels[-1:])).splitlines()[0], flush=True)
+    saturation = find_saturation(levels)
+    print(format_report(levels, saturation))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "requests": len(requests), "levels": [lv.to_dict() for lv in levels],
+                       "saturation": saturation}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,201 @@
+"""
+全程行程地图：
+- trip_geojson：每次行程只构建一次紧凑的 GeoJSON FeatureCollection——每天一条路线（Douglas-Peucker 简化 + 坐标保留 5 位小数），
+  当天的停靠点，以及按类别合并成 MultiPoint 的其余候选 POI
+- map_html：folium 渲染，候选 POI 用 FastMarkerCluster 在浏览器端聚合（数据以数组下发，几千个点也不卡），
+  每天的路线和停靠点各是一个可开关的图层
+- 生成的 HTML 按 GeoJSON 内容哈希缓存（进程内 LRU），页面重跑时直接复用
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
 import folium
-from streamlit_folium import st_folium
+from folium.plugins import FastMarkerCluster
+
+PRECISION = 5               # 小数位，约 1 米
+SIMPLIFY_TOLERANCE = 2e-4   # 度，约 20 米
+MAP_CACHE_SIZE = int(os.getenv("MAP_CACHE_SIZE", "32"))
+DAY_COLORS = ("#1f77b4", "#d62728", "#2ca02c", "#9467bd", "#ff7f0e", "#17becf", "#8c564b", "#e377c2")
+CATEGORY_COLORS = {"attraction": "blue", "meal": "red", "hotel": "green"}
+
+_html_cache: "OrderedDict[str, str]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _round(lat: float, lng: float) -> list:
+    # GeoJSON 坐标顺序为 [经度, 纬度]
+    return [round(float(lng), PRECISION), round(float(lat), PRECISION)]
+
+
+def _perpendicular(p, a, b) -> float:
+    (x, y), (x1, y1), (x2, y2) = p, a, b
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    return abs(dy * x - dx * y + x2 * y1 - y2 * x1) / (dx * dx + dy * dy) ** 0.5
+
+
+def simplify(coords: List[list], tolerance: float = SIMPLIFY_TOLERANCE) -> List[list]:
+    """Douglas-Peucker 简化（迭代实现），并去掉相邻重复点"""
+    points = [c for i, c in enumerate(coords) if i == 0 or c != coords[i - 1]]
+    if len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        lo, hi = stack.pop()
+        best, index = 0.0, None
+        for i in range(lo + 1, hi):
+            d = _perpendicular(points[i], points[lo], points[hi])
+            if d > best:
+                best, index = d, i
+        if index is not None and best > tolerance:
+            keep[index] = True
+            stack += [(lo, index), (index, hi)]
+    return [p for p, k in zip(points, keep) if k]
+
+
+def day_features(plan) -> List[dict]:
+    """单天的 GeoJSON Feature：一条简化后的路线 + 每个停靠点（酒店除外，酒店单独画一次）"""
+    stops = [a for a in plan.activities if a.lat is not None and a.lng is not None]
+    features = []
+    route = simplify([_round(a.lat, a.lng) for a in stops])
+    if len(route) >= 2:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": route},
+            "properties": {"kind": "route", "day": plan.day,
+                           "km": round(sum(a.transport_distance for a in plan.activities) / 1000, 1),
+                           "min": sum(a.transport_duration for a in plan.activities)},
+        })
+    for a in stops:
+        if a.category == "hotel":
+            continue
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": _round(a.lat, a.lng)},
+            "properties": {"kind": "stop", "day": plan.day, "name": a.name, "cat": a.category,
+                           "time": a.start.strftime("%H:%M")},
+        })
+    return features
+
+
+def trip_geojson(days: Sequence, candidates: Sequence[dict] = (), hotel: Optional[dict] = None) -> dict:
+    """
+    days: DayPlan 列表（Activity 需带 lat/lng）；candidates: 带 lat/lng/name/category 的 POI；
+    hotel: {"name", "lat", "lng"}。已排进行程的候选不再重复出现在候选图层。
+    """
+    features = []
+    for plan in days:
+        features += day_features(plan)
+    scheduled = {tuple(f["geometry"]["coordinates"]) for f in features if f["properties"]["kind"] == "stop"}
+    # 候选 POI 按类别合并成 MultiPoint，名称放在并列数组里，比每个点一个 Feature 小得多
+    grouped = OrderedDict()
+    for p in candidates:
+        point = _round(p["lat"], p["lng"])
+        if tuple(point) in scheduled:
+            continue
+        coords, names = grouped.setdefault(p.get("category", ""), ([], []))
+        coords.append(point)
+        names.append(p["name"])
+    for category, (coords, names) in grouped.items():
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "MultiPoint", "coordinates": coords},
+            "properties": {"kind": "poi", "cat": category, "names": names},
+        })
+    if hotel is not None and hotel.get("lat") is not None:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": _round(hotel["lat"], hotel["lng"])},
+            "properties": {"kind": "hotel", "name": hotel.get("name", "酒店")},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def geojson_hash(collection: dict) -> str:
+    # trip_geojson 的键顺序是固定的，不需要 sort_keys
+    payload = json.dumps(collection, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# 候选 POI 的浏览器端回调：row = [lat, lng, name, color]
+_CANDIDATE_CALLBACK = """
+function (row) {
+    return L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 5, color: row[3], weight: 1, fillOpacity: 0.6})
+        .bindTooltip(row[2]);
+}
+"""
+
+
+def _build_map(collection: dict) -> folium.Map:
+    points = []
+    for f in collection["features"]:
+        geometry = f["geometry"]
+        if geometry["type"] == "Point":
+            points.append(geometry["coordinates"])
+        elif geometry["type"] == "MultiPoint":
+            points += geometry["coordinates"]
+    center = ([sum(p[1] for p in points) / len(points), sum(p[0] for p in points) / len(points)]
+              if points else [39.9, 116.4])
+    m = folium.Map(location=center, zoom_start=13, prefer_canvas=True)
+
+    layers = {}
+
+    def day_layer(day: int) -> folium.FeatureGroup:
+        if day not in layers:
+            layers[day] = folium.FeatureGroup(name=f"Day {day}").add_to(m)
+        return layers[day]
+
+    candidates = []
+    for f in collection["features"]:
+        props, coords = f["properties"], f["geometry"]["coordinates"]
+        kind = props["kind"]
+        if kind == "route":
+            color = DAY_COLORS[(props["day"] - 1) % len(DAY_COLORS)]
+            folium.PolyLine([[lat, lng] for lng, lat in coords], color=color, weight=4, opacity=0.8,
+                            tooltip=f"Day {props['day']} · {props['km']} km · {props['min']} 分钟").add_to(day_layer(props["day"]))
+        elif kind == "stop":
+            folium.Marker([coords[1], coords[0]], tooltip=f"Day {props['day']} {props['time']} {props['name']}",
+                          icon=folium.Icon(color=CATEGORY_COLORS.get(props["cat"], "gray"))).add_to(day_layer(props["day"]))
+        elif kind == "hotel":
+            folium.Marker([coords[1], coords[0]], tooltip=props["name"],
+                          icon=folium.Icon(color="green", icon="home")).add_to(m)
+        else:
+            color = "#1f77b4" if props["cat"] == "attraction" else "#d62728"
+            candidates += [[lat, lng, name, color] for (lng, lat), name in zip(coords, props["names"])]
+    if candidates:
+        FastMarkerCluster(candidates, callback=_CANDIDATE_CALLBACK, name="候选景点/餐厅", show=True).add_to(m)
+    if points:
+        m.fit_bounds([[min(p[1] for p in points), min(p[0] for p in points)],
+                      [max(p[1] for p in points), max(p[0] for p in points)]])
+    folium.LayerControl(collapsed=False).add_to(m)
+    return m
+
+
+def map_html(collection: dict) -> str:
+    """渲染为独立 HTML（供 st.components.v1.html 嵌入），按内容哈希缓存"""
+    key = geojson_hash(collection)
+    with _lock:
+        html = _html_cache.get(key)
+        if html is not None:
+            _html_cache.move_to_end(key)
+            return html
+    html = _build_map(collection).get_root().render()
+    with _lock:
+        _html_cache[key] = html
+        while len(_html_cache) > MAP_CACHE_SIZE:
+            _html_cache.popitem(last=False)
+    return html
+
 
 def draw_route(hotel, attractions, restaurants, hotel_lat, hotel_lng):
-    """极限轻量：只画 1 酒店 + 1 景点 + 1 餐厅 + 1 连线"""
+    """极限轻量：只画 1 酒店 + 1 景点 + 1 餐厅 + 1 连线（全程地图请用 trip_geojson + map_html）"""
     # 1. 起点：酒店（防御式）
     m = folium.Map(location=[hotel_lat, hotel_lng], zoom_start=14)
     folium.Marker([hotel_lat, hotel_lng], popup=hotel.get("name", "酒店"), icon=folium.Icon(color="green")).add_to(m)
@@ -30,4 +223,4 @@ def draw_route(hotel, attractions, restaurants, hotel_lat, hotel_lng):
     coords.append([hotel_lat, hotel_lng])
     folium.PolyLine(coords, color="blue", weight=2.5, opacity=0.8).add_to(m)
 
-    return m
\ No newline at end of file
+    return m
@@ -0,0 +1,275 @@
+"""
+开放时间 / 营业时间解析与时间窗索引：
+- parse_opening_hours：把百度返回的自由文本（"周二至周日 09:00-17:00，周一闭馆"、
+  "4月1日-10月31日 08:00-17:30；11月1日-3月31日 08:30-17:00"、"10:00-14:00,17:00-21:00"、
+  "11:00-次日02:00"、"全天开放"、"暂无" ……）规整成 规则列表（星期掩码 + 日期区间 + 分钟区间）和闭馆日
+- OpeningIndex：按日期在候选池上建中心区间树，回答"某天 [start, end] 全程营业、且在某点 R 米内的 POI"，
+  查询 O(log n + k)；开放时间未知的 POI 视为营业（不能因为缺数据就丢掉）
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.hotel_ranker import distance_matrix
+
+ALL_DAYS = 0b1111111  # 周一为第 0 位，与 date.weekday() 一致
+DAY_MINUTES = 24 * 60
+
+_WEEKDAY = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6, "七": 6}
+_UNKNOWN = ("暂无", "不详", "未知", "以实际为准", "详见", "电话咨询")
+_ALL_DAY = ("全天", "24小时", "24h", "24H", "通宵", "全年开放")
+_CLOSED_WORDS = "闭馆|闭园|休馆|休园|休息|不开放|闭店|停业|歇业|关闭|不营业|店休|公休"
+_SEASONS = {"旺季": ((4, 1), (10, 31)), "淡季": ((11, 1), (3, 31)),
+            "夏季": ((5, 1), (10, 31)), "冬季": ((11, 1), (4, 30))}
+
+_DAY_CHARS = "[一二三四五六日天七]"
+_DAY = rf"(?:周|星期|礼拜){_DAY_CHARS}"
+_DAY_RANGE = rf"{_DAY}(?:\s*-\s*(?:周|星期|礼拜)?{_DAY_CHARS})?"
+_TIME = r"\d{1,2}(?::\d{2}|点(?:\d{1,2}分?|半)?)"
+_CLOSED_RE = re.compile(rf"(?:每周|逢)?((?:{_DAY_RANGE}[、,和及与/]?)+)\s*(?:全天)?(?:{_CLOSED_WORDS})")
+_TOKEN_RE = re.compile("|".join([
+    r"(?P<date>\d{1,2}月(?:\d{1,2}日?)?\s*-\s*\d{1,2}月(?:\d{1,2}日?)?)",
+    rf"(?P<season>{'|'.join(_SEASONS)})",
+    rf"(?P<day>{_DAY_RANGE})",
+    r"(?P<workday>工作日)", r"(?P<weekend>周末|双休日)", r"(?P<everyday>每天|每日|全年|全周)",
+    rf"(?P<time>{_TIME}\s*-\s*(?:次日|凌晨)?\s*{_TIME})",
+]))
+_DATE_RE = re.compile(r"(?P<m1>\d{1,2})月(?:(?P<d1>\d{1,2})日?)?\s*-\s*(?P<m2>\d{1,2})月(?:(?P<d2>\d{1,2})日?)?")
+_TIME_RE = re.compile(r"(?P<h>\d{1,2})(?::(?P<m>\d{2})|点(?:(?P<cm>\d{1,2})分?|(?P<half>半))?)")
+_DAYS_IN_MONTH = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+@dataclass(frozen=True)
+class Rule:
+    weekdays: int                                   # 星期掩码
+    intervals: Tuple[Tuple[int, int], ...]          # 当天起的分钟区间，跨午夜时 end > 1440
+    season: Optional[Tuple[Tuple[int, int], Tuple[int, int]]] = None  # ((月, 日), (月, 日))，可跨年
+
+    def applies(self, day: date) -> bool:
+        if not self.weekdays >> day.weekday() & 1:
+            return False
+        if self.season is None:
+            return True
+        start, end = self.season
+        md = (day.month, day.day)
+        return start <= md <= end if start <= end else md >= start or md <= end
+
+
+@dataclass(frozen=True)
+class OpeningHours:
+    rules: Tuple[Rule, ...] = ()
+    closed: int = 0            # 闭馆日星期掩码
+    known: bool = True         # False 表示没有可用信息，按营业处理
+    raw: str = field(default="", compare=False)
+
+    def intervals_on(self, day: date) -> List[Tuple[int, int]]:
+        if not self.known:
+            return [(0, DAY_MINUTES)]
+        if self.closed >> day.weekday() & 1:
+            return []
+        rules = [r for r in self.rules if r.applies(day)]
+        # 同时有季节规则和通用规则时，季节规则优先
+        seasonal = [r for r in rules if r.season is not None]
+        return _merge([iv for r in (seasonal or rules) for iv in r.intervals])
+
+    def is_open(self, day: date, start: int, end: int) -> bool:
+        """[start, end]（当天分钟数）是否全程营业；开放时间未知时视为营业"""
+        if not self.known:
+            return True
+        return any(s <= start and end <= e for s, e in self.intervals_on(day))
+
+
+def _merge(intervals: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = []
+    for s, e in sorted(intervals):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def _minutes(m: re.Match) -> int:
+    return int(m.group("h")) * 60 + int(m.group("m") or m.group("cm") or 0) + (30 if m.group("half") else 0)
+
+
+def _day_mask(text: str) -> int:
+    """"周一" / "周二-周日" / "周五-周一"（跨周）→ 星期掩码"""
+    chars = re.findall(_DAY_CHARS, text)
+    a = _WEEKDAY[chars[0]]
+    b = _WEEKDAY[chars[-1]]
+    days = range(a, b + 1) if a <= b else list(range(a, 7)) + list(range(0, b + 1))
+    return sum(1 << d for d in days)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"[~～—–－至到]", "-", text)
+    # 去掉"16:30停止入园"之类的括号说明，避免误当成营业时段
+    text = re.sub(r"[(\[（【][^)\]）】]*(?:停止|截止|入园|入馆|售票|检票|最晚)[^)\]）】]*[)\]）】]", " ", text)
+    return text
+
+
+@lru_cache(maxsize=4096)
+def parse_opening_hours(text: Optional[str]) -> OpeningHours:
+    raw = (text or "").strip()
+    if not raw or any(w in raw for w in _UNKNOWN):
+        return OpeningHours(known=False, raw=raw)
+    s = _normalize(raw)
+
+    closed = 0
+    for m in _CLOSED_RE.finditer(s):
+        for rng in re.finditer(_DAY_RANGE, m.group(1)):
+            closed |= _day_mask(rng.group())
+    s = _CLOSED_RE.sub(" ", s)
+
+    rules: List[Rule] = []
+    weekdays, season = None, None
+    intervals: List[Tuple[int, int]] = []
+    context_used = False
+
+    def _flush():
+        if intervals:
+            rules.append(Rule(weekdays=weekdays if weekdays is not None else ALL_DAYS,
+                              intervals=tuple(_merge(intervals)), season=season))
+
+    for tok in _TOKEN_RE.finditer(s):
+        kind = tok.lastgroup
+        if kind == "time":
+            first, last = _TIME_RE.finditer(tok.group())
+            start, end = _minutes(first), _minutes(last)
+            if re.search("次日|凌晨", tok.group()) or end <= start:
+                end += DAY_MINUTES
+            if start < DAY_MINUTES:
+                intervals.append((start, min(end, 2 * DAY_MINUTES)))
+            context_used = True
+            continue
+        # 遇到新的星期/日期描述：上一组时段已经有了，就先结算成一条规则
+        if context_used:
+            _flush()
+            intervals, context_used = [], False
+            weekdays, season = None, None
+        if kind == "date":
+            m = _DATE_RE.match(tok.group())
+            m1, m2 = int(m.group("m1")), int(m.group("m2"))
+            if 1 <= m1 <= 12 and 1 <= m2 <= 12:
+                season = ((m1, int(m.group("d1") or 1)), (m2, int(m.group("d2") or _DAYS_IN_MONTH[m2 - 1])))
+        elif kind == "season":
+            season = _SEASONS[tok.group("season")]
+        else:
+            if kind == "day":
+                mask = _day_mask(tok.group())
+            elif kind == "workday":
+                mask = 0b0011111
+            elif kind == "weekend":
+                mask = 0b1100000
+            else:
+                mask = ALL_DAYS
+            weekdays = (weekdays or 0) | mask
+    _flush()
+
+    if not rules and any(w in raw for w in _ALL_DAY):
+        rules.append(Rule(weekdays=ALL_DAYS, intervals=((0, DAY_MINUTES),)))
+    if not rules:
+        # 只写了闭馆日（如"周一闭馆"）：其余日子按营业处理
+        if closed:
+            return OpeningHours(rules=(Rule(weekdays=ALL_DAYS, intervals=((0, DAY_MINUTES),)),), closed=closed, raw=raw)
+        return OpeningHours(known=False, raw=raw)
+    return OpeningHours(rules=tuple(rules), closed=closed, raw=raw)
+
+
+def poi_hours(poi: dict) -> OpeningHours:
+    return parse_opening_hours(poi.get("开放时间") or poi.get("营业时间"))
+
+
+# ---------- 中心区间树 ----------
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+
+def _build(items: List[Tuple[int, int, int]]) -> Optional[_Node]:
+    if not items:
+        return None
+    ends = sorted(p for s, e, _ in items for p in (s, e))
+    node = _Node()
+    node.center = ends[len(ends) // 2]
+    mid = [it for it in items if it[0] <= node.center <= it[1]]
+    node.by_start = sorted(mid, key=lambda it: it[0])
+    node.by_end = sorted(mid, key=lambda it: -it[1])
+    node.left = _build([it for it in items if it[1] < node.center])
+    node.right = _build([it for it in items if it[0] > node.center])
+    return node
+
+
+def _stab(node: Optional[_Node], x: int, out: List[Tuple[int, int, int]]):
+    """收集所有包含 x 的区间"""
+    while node is not None:
+        if x < node.center:
+            for it in node.by_start:
+                if it[0] > x:
+                    break
+                out.append(it)
+            node = node.left
+        elif x > node.center:
+            for it in node.by_end:
+                if it[1] < x:
+                    break
+                out.append(it)
+            node = node.right
+        else:
+            out.extend(node.by_start)
+            return
+
+
+class OpeningIndex:
+    """候选池上的营业时间索引；每个日期的区间树按需构建并缓存"""
+
+    def __init__(self, pois: Sequence[dict]):
+        self.pois = list(pois)
+        self.hours = [poi_hours(p) for p in self.pois]
+        self._position = {id(p): i for i, p in enumerate(self.pois)}
+        self._unknown = [i for i, h in enumerate(self.hours) if not h.known]
+        self._trees = {}
+
+    def _tree(self, day: date) -> Optional[_Node]:
+        if day not in self._trees:
+            if len(self._trees) > 32:
+                self._trees.clear()
+            items = [(s, e, i) for i, h in enumerate(self.hours) if h.known for s, e in h.intervals_on(day)]
+            self._trees[day] = _build(items)
+        return self._trees[day]
+
+    def open_between(self, day: date, start: int, end: int, near: Optional[Tuple[float, float]] = None,
+                     radius: Optional[float] = None) -> List[dict]:
+        """day 当天 [start, end]（分钟）全程营业的 POI；给定 near 和 radius 时只保留 radius 米以内的"""
+        hits: List[Tuple[int, int, int]] = []
+        _stab(self._tree(day), start, hits)
+        idx = sorted({i for s, e, i in hits if e >= end} | set(self._unknown))
+        if near is not None and radius is not None and idx:
+            points = np.array([(self.pois[i]["lat"], self.pois[i]["lng"]) for i in idx])
+            dist = distance_matrix(points, np.array([near]))[:, 0]
+            idx = [i for i, d in zip(idx, dist) if d <= radius]
+        return [self.pois[i] for i in idx]
+
+    def is_open(self, poi: dict, day: date, start: int, end: int) -> bool:
+        i = self._position.get(id(poi))
+        hours = self.hours[i] if i is not None else poi_hours(poi)
+        return hours.is_open(day, start, end)
+
+    def ensure_open(self, poi: dict, pool: Sequence[dict], day: date, start: int, end: int,
+                    exclude: Sequence[dict] = ()) -> dict:
+        """poi 在时段内营业则原样返回，否则换成 pool 中离它最近、且该时段营业的 POI；找不到就保留原选择"""
+        if self.is_open(poi, day, start, end):
+            return poi
+        allowed = {id(p) for p in pool} - {id(p) for p in exclude} - {id(poi)}
+        candidates = [p for p in self.open_between(day, start, end) if id(p) in allowed]
+        if not candidates:
+            return poi
+        dist = distance_matrix(np.array([(p["lat"], p["lng"]) for p in candidates]),
+                               np.array([(poi["lat"], poi["lng"])]))[:, 0]
+        return candidates[int(np.argmin(dist))]
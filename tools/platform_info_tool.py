@@ -119,3 +119,6 @@ class PlatformInfoTool(BaseTool):
         
         return enhanced_info
 
+    async def _arun(self, name: str, city: str, poi_type: str) -> Dict:
+        # 目前不发网络请求，直接复用同步逻辑；接入真实搜索后在这里改为并发请求各平台
+        return self._run(name=name, city=city, poi_type=poi_type)
@@ -0,0 +1,318 @@
+"""
+全城 POI 覆盖爬取：单次半径检索最多只回几十条、且只覆盖市中心附近，同里、周庄这类郊县景点永远搜不到。
+这里把城市外接矩形切成网格，逐格用百度 place/v2/search 的 bounds（矩形区域）检索：
+- 自适应网格：一格的结果数达到 CRAWL_SPLIT_AT（百度单次检索最多翻到 150 条）就四等分继续查，
+  没有结果的格直接剪掉；格子边长小于 CRAWL_MIN_CELL_DEG 后不再细分，记为 truncated
+- 并发 + 限速：CRAWL_CONCURRENCY 个协程并行处理格子，所有请求共用 CRAWL_RATE 次/秒的令牌；
+  请求经 http_client（tools.resilience 熔断/重试），临时失败的格子退避后重排，几次都失败的留到下次续跑
+- 按 uid 去重合并成全城 POI 表
+- 断点续跑：进度（待查格子、已得 POI、统计）定期写入 data/poi_crawl/<城市>-<类别>.json，
+  中断后同样的命令会接着跑；跑完 pending 为空、complete 为 true
+
+python -m tools.poi_crawler 苏州                                  # 景点，以市中心为圆心 40 km 见方
+python -m tools.poi_crawler 苏州 --kinds attractions,restaurants --radius-km 60 --rate 5
+python -m tools.poi_crawler 苏州 --bounds 30.75,120.25,31.95,121.35 --fresh
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from tools import http_client, resilience
+
+try:
+    import streamlit as st  # type: ignore
+except Exception:
+    st = None  # type: ignore
+
+
+def _get_baidu_ak() -> str | None:
+    """优先从环境变量 / Streamlit secrets 中安全获取百度地图 AK。"""
+    ak = os.getenv("BAIDU_AK")
+    if ak:
+        return ak
+    if st is not None:
+        try:
+            return st.secrets.get("BAIDU_AK")  # type: ignore[attr-defined]
+        except Exception:
+            return None
+    return None
+
+
+BAIDU_AK = _get_baidu_ak()
+
+DATA_DIR = os.getenv("TRAVEL_AGENT_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+CRAWL_DIR = os.getenv("POI_CRAWL_DIR", os.path.join(DATA_DIR, "poi_crawl"))
+SEARCH_URL = "http://api.map.baidu.com/place/v2/search"
+
+KINDS = {"attractions": "景点", "restaurants": "餐厅", "hotels": "酒店"}
+PAGE_SIZE = 20
+MAX_RESULTS = 150                                                 # 百度单次检索最多能翻到的条数
+SPLIT_AT = int(os.getenv("CRAWL_SPLIT_AT", "100"))                 # 结果数达到这个值就细分（total 是估计值，留余量）
+MIN_CELL_DEG = float(os.getenv("CRAWL_MIN_CELL_DEG", "0.004"))     # 约 400 米
+RADIUS_KM = float(os.getenv("CRAWL_RADIUS_KM", "40"))
+CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+RATE = float(os.getenv("CRAWL_RATE", "10"))                        # 次/秒，按 AK 的并发配额调整
+CHECKPOINT_SECONDS = float(os.getenv("CRAWL_CHECKPOINT_SECONDS", "5"))
+CELL_ATTEMPTS = 3
+
+Cell = Tuple[float, float, float, float]  # (南纬, 西经, 北纬, 东经)，百度 BD-09
+
+
+class CrawlAborted(RuntimeError):
+    """AK 无效、配额用尽等永久错误，继续爬也没有意义"""
+
+
+def bounds_around(lat: float, lng: float, radius_km: float) -> Cell:
+    dlat = radius_km / 111.0
+    dlng = radius_km / (111.0 * max(0.1, math.cos(math.radians(lat))))
+    return round(lat - dlat, 6), round(lng - dlng, 6), round(lat + dlat, 6), round(lng + dlng, 6)
+
+
+def split(cell: Cell) -> List[Cell]:
+    s, w, n, e = cell
+    mlat, mlng = round((s + n) / 2, 6), round((w + e) / 2, 6)
+    return [(s, w, mlat, mlng), (s, mlng, mlat, e), (mlat, w, n, mlng), (mlat, mlng, n, e)]
+
+
+def checkpoint_path(city: str, kind: str) -> str:
+    return os.path.join(CRAWL_DIR, f"{city}-{kind}.json")
+
+
+class _RateLimiter:
+    """所有协程共用的匀速令牌：两次请求至少间隔 1/rate 秒"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+@dataclass
+class CrawlState:
+    city: str
+    kind: str
+    bounds: Cell
+    pending: List[Cell]
+    pois: Dict[str, dict]
+    failed: List[Cell]
+    stats: Dict[str, int]
+    complete: bool = False
+
+    @classmethod
+    def fresh(cls, city: str, kind: str, bounds: Cell) -> "CrawlState":
+        stats = {"requests": 0, "cells": 0, "split": 0, "pruned": 0, "truncated": 0, "duplicates": 0, "retried": 0}
+        return cls(city, kind, tuple(bounds), [tuple(bounds)], {}, [], stats)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["CrawlState"]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                d = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(d["city"], d["kind"], tuple(d["bounds"]), [tuple(c) for c in d["pending"]],
+                   {p["uid"]: p for p in d["pois"]}, [tuple(c) for c in d.get("failed", [])],
+                   d["stats"], d.get("complete", False))
+
+    def save(self, path: str):
+        """写临时文件后原子替换，中途被杀也不会留下半个文件"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"city": self.city, "kind": self.kind, "query": KINDS[self.kind], "bounds": self.bounds,
+                       "complete": self.complete, "saved_at": time.time(), "stats": self.stats,
+                       "pending": self.pending, "failed": self.failed, "pois": list(self.pois.values())},
+                      f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+class PoiCrawler:
+    def __init__(self, state: CrawlState, path: str, ak: Optional[str] = BAIDU_AK, concurrency: int = CONCURRENCY,
+                 rate: float = RATE, split_at: int = SPLIT_AT, min_cell: float = MIN_CELL_DEG, log=print):
+        self.state = state
+        self.path = path
+        self.ak = ak
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.split_at = min(split_at, MAX_RESULTS)
+        self.min_cell = min_cell
+        self.log = log
+        self._saved_at = 0.0
+
+    async def _page(self, cell: Cell, page_num: int) -> dict:
+        await self._limiter.wait()
+        self.state.stats["requests"] += 1
+        params = {"ak": self.ak, "query": KINDS[self.state.kind], "bounds": "{},{},{},{}".format(*cell),
+                  "output": "json", "scope": 2, "page_size": PAGE_SIZE, "page_num": page_num}
+        # 每次请求都要过限速器：关掉对冲和内层重试，失败由 _worker 按格子重试（重试同样先拿令牌）
+        r = await http_client.get_json(SEARCH_URL, params, hedge=False, retries=0)
+        if r.get("status") != 0:
+            if resilience.classify_baidu(r) == resilience.PERMANENT:
+                raise CrawlAborted(f"百度检索失败（status={r.get('status')}）：{r.get('message', '')}")
+            raise resilience.UpstreamError(str(r.get("message", "unknown")))
+        return r
+
+    def _merge(self, results: List[dict]):
+        for poi in results:
+            uid = poi.get("uid")
+            if not uid or not poi.get("location"):
+                continue
+            if uid in self.state.pois:
+                self.state.stats["duplicates"] += 1  # 落在格子边界上的 POI 会被相邻两格都搜到
+            else:
+                self.state.pois[uid] = poi
+
+    async def _crawl_cell(self, cell: Cell) -> List[Cell]:
+        """查一格，返回需要继续查的子格"""
+        first = await self._page(cell, 0)
+        total = int(first.get("total") or 0)
+        results = first.get("results") or []
+        if total == 0 and not results:
+            self.state.stats["pruned"] += 1
+            return []
+        s, w, n, e = cell
+        if total >= self.split_at:
+            if min(n - s, e - w) / 2 >= self.min_cell:
+                self.state.stats["split"] += 1
+                return split(cell)  # 这一页的结果子格都会再搜到，不用合并
+            self.state.stats["truncated"] += 1  # 格子已经很小，只能拿到前 150 条
+        self._merge(results)
+        pages = math.ceil(min(total, MAX_RESULTS) / PAGE_SIZE)
+        for page_num in range(1, pages):
+            page = (await self._page(cell, page_num)).get("results") or []
+            self._merge(page)
+            if len(page) < PAGE_SIZE:
+                break
+        return []
+
+    def _checkpoint(self, force: bool = False):
+        if force or time.monotonic() - self._saved_at >= CHECKPOINT_SECONDS:
+            self.state.save(self.path)
+            self._saved_at = time.monotonic()
+
+    async def _worker(self, queue: "asyncio.Queue[Tuple[Cell, int]]"):
+        while True:
+            cell, attempt = await queue.get()
+            try:
+                children = await self._crawl_cell(cell)
+            except (resilience.UpstreamError, ValueError) as e:
+                if attempt + 1 < CELL_ATTEMPTS:
+                    self.state.stats["retried"] += 1
+                    await asyncio.sleep(2 ** attempt)
+                    queue.put_nowait((cell, attempt + 1))
+                else:
+                    self.log(f"⚠️ 格子 {cell} 多次失败（{e}），留待续跑")
+                    self.state.failed.append(cell)
+                    self.state.pending.remove(cell)
+            else:
+                self.state.pending.remove(cell)
+                self.state.pending.extend(children)
+                for child in children:
+                    queue.put_nowait((child, 0))
+                self.state.stats["cells"] += 1
+                if self.state.stats["cells"] % 50 == 0:
+                    self.log(f"已查 {self.state.stats['cells']} 格，待查 {len(self.state.pending)}，"
+                             f"POI {len(self.state.pois)}")
+            finally:
+                queue.task_done()
+                self._checkpoint()
+
+    async def run(self) -> CrawlState:
+        if not self.ak:
+            raise CrawlAborted("未配置百度地图密钥（BAIDU_AK）")
+        self._limiter = _RateLimiter(self.rate)
+        # 续跑：上次没查完的格子，加上上次多次失败的格子
+        self.state.pending += self.state.failed
+        self.state.failed = []
+        self.state.complete = False
+        queue: "asyncio.Queue[Tuple[Cell, int]]" = asyncio.Queue()
+        for cell in self.state.pending:
+            queue.put_nowait((cell, 0))
+        workers = [asyncio.ensure_future(self._worker(queue)) for _ in range(self.concurrency)]
+        join = asyncio.ensure_future(queue.join())
+        try:
+            # 任何一个协程因永久错误退出就整体停下
+            await asyncio.wait([join, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for w in workers:
+                if w.done() and w.exception():
+                    raise w.exception()
+            self.state.complete = not self.state.pending and not self.state.failed
+        finally:
+            for task in [join, *workers]:
+                task.cancel()
+            self._checkpoint(force=True)
+            await http_client.aclose()
+        return self.state
+
+
+def crawl(city: str, kind: str = "attractions", bounds: Optional[Cell] = None, radius_km: float = RADIUS_KM,
+          fresh: bool = False, **kwargs) -> CrawlState:
+    """爬一个城市的一类 POI；已有未完成的进度文件时接着跑（fresh=True 时从头开始）"""
+    from tools.city_tool import CityTool
+
+    path = checkpoint_path(city, kind)
+    state = None if fresh else CrawlState.load(path)
+    if state is None or (bounds and tuple(bounds) != state.bounds):
+        if bounds is None:
+            info = CityTool()._run(city)
+            if "error" in info:
+                raise CrawlAborted(info["error"])
+            bounds = bounds_around(info["latitude"], info["longitude"], radius_km)
+        state = CrawlState.fresh(city, kind, bounds)
+    elif state.complete and not state.failed:
+        return state
+    return asyncio.run(PoiCrawler(state, path, **kwargs).run())
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="全城 POI 网格爬取（百度矩形区域检索）")
+    parser.add_argument("city")
+    parser.add_argument("--kinds", default="attractions", help="逗号分隔：" + "/".join(KINDS))
+    parser.add_argument("--bounds", help="南纬,西经,北纬,东经（BD-09），默认以城市中心为圆心 --radius-km 见方")
+    parser.add_argument("--radius-km", type=float, default=RADIUS_KM)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE, help="每秒请求数上限")
+    parser.add_argument("--fresh", action="store_true", help="忽略已有进度，从头开始")
+    args = parser.parse_args(argv)
+
+    bounds = tuple(float(x) for x in args.bounds.split(",")) if args.bounds else None
+    if bounds is not None and len(bounds) != 4:
+        parser.error("--bounds 需要 4 个数：南纬,西经,北纬,东经")
+    code = 0
+    for kind in [k.strip() for k in args.kinds.split(",") if k.strip()]:
+        if kind not in KINDS:
+            parser.error(f"未知类别：{kind}")
+        started = time.time()
+        try:
+            state = crawl(args.city, kind, bounds=bounds, radius_km=args.radius_km, fresh=args.fresh,
+                          concurrency=args.concurrency, rate=args.rate)
+        except (CrawlAborted, KeyboardInterrupt) as e:
+            print(f"❌ {args.city}/{kind}：{str(e) or '已中断'}，进度已保存，重新运行同样的命令即可续跑")
+            code = 1
+            continue
+        s = state.stats
+        status = "完成" if state.complete else f"未完成（{len(state.failed)} 格失败，可重跑续上）"
+        print(f"{'✅' if state.complete else '⚠️'} {args.city}/{kind}：{status}，POI {len(state.pois)} 个，"
+              f"请求 {s['requests']} 次，查格 {s['cells']}，细分 {s['split']}，剪枝 {s['pruned']}，"
+              f"截断 {s['truncated']}，重复 {s['duplicates']}，用时 {time.time() - started:.0f}s")
+        print(f"   结果：{checkpoint_path(args.city, kind)}")
+        code = code or (0 if state.complete else 1)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
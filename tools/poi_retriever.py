@@ -0,0 +1,100 @@
+"""
+本地语义预筛选：用 BM25 把个性化需求与候选 POI 做匹配，
+只把最相关的 Top-K 交给大模型，减少 prompt token 并避免"只看最近 15 个"的问题。
+纯 CPU、无外部依赖，中文按字符 unigram + bigram 切分。
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+# 参与检索的字段（原始工具字段 + app 中转换后的字段）
+TEXT_FIELDS = ("name", "景点名称", "餐厅名称", "景点类型", "标签/特色", "菜系/标签", "推荐描述", "推荐招牌菜")
+
+# 需求描述里的高频虚词，对匹配没有帮助
+STOP_TOKENS = {
+    "喜欢", "偏好", "需要", "希望", "想要", "一些", "比较", "适合", "环境", "设施",
+    "的", "和", "或", "等", "要", "想", "有", "在", "是", "不", "了", "无",
+}
+
+_CJK_RUN = re.compile(r"[一-鿿]+")
+_WORD = re.compile(r"[a-zA-Z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文连续段切成 unigram + bigram，英文/数字按词，去掉停用词"""
+    if not text:
+        return []
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(w.lower() for w in _WORD.findall(text))
+    return [t for t in tokens if t not in STOP_TOKENS]
+
+
+def poi_text(poi: dict) -> str:
+    """拼出一个 POI 的可检索文本：名称、类型、标签、描述和平台关键词"""
+    parts = [str(poi.get(f, "")) for f in TEXT_FIELDS if poi.get(f) and poi.get(f) != "暂无"]
+    platform = poi.get("平台信息") or {}
+    if isinstance(platform, dict):
+        for key, data in platform.items():
+            if isinstance(data, dict):
+                parts.extend(data.get("key_points") or [])
+        parts.extend(platform.get("recommended_tags") or [])
+    return " ".join(parts)
+
+
+class PoiRetriever:
+    """基于 BM25 的内存倒排索引，按 POI 名称建档，一次构建多天复用"""
+
+    def __init__(self, pois: Iterable[dict], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._tf: Dict[str, Counter] = {}
+        self._len: Dict[str, int] = {}
+        df: Counter = Counter()
+        for poi in pois:
+            name = poi.get("name") or poi.get("景点名称") or poi.get("餐厅名称")
+            if not name or name in self._tf:
+                continue
+            tf = Counter(tokenize(poi_text(poi)))
+            self._tf[name] = tf
+            self._len[name] = sum(tf.values())
+            df.update(tf.keys())
+        n = len(self._tf) or 1
+        self._avg_len = (sum(self._len.values()) / n) or 1.0
+        self._idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+
+    def score(self, name: str, query_tokens: List[str]) -> float:
+        tf = self._tf.get(name)
+        if not tf:
+            return 0.0
+        norm = self.k1 * (1 - self.b + self.b * self._len[name] / self._avg_len)
+        total = 0.0
+        for t in query_tokens:
+            f = tf.get(t)
+            if f:
+                total += self._idf[t] * f * (self.k1 + 1) / (f + norm)
+        return total
+
+    def top_k(self, candidates: List[dict], requirements: Optional[str], k: int = 15) -> List[dict]:
+        """
+        从 candidates 中选出与需求最相关的 k 个：
+        1. 有得分的按得分降序（同分保持原顺序，即距离优先）
+        2. 不足 k 个时按原顺序补齐
+        3. 没有需求或完全不匹配时退化为原来的前 k 个
+        """
+        query_tokens = list(dict.fromkeys(tokenize(requirements or "")))
+        if not query_tokens:
+            return candidates[:k]
+        scored = [(self.score(c["name"], query_tokens), i) for i, c in enumerate(candidates)]
+        hits = sorted((s for s in scored if s[0] > 0), key=lambda s: (-s[0], s[1]))[:k]
+        picked = {i for _, i in hits}
+        result = [candidates[i] for _, i in hits]
+        for i, c in enumerate(candidates):
+            if len(result) >= k:
+                break
+            if i not in picked:
+                result.append(c)
+        return result
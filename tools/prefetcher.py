@@ -0,0 +1,179 @@
+"""
+目的地预取：用户还在填表时，按侧边栏里输入的目的城市提前查城市经纬度、拉景点/餐厅/酒店、生成城市简介。
+- 防抖：输入后 PREFETCH_DEBOUNCE 秒内没再改才真正开始，连续修改只跑最后一个；结果页来要结果时立即开始
+- 可取消：会话改了目的地就放弃旧城市；没有会话关心的任务立即取消，进行中的 HTTP 请求随协程一起取消；
+  城市简介在线程里调大模型，已经开始的那次会跑完（结果照常进缓存），只是不再有人等它
+- 同一城市的任务在会话间共享，跑完后保留 PREFETCH_KEEP 秒
+- 结果页用 attach() 取结果：任务还在跑就等它，已完成直接用；没有任务、被取消或只拿到临时错误时自己重新算
+任务跑在 http_client 的后台事件循环上，结果照常写入 ttl_cache；城市简介走 batch 通道，不挤占交互请求。
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from tools import http_client, resilience, ttl_cache
+
+PREFETCH_ENABLED = os.getenv("PREFETCH", "1") != "0"
+PREFETCH_DEBOUNCE = float(os.getenv("PREFETCH_DEBOUNCE", "0.8"))  # 秒
+PREFETCH_KEEP = float(os.getenv("PREFETCH_KEEP", "600"))          # 完成后保留多久（秒）
+STEPS = ("city", "attractions", "restaurants", "hotels", "city_intro")
+
+
+def _usable(result: Any) -> bool:
+    """临时错误不交给结果页，让它自己再试一次；永久错误（查无结果等）照常返回"""
+    if isinstance(result, str):
+        return not result.startswith("无法生成城市简介")
+    return not ttl_cache.is_error(result) or resilience.is_permanent(result)
+
+
+class _Job:
+    def __init__(self, city: str):
+        self.city = city
+        self.steps: Dict[str, concurrent.futures.Future] = {s: concurrent.futures.Future() for s in STEPS}
+        self.sessions: Set[str] = set()
+        self.task: Optional[concurrent.futures.Future] = None
+        self.finished_at: Optional[float] = None
+        self.expedite = False  # 结果页已经在等，跳过剩余的防抖
+        self.go: Optional[asyncio.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start_now(self):
+        self.expedite = True
+        if self.go is not None:
+            self.loop.call_soon_threadsafe(self.go.set)
+
+
+class Prefetcher:
+    def __init__(self, debounce: float = PREFETCH_DEBOUNCE, keep: float = PREFETCH_KEEP):
+        self.debounce = debounce
+        self.keep = keep
+        self._jobs: Dict[str, _Job] = {}
+        self._interest: Dict[str, str] = {}  # 会话 → 当前关心的城市
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "cancelled": 0, "attached": 0, "computed": 0}
+
+    # ---------- 后台任务 ----------
+    async def _step(self, job: _Job, name: str, work):
+        future = job.steps[name]
+        try:
+            result = await work
+        except Exception:
+            future.cancel()
+            return None
+        if _usable(result):
+            future.set_result(result)
+        else:
+            future.cancel()
+        return result
+
+    async def _run(self, job: _Job):
+        from tools.attraction_tool import AttractionTool
+        from tools.city_tool import CityTool
+        from tools.hotel_tool import HotelTool
+        from tools.restaurant_tool import RestaurantTool
+
+        def _intro():
+            from chains.city_intro_chain import get_city_introduction
+            from chains.llm_gateway import batch_lane
+
+            with batch_lane():
+                return get_city_introduction(job.city)
+
+        job.loop, job.go = asyncio.get_running_loop(), asyncio.Event()
+        if job.expedite:
+            job.go.set()
+        intro = None
+        try:
+            try:
+                await asyncio.wait_for(job.go.wait(), self.debounce)
+            except asyncio.TimeoutError:
+                pass
+            # 防抖期间被取消时上面就抛 CancelledError，简介线程还没开始
+            # 简介只依赖城市名，和经纬度查询同时开始；大模型调用是同步的，放到线程里跑
+            intro = asyncio.ensure_future(
+                self._step(job, "city_intro", asyncio.get_running_loop().run_in_executor(None, _intro)))
+            info = await self._step(job, "city", CityTool()._arun(city=job.city))
+            steps = [intro]
+            if isinstance(info, dict) and "error" not in info:
+                lat, lng = info["latitude"], info["longitude"]
+                steps += [
+                    self._step(job, "attractions", AttractionTool()._arun(lat=lat, lng=lng)),
+                    self._step(job, "restaurants", RestaurantTool()._arun(lat=lat, lng=lng)),
+                    self._step(job, "hotels", HotelTool()._arun(lat=lat, lng=lng)),
+                ]
+            await asyncio.gather(*steps)
+        finally:
+            if intro is not None:
+                intro.cancel()
+            for future in job.steps.values():
+                future.cancel()  # 没跑到的步骤（城市查询失败、被取消）交给结果页自己算
+            job.finished_at = time.time()
+
+    # ---------- 会话接口 ----------
+    def _prune(self):
+        cutoff = time.time() - self.keep
+        for city in [c for c, j in self._jobs.items() if j.finished_at is not None and j.finished_at < cutoff]:
+            del self._jobs[city]
+        for sid in [s for s, c in self._interest.items() if c not in self._jobs]:
+            del self._interest[sid]
+
+    def _release(self, session_id: str):
+        city = self._interest.pop(session_id, None)
+        job = self._jobs.get(city) if city else None
+        if job is None:
+            return
+        job.sessions.discard(session_id)
+        if not job.sessions and job.finished_at is None:
+            job.task.cancel()
+            del self._jobs[city]
+            self.stats["cancelled"] += 1
+
+    def schedule(self, session_id: str, city: str):
+        """表单每次重跑时调用：目的地没变什么都不做，变了取消旧的、（防抖后）开始新的"""
+        city = (city or "").strip()
+        with self._lock:
+            self._prune()
+            if self._interest.get(session_id) == city and city in self._jobs:
+                return
+            self._release(session_id)
+            if not PREFETCH_ENABLED or not city:
+                return
+            job = self._jobs.get(city)
+            if job is None:
+                job = self._jobs[city] = _Job(city)
+                job.task = http_client.submit(self._run(job))
+                self.stats["started"] += 1
+            job.sessions.add(session_id)
+            self._interest[session_id] = city
+
+    def release(self, session_id: str):
+        with self._lock:
+            self._release(session_id)
+
+    def attach(self, city: str, step: str, compute: Callable[[], Any], timeout: float = http_client.TOOL_TIMEOUT):
+        """取预取结果：在跑就等，完成就用；没有可用结果时调用 compute()"""
+        with self._lock:
+            job = self._jobs.get((city or "").strip())
+        if job is not None:
+            job.start_now()
+            try:
+                result = job.steps[step].result(timeout=timeout)
+                self.stats["attached"] += 1
+                return result
+            except (concurrent.futures.CancelledError, concurrent.futures.TimeoutError):
+                pass
+        self.stats["computed"] += 1
+        return compute()
+
+    def report(self) -> dict:
+        with self._lock:
+            jobs = {city: {"sessions": len(j.sessions), "finished": j.finished_at is not None,
+                           "ready": [s for s, f in j.steps.items() if f.done() and not f.cancelled()]}
+                    for city, j in self._jobs.items()}
+        return {**self.stats, "jobs": jobs}
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,292 @@
+"""
+上游调用的容错层（百度地图各接口、DeepSeek）：
+- 错误分类：可重试（超时、连接失败、5xx/429、百度内部错误和并发超限）与永久（参数错误、权限、AK 无效、查无结果）。
+  可重试的错误按退避重试；永久错误不重试、不计入熔断，工具把它标成 permanent 后由 ttl_cache 短期负缓存
+- 熔断器：连续 BREAKER_FAILURES 次可重试失败后打开，BREAKER_RESET 秒内直接失败（CircuitOpenError），
+  之后半开放行一个探测请求，成功即恢复
+- 对冲请求：同一次调用超过该上游近期 p95 仍未返回时，再发一份副本，谁先成功用谁、其余取消；
+  样本不足时不对冲，对冲数不超过调用数的 HEDGE_MAX_RATIO，上游整体变慢时不会把流量翻倍
+每个上游（按接口区分）一个 Upstream 实例，report() 汇总各自的状态，供健康检查展示。
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+RETRYABLE = "retryable"
+PERMANENT = "permanent"
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "1"))
+RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.2"))   # 秒，按次数翻倍并加抖动
+HEDGE_ENABLED = os.getenv("HEDGE_REQUESTS", "1") != "0"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+LATENCY_WINDOW = 200
+
+# 百度开放平台状态码：1 服务器内部错误、401/402 并发超限可重试；其余（参数、权限、AK、配额）重试也没用
+BAIDU_RETRYABLE_STATUS = {1, 401, 402}
+UNAVAILABLE_STATUS = -1  # get_json 在重试耗尽或熔断时返回的状态码，按可重试处理（不缓存）
+
+
+class UpstreamError(RuntimeError):
+    def __init__(self, message: str, kind: str = RETRYABLE, upstream: str = ""):
+        super().__init__(message)
+        self.kind = kind
+        self.upstream = upstream
+
+
+class CircuitOpenError(UpstreamError):
+    """熔断打开期间直接失败，不打到上游"""
+
+
+# ---------- 错误分类 ----------
+def classify_baidu(r: dict) -> str:
+    """百度返回体的状态分类；地理编码查无结果时也报 status=1（"无相关结果"），按永久处理"""
+    status = r.get("status")
+    if status == UNAVAILABLE_STATUS:
+        return RETRYABLE
+    if "无相关结果" in str(r.get("message") or r.get("msg") or ""):
+        return PERMANENT
+    try:
+        return RETRYABLE if int(status) in BAIDU_RETRYABLE_STATUS else PERMANENT
+    except (TypeError, ValueError):
+        return RETRYABLE
+
+
+def classify(error: BaseException) -> str:
+    if isinstance(error, UpstreamError):
+        return error.kind
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, json.JSONDecodeError)):
+        return RETRYABLE
+    # httpx.HTTPStatusError 的状态码在 response 上，openai 的错误直接带 status_code
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return RETRYABLE if status >= 500 or status in (408, 409, 429) else PERMANENT
+    name = type(error).__name__
+    if any(word in name for word in ("Timeout", "Connect", "Network", "Transport", "Protocol", "RemoteProtocol")):
+        return RETRYABLE  # httpx / openai 的连接类错误，不直接依赖这两个包
+    return PERMANENT
+
+
+def miss(message: str) -> dict:
+    """永久性的查无结果，ttl_cache 会按 NEGATIVE_TTL 短期缓存"""
+    return {"error": message, "permanent": True}
+
+
+def baidu_error(r: dict, prefix: str = "") -> dict:
+    """百度返回非 0 状态（或状态 0 但没有结果）时工具返回的错误项；永久错误带 permanent 标记"""
+    message = prefix + str(r.get("message", "unknown"))
+    if r.get("status") == 0 or classify_baidu(r) == PERMANENT:
+        return miss(message)
+    return {"error": message}
+
+
+def is_permanent(result: Any) -> bool:
+    item = result[0] if isinstance(result, list) and result else result
+    return isinstance(item, dict) and bool(item.get("permanent"))
+
+
+# ---------- 熔断器 ----------
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.threshold = max(1, failures)
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True  # 半开时只放行一个探测请求
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """探测请求以永久错误结束：上游是通的，但不能据此判断恢复，让下一个请求继续探测"""
+        with self._lock:
+            self._probing = False
+
+
+# ---------- 上游 ----------
+class Upstream:
+    def __init__(self, name: str, retries: int = UPSTREAM_RETRIES, hedge: bool = HEDGE_ENABLED,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.retries = retries
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            xs = sorted(self._latencies)
+        return xs[min(len(xs) - 1, int(len(xs) * HEDGE_QUANTILE))]
+
+    def hedge_delay(self, hedge: Optional[bool] = None) -> Optional[float]:
+        """对冲等待时间；不该对冲时返回 None"""
+        if not self.hedge or hedge is False:
+            return None
+        p95 = self.p95()
+        if p95 is None:
+            return None
+        with self._lock:
+            if self.stats["hedges"] >= HEDGE_MAX_RATIO * self.stats["calls"] + 1:
+                return None
+        return max(HEDGE_MIN_DELAY, p95)
+
+    async def _timed(self, factory: Callable[[], Awaitable[Any]]):
+        t0 = time.monotonic()
+        result = await factory()
+        with self._lock:
+            self._latencies.append(time.monotonic() - t0)
+        return result
+
+    async def _attempt(self, factory: Callable[[], Awaitable[Any]], hedge: Optional[bool]):
+        """发一次请求；超过 p95 还没回来就再发一份，取最先成功的那份"""
+        first = asyncio.ensure_future(self._timed(factory))
+        tasks = [first]
+        try:
+            delay = self.hedge_delay(hedge)
+            if delay is not None:
+                done, _ = await asyncio.wait({first}, timeout=delay)
+                if not done:
+                    self._count("hedges")
+                    tasks.append(asyncio.ensure_future(self._timed(factory)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, factory: Callable[[], Awaitable[Any]], hedge: Optional[bool] = None,
+                   retries: Optional[int] = None):
+        """
+        factory 每次调用返回一个新的协程（重试和对冲都会再调用它）；hedge=False 时本次不对冲，
+        retries 覆盖本次的重试次数（自己限速、自己重试的调用方传 0）。
+        熔断打开时抛 CircuitOpenError；重试耗尽后抛出最后一次的原始异常。
+        """
+        retries = self.retries if retries is None else retries
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"{self.name} 暂时不可用（熔断中）", upstream=self.name)
+        for attempt in range(retries + 1):
+            try:
+                result = await self._attempt(factory, hedge)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if classify(e) == PERMANENT:
+                    self.breaker.release()
+                    raise
+                self._count("failures")
+                if attempt >= retries:
+                    self.breaker.record_failure()
+                    raise
+                self._count("retries")
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def call_sync(self, fn: Callable[[], Any]):
+        """同步版本（熔断 + 重试，不对冲），给仍在用 requests 的调用方"""
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"{self.name} 暂时不可用（熔断中）", upstream=self.name)
+        for attempt in range(self.retries + 1):
+            t0 = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                if classify(e) == PERMANENT:
+                    self.breaker.release()
+                    raise
+                self._count("failures")
+                if attempt >= self.retries:
+                    self.breaker.record_failure()
+                    raise
+                self._count("retries")
+                time.sleep(RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+                continue
+            with self._lock:
+                self._latencies.append(time.monotonic() - t0)
+            self.breaker.record_success()
+            return result
+
+    def report(self) -> dict:
+        p95 = self.p95()
+        with self._lock:
+            stats = dict(self.stats)
+        return {"state": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None, **stats}
+
+
+_upstreams: Dict[str, Upstream] = {}
+_registry_lock = threading.Lock()
+
+
+def upstream(name: str, **kwargs) -> Upstream:
+    """按名称取（首次调用时创建）上游实例；kwargs 只在创建时生效"""
+    with _registry_lock:
+        u = _upstreams.get(name)
+        if u is None:
+            u = _upstreams[name] = Upstream(name, **kwargs)
+        return u
+
+
+def report() -> Dict[str, dict]:
+    with _registry_lock:
+        items = list(_upstreams.items())
+    return {name: u.report() for name, u in items}
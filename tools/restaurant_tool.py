@@ -1,11 +1,12 @@
 import math
 import os
 
-import requests
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Optional
 
+from tools import city_pack, http_client, resilience, ttl_cache
+
 try:
     import streamlit as st  # type: ignore
 except Exception:
@@ -47,6 +48,19 @@ class RestaurantTool(BaseTool):
         return R * c
 
     def _run(self, lat: float, lng: float, radius: int = 10000):
+        return http_client.run_sync(self._arun(lat=lat, lng=lng, radius=radius))
+
+    async def _arun(self, lat: float, lng: float, radius: int = 10000):
+        # 命中预计算城市包时直接返回，不再请求百度
+        packed = city_pack.lookup_pois("restaurants", lat, lng, radius)
+        if packed:
+            return packed
+        return await ttl_cache.cache.acached_call(
+            "restaurants", ttl_cache.poi_key(lat, lng, radius),
+            lambda: self._fetch(lat, lng, radius), ttl=ttl_cache.POI_TTL,
+        )
+
+    async def _fetch(self, lat: float, lng: float, radius: int):
         if not BAIDU_AK:
             return [{"error": "未配置百度地图密钥（BAIDU_AK）。请在环境变量或 Streamlit secrets 中设置。"}]
 
@@ -61,9 +75,13 @@ class RestaurantTool(BaseTool):
             "page_size": 20,  # Top-20
             "page_num": 0
         }
-        r = requests.get(url, params=params, timeout=5).json()
+        r = await http_client.get_json(url, params)
+        return self._parse(r, lat, lng)
+
+    def _parse(self, r: dict, lat: float, lng: float):
+        """百度地点检索结果 → 餐厅列表"""
         if r.get("status") != 0:
-            return [{"error": r.get("message", "unknown")}]
+            return [resilience.baidu_error(r)]
 
         restaurants = []
         for poi in r.get("results", []):
@@ -198,4 +216,4 @@ class RestaurantTool(BaseTool):
         
         # 按距离排序
         restaurants.sort(key=lambda x: x["距离(米)"])
-        return restaurants if restaurants else [{"error": "未找到周边餐厅"}]
\ No newline at end of file
+        return restaurants if restaurants else [resilience.miss("未找到周边餐厅")]
\ No newline at end of file
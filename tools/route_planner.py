@@ -1,9 +1,19 @@
 import math
+import os
 from datetime import datetime, timedelta
 from models.day_plan import Activity, DayPlan
+from tools import transport_modes, travel_time
 import random
 
 SPEED_WALK = 80  # 米/分钟
+# POI 坐标扰动幅度（度），默认 0 即使用百度返回的真实坐标；只在需要打散重叠点做演示时打开
+COORD_JITTER = float(os.getenv("POI_COORD_JITTER", "0"))
+
+# 各环节需要营业的时段（当天分钟数），用于按开放时间校验/替换选择
+WINDOW_AM = (9 * 60, 10 * 60)
+WINDOW_LUNCH = (12 * 60, 13 * 60)
+WINDOW_PM = (13 * 60 + 30, 14 * 60 + 30)
+WINDOW_DINNER = (18 * 60, 19 * 60)
 
 
 def distance_meters(lat1, lng1, lat2, lng2):
@@ -31,17 +41,27 @@ def distance_meters(lat1, lng1, lat2, lng2):
     return distance
 
 
-def score_activity(current_lat, current_lng, current_time, left_minutes, poi):
-    # 返回分数、交通时间、推荐停留时长
-    try:
-        d = distance_meters(current_lat, current_lng, poi["lat"], poi["lng"])
-    except (ValueError, KeyError) as e:
-        # 如果距离计算失败，返回一个较大的默认值，避免程序崩溃
-        print(f"警告：距离计算失败: {e}, 使用默认值")
-        d = 1000  # 默认1公里
-    
-    # 计算步行时间，确保至少为1分钟（即使距离很小也要显示）
-    t_trans = max(1, int(d / SPEED_WALK))  # 步行分钟，至少1分钟
+def coordinate_jitter(name, seed=None, scale=None):
+    """POI 坐标的 ±scale° 扰动（默认 COORD_JITTER，为 0 时不扰动）；给定 seed 时由 (seed, 名称) 决定，结果可复现"""
+    scale = COORD_JITTER if scale is None else scale
+    if scale <= 0:
+        return 0.0, 0.0
+    rng = random.Random(f"{seed}:{name}") if seed is not None else random
+    return rng.uniform(-scale, scale), rng.uniform(-scale, scale)
+
+
+def score_activity(current_lat, current_lng, current_time, left_minutes, poi, t_trans=None):
+    # 返回分数、交通时间、推荐停留时长；t_trans 由出行时间矩阵给出时直接使用
+    if t_trans is None:
+        try:
+            d = distance_meters(current_lat, current_lng, poi["lat"], poi["lng"])
+        except (ValueError, KeyError) as e:
+            # 如果距离计算失败，返回一个较大的默认值，避免程序崩溃
+            print(f"警告：距离计算失败: {e}, 使用默认值")
+            d = 1000  # 默认1公里
+
+        # 计算步行时间，确保至少为1分钟（即使距离很小也要显示）
+        t_trans = max(1, int(d / SPEED_WALK))  # 步行分钟，至少1分钟
     t_stay = 60 if poi["category"] == "attraction" else 45
     if poi["category"] == "restaurant":
         t_stay = 60
@@ -51,7 +71,8 @@ def score_activity(current_lat, current_lng, current_time, left_minutes, poi):
 
 def greedy_daily_schedule(hotel_lat, hotel_lng, hotel_name, avail_attractions, avail_restaurants, day_start, day, 
                           hotel_price=200, adults=2, destination="", personal_requirements="", children=0,
-                          llm_selection=None):
+                          llm_selection=None, rng=None, travel=None, transport_budget=None,
+                          opening_index=None):
     """使用大模型决策的每日行程规划 + 费用计算
     
     Args:
@@ -61,7 +82,13 @@ def greedy_daily_schedule(hotel_lat, hotel_lng, hotel_name, avail_attractions, a
         destination: 目的地城市
         personal_requirements: 个性化需求
         llm_selection: 大模型选择的行程（DayPlanSelection对象）
+        rng: 随机数生成器（random.Random），可复现模式下由请求派生的种子初始化
+        travel: 出行时间矩阵提供方（TravelTimeProvider），默认按配置选择百度批量算路或本地估算
+        transport_budget: 当天市内交通预算（元），用于逐段选择步行/地铁/打车
+        opening_index: 候选池的营业时间索引（OpeningIndex），计划时段不营业的 POI 会被互换或就近替换
     """
+    rng = rng or random
+    travel = travel or travel_time.provider
     activities = []
     current_time = day_start
     current_lat, current_lng = hotel_lat, hotel_lng
@@ -69,11 +96,11 @@ def greedy_daily_schedule(hotel_lat, hotel_lng, hotel_name, avail_attractions, a
     # 费用累计
     total_attraction_cost = 0  # 门票费用
     total_restaurant_cost = 0  # 餐饮费用
-    total_transport_cost = 0   # 交通费用（步行免费，但预留出租车费用）
+    total_transport_cost = 0   # 交通费用（逐段按所选交通方式累计）
 
     # 1. 酒店入住
     activities.append(Activity(name=f"入住 {hotel_name}", start=current_time, end=current_time + timedelta(minutes=30),
-                               category="hotel"))
+                               category="hotel", lat=hotel_lat, lng=hotel_lng))
     current_time += timedelta(minutes=30)
 
     # 2. 根据大模型选择找到对应的景点和餐厅
@@ -107,71 +134,109 @@ def greedy_daily_schedule(hotel_lat, hotel_lng, hotel_name, avail_attractions, a
                 dinner_rest = rest
                 break
     
-    # 如果大模型选择失败，回退到贪心算法
-    if not morning_attr or not lunch_rest or not afternoon_attr or not dinner_rest:
-        # 回退逻辑：使用贪心算法
-        avail_attr = avail_attractions.copy()
+    day_date = day_start.date()
+
+    def is_open(poi, window):
+        return opening_index is None or opening_index.is_open(poi, day_date, *window)
+
+    # 如果大模型选择失败，回退到贪心算法（餐厅随机选，景点按出行时间挑）
+    fallback = not morning_attr or not lunch_rest or not afternoon_attr or not dinner_rest
+    if fallback:
         avail_rest = avail_restaurants.copy()
-        
-        left_minutes_am = int((current_time.replace(hour=12, minute=0) - current_time).total_seconds() / 60)
-        morning_attr = max(avail_attr, key=lambda a: score_activity(current_lat, current_lng, current_time, left_minutes_am, a)[0])
-        lunch_rest = random.choice(avail_rest)
-        avail_attr.remove(morning_attr)
-        
-        left_minutes_pm = int((current_time.replace(hour=18, minute=0) - current_time.replace(hour=12, minute=0) - timedelta(minutes=60)).total_seconds() / 60)
-        afternoon_attr = max(avail_attr, key=lambda a: score_activity(current_lat, current_lng, current_time.replace(hour=12, minute=0) + timedelta(minutes=60), left_minutes_pm, a)[0])
+        lunch_rest = rng.choice(avail_rest)
         dinner_candidates = [r for r in avail_rest if r != lunch_rest]
-        dinner_rest = random.choice(dinner_candidates if dinner_candidates else avail_rest)
+        dinner_rest = rng.choice(dinner_candidates if dinner_candidates else avail_rest)
+    elif opening_index is not None:
+        # 大模型选的景点在对应时段不开放：先试上下午互换，不行再就近换成营业的候选
+        if not is_open(morning_attr, WINDOW_AM) and is_open(morning_attr, WINDOW_PM) and is_open(afternoon_attr, WINDOW_AM):
+            morning_attr, afternoon_attr = afternoon_attr, morning_attr
+        morning_attr = opening_index.ensure_open(morning_attr, avail_attractions, day_date, *WINDOW_AM, exclude=[afternoon_attr])
+        afternoon_attr = opening_index.ensure_open(afternoon_attr, avail_attractions, day_date, *WINDOW_PM, exclude=[morning_attr])
+    if opening_index is not None:
+        lunch_rest = opening_index.ensure_open(lunch_rest, avail_restaurants, day_date, *WINDOW_LUNCH, exclude=[dinner_rest])
+        dinner_rest = opening_index.ensure_open(dinner_rest, avail_restaurants, day_date, *WINDOW_DINNER, exclude=[lunch_rest])
+    attr_candidates = avail_attractions.copy() if fallback else [morning_attr, afternoon_attr]
+
+    # 一次性取整天的出行时间矩阵：
+    # 起点 = [酒店, 午餐] + 候选景点，终点 = 候选景点 + [午餐, 晚餐]
+    n = len(attr_candidates)
+    origins = [(hotel_lat, hotel_lng), (lunch_rest["lat"], lunch_rest["lng"])] + [(a["lat"], a["lng"]) for a in attr_candidates]
+    destinations = [(a["lat"], a["lng"]) for a in attr_candidates] + [(lunch_rest["lat"], lunch_rest["lng"]), (dinner_rest["lat"], dinner_rest["lng"])]
+    matrix = travel.matrix(origins, destinations)
+    HOTEL, LUNCH_FROM, ATTR_FROM = 0, 1, 2
+    LUNCH_TO, DINNER_TO = n, n + 1
+
+    if fallback:
+        left_minutes_am = int((current_time.replace(hour=12, minute=0) - current_time).total_seconds() / 60)
+        # 不营业的候选记 -1 分（正常得分 ≥ 0），只有全都不营业时才会被选中
+        i_am = max(range(n), key=lambda i: score_activity(current_lat, current_lng, current_time, left_minutes_am,
+                                                          attr_candidates[i], t_trans=matrix.minutes[HOTEL][i])[0]
+                   if is_open(attr_candidates[i], WINDOW_AM) else -1)
+        pm_start = current_time.replace(hour=12, minute=0) + timedelta(minutes=60)
+        left_minutes_pm = int((current_time.replace(hour=18, minute=0) - pm_start).total_seconds() / 60)
+        i_pm = max((i for i in range(n) if i != i_am) if n > 1 else range(n),
+                   key=lambda i: score_activity(lunch_rest["lat"], lunch_rest["lng"], pm_start, left_minutes_pm,
+                                                attr_candidates[i], t_trans=matrix.minutes[LUNCH_FROM][i])[0]
+                   if is_open(attr_candidates[i], WINDOW_PM) else -1)
+        morning_attr, afternoon_attr = attr_candidates[i_am], attr_candidates[i_pm]
+    else:
+        i_am, i_pm = 0, 1
+
+    # 当天四段路程一起选交通方式：先全部步行，再在预算内把最省时的路段升级为地铁/打车
+    modes = transport_modes.mode_matrices(matrix, party=adults + children)
+    budget = transport_modes.DAILY_TRANSPORT_BUDGET if transport_budget is None else transport_budget
+    leg_am, leg_lunch, leg_pm, leg_dinner = transport_modes.choose_modes(modes, [
+        (HOTEL, i_am), (ATTR_FROM + i_am, LUNCH_TO), (LUNCH_FROM, i_pm), (ATTR_FROM + i_pm, DINNER_TO)
+    ], budget)
 
-    # 3. 上午景点
+    # 3. 上午景点（酒店 → 上午景点）
     left_minutes_am = int((current_time.replace(hour=12, minute=0) - current_time).total_seconds() / 60)
-    score_am, t_trans_am, t_stay_am = score_activity(current_lat, current_lng, current_time, left_minutes_am, morning_attr)
+    score_am, t_trans_am, t_stay_am = score_activity(current_lat, current_lng, current_time, left_minutes_am, morning_attr,
+                                                     t_trans=leg_am.minutes)
     activities.append(
         Activity(name=morning_attr["name"], start=current_time, end=current_time + timedelta(minutes=t_trans_am + t_stay_am),
-                 transport_mode="步行", transport_duration=t_trans_am, category="attraction"))
+                 transport_mode=leg_am.mode, transport_duration=t_trans_am, transport_distance=leg_am.meters,
+                 transport_cost=leg_am.cost, category="attraction", lat=morning_attr["lat"], lng=morning_attr["lng"]))
     # 计算门票费用（成人全价，儿童半价，通常1.2米以下免费但这里统一按半价计算）
     ticket_price_am = morning_attr.get("门票数值", 0)
     total_attraction_cost += int(ticket_price_am * adults + ticket_price_am * 0.5 * children)
     current_lat, current_lng = morning_attr["lat"], morning_attr["lng"]
     current_time += timedelta(minutes=t_trans_am + t_stay_am)
 
-    # 4. 午餐
+    # 4. 午餐（上午景点 → 午餐餐厅）
     lunch_time = current_time.replace(hour=12, minute=0) if current_time.hour < 12 else current_time
-    # 确保午餐有步行距离（从上午景点到午餐餐厅）
-    t_lunch, _, _ = score_activity(current_lat, current_lng, lunch_time, 60, lunch_rest)
-    # 确保步行时间至少为1分钟（即使距离很小）
-    t_lunch = max(1, t_lunch)
     activities.append(Activity(name=f"午餐 - {lunch_rest['name']}", start=lunch_time,
                                end=lunch_time + timedelta(minutes=60),
-                               transport_mode="步行", transport_duration=t_lunch, category="meal"))
+                               transport_mode=leg_lunch.mode, transport_duration=leg_lunch.minutes,
+                               transport_distance=leg_lunch.meters, transport_cost=leg_lunch.cost, category="meal",
+                               lat=lunch_rest["lat"], lng=lunch_rest["lng"]))
     # 计算午餐费用（成人全价，儿童半价）
     lunch_price = lunch_rest.get("人均数值", 50)
     total_restaurant_cost += int(lunch_price * adults + lunch_price * 0.5 * children)
     current_time = lunch_time + timedelta(minutes=60)
     current_lat, current_lng = lunch_rest["lat"], lunch_rest["lng"]
 
-    # 5. 下午景点
+    # 5. 下午景点（午餐餐厅 → 下午景点）
     left_minutes_pm = int((current_time.replace(hour=18, minute=0) - current_time).total_seconds() / 60)
-    score_pm, t_trans_pm, t_stay_pm = score_activity(current_lat, current_lng, current_time, left_minutes_pm, afternoon_attr)
+    score_pm, t_trans_pm, t_stay_pm = score_activity(current_lat, current_lng, current_time, left_minutes_pm, afternoon_attr,
+                                                     t_trans=leg_pm.minutes)
     activities.append(
         Activity(name=afternoon_attr["name"], start=current_time, end=current_time + timedelta(minutes=t_trans_pm + t_stay_pm),
-                 transport_mode="步行", transport_duration=t_trans_pm, category="attraction"))
+                 transport_mode=leg_pm.mode, transport_duration=t_trans_pm, transport_distance=leg_pm.meters,
+                 transport_cost=leg_pm.cost, category="attraction", lat=afternoon_attr["lat"], lng=afternoon_attr["lng"]))
     # 计算门票费用（成人全价，儿童半价）
     ticket_price_pm = afternoon_attr.get("门票数值", 0)
     total_attraction_cost += int(ticket_price_pm * adults + ticket_price_pm * 0.5 * children)
     current_lat, current_lng = afternoon_attr["lat"], afternoon_attr["lng"]
     current_time += timedelta(minutes=t_trans_pm + t_stay_pm)
 
-    # 6. 晚餐
+    # 6. 晚餐（下午景点 → 晚餐餐厅）
     dinner_time = current_time.replace(hour=18, minute=0) if current_time.hour < 18 else current_time
-    # 确保晚餐有步行距离（从下午景点到晚餐餐厅）
-    t_dinner, _, _ = score_activity(current_lat, current_lng, dinner_time, 60, dinner_rest)
-    # 确保步行时间至少为1分钟（即使距离很小）
-    t_dinner = max(1, t_dinner)
     activities.append(
         Activity(name=f"晚餐 - {dinner_rest['name']}", start=dinner_time,
-                 end=dinner_time + timedelta(minutes=60), transport_mode="步行",
-                 transport_duration=t_dinner, category="meal"))
+                 end=dinner_time + timedelta(minutes=60), transport_mode=leg_dinner.mode,
+                 transport_duration=leg_dinner.minutes, transport_distance=leg_dinner.meters,
+                 transport_cost=leg_dinner.cost, category="meal", lat=dinner_rest["lat"], lng=dinner_rest["lng"]))
     # 计算晚餐费用（成人全价，儿童半价）
     dinner_price = dinner_rest.get("人均数值", 50)
     total_restaurant_cost += int(dinner_price * adults + dinner_price * 0.5 * children)
@@ -181,12 +246,8 @@ def greedy_daily_schedule(hotel_lat, hotel_lng, hotel_name, avail_attractions, a
     # 7. 返回酒店功能已删除（因为距离计算不稳定，导致时间异常）
     # 行程在晚餐后结束，用户自行返回酒店
     
-    # 计算交通费用（预留出租车费用，如果距离较远）
-    # 只计算步行活动的距离
-    total_distance = sum(act.transport_duration * 80 / 1000 for act in activities 
-                        if act.transport_mode == "步行" and act.transport_duration > 0)  # 公里
-    if total_distance > 5:  # 如果总步行距离超过5公里，预留出租车费用
-        total_transport_cost = int((total_distance - 5) * 2)  # 每公里2元
+    # 交通费用：各路段所选交通方式的费用之和
+    total_transport_cost = sum(act.transport_cost for act in activities)
 
     # 住宿费用：只在第一天计算，其他天为0（因为已经按总天数计算）
     # 注意：住宿费用应该在总费用计算时单独处理，这里每天设为0
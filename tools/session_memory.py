@@ -0,0 +1,295 @@
+"""
+会话内存管理：多个 Streamlit 会话共用同一份 POI 候选池，每个会话只保存引用和自己的点赞/删除记录。
+- 候选池不可变、按 (城市, 查询, 版本) 驻留：版本是内容哈希，同样的数据全进程只保留一份；
+  池里的 POI 是只读 dict（FrozenPoi，嵌套的 平台信息 一并冻结，列表转成元组），json 可以直接序列化
+- 会话登记最近访问时间、引用的候选池、派生产物（行程快照等，随时能从磁盘或工具缓存重建）
+- 进程内存超过 SESSION_MEMORY_BUDGET_MB 时，按最久未访问的顺序淘汰空闲会话的派生产物；
+  长时间不活动的会话整体注销，候选池没有会话引用后自动释放
+- memory_report()：按会话、按候选池统计内存占用
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+SESSION_MEMORY_BUDGET_BYTES = int(float(os.getenv("SESSION_MEMORY_BUDGET_MB", "512")) * 1024 * 1024)
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "600"))       # 超过这么久没访问算空闲，派生产物可淘汰
+SESSION_EXPIRE_SECONDS = float(os.getenv("SESSION_EXPIRE_SECONDS", "21600"))  # 超过这么久没访问整体注销
+INTERN_MAX_LEN = 64  # 不超过这个长度的字符串值做 sys.intern（店名、类型、营业时间等大量重复）
+
+
+# ---------- 只读 POI ----------
+class FrozenPoi(dict):
+    """只读 dict：任何写操作都抛 TypeError；仍是 dict 子类，.get / json.dumps / 序列化照常可用"""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("候选池里的 POI 是只读的，请先 dict(poi) 复制一份再修改")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenPoi, (dict(self),)
+
+
+def freeze(value):
+    """递归冻结：dict → FrozenPoi，list → tuple，短字符串驻留"""
+    if isinstance(value, dict):
+        return FrozenPoi((sys.intern(k) if isinstance(k, str) else k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LEN:
+        return sys.intern(value)
+    return value
+
+
+def content_version(items: Iterable) -> str:
+    body = json.dumps(list(items), ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+
+
+def deep_sizeof(obj, seen: Optional[Set[int]] = None) -> int:
+    """粗略的递归内存占用（字节）；seen 里的对象不重复计算，可用来排除共享的候选池"""
+    seen = set() if seen is None else seen
+    stack, total = [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o, 0)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__") and not isinstance(o, type):
+            stack.append(o.__dict__)
+    return total
+
+
+def process_rss() -> Optional[int]:
+    """当前进程常驻内存（字节）；读不到 /proc 时返回 None，预算改按登记的占用估算"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# ---------- 候选池 ----------
+@dataclass(frozen=True, eq=False)
+class PoiPool:
+    city: str
+    query: str
+    version: str
+    items: tuple
+    nbytes: int
+
+    @property
+    def key(self):
+        return self.city, self.query, self.version
+
+    def __len__(self):
+        return len(self.items)
+
+
+_pools: "weakref.WeakValueDictionary" = weakref.WeakValueDictionary()  # (城市, 查询, 版本) → PoiPool
+_pools_lock = threading.Lock()
+
+
+def intern_pool(city: str, query: str, items: Iterable[dict],
+                prepare: Optional[Callable[[List[dict]], None]] = None) -> PoiPool:
+    """
+    返回与 items 内容对应的共享候选池；已驻留时直接复用，不再执行 prepare。
+    prepare 在冻结前对可写副本做一次性补充（如平台信息），补充后的内容版本也登记为同一个池，
+    之后从快照读回的同样数据会直接命中。
+    """
+    items = list(items or [])
+    raw_key = (city, query, content_version(items))
+    with _pools_lock:
+        pool = _pools.get(raw_key)
+    if pool is not None:
+        return pool
+
+    data = [dict(x) for x in items]
+    if prepare is not None:
+        prepare(data)
+    version = content_version(data) if prepare is not None else raw_key[2]
+    frozen = freeze(data)
+    candidate = PoiPool(city, query, version, frozen, deep_sizeof(frozen))
+    with _pools_lock:
+        pool = _pools.get(candidate.key) or candidate  # 并发时以先登记的为准
+        _pools[candidate.key] = pool
+        _pools[raw_key] = pool
+    return pool
+
+
+def live_pools() -> List[PoiPool]:
+    with _pools_lock:
+        return list({id(p): p for p in _pools.values()}.values())
+
+
+# ---------- 会话 ----------
+@dataclass
+class Overlay:
+    """会话自己的一小层偏好：按名称记录点赞和删除，不复制候选池"""
+    liked: Set[str] = field(default_factory=set)
+    removed: Set[str] = field(default_factory=set)
+
+    def apply(self, items: Iterable[dict], name_key: str) -> List[dict]:
+        """去掉已删除的，点赞的置顶，其余保持原顺序"""
+        kept = [x for x in items if x.get(name_key) not in self.removed]
+        return [x for x in kept if x.get(name_key) in self.liked] + [x for x in kept if x.get(name_key) not in self.liked]
+
+
+@dataclass
+class _Session:
+    last_seen: float
+    pools: Dict[str, PoiPool] = field(default_factory=dict)        # 槽位（attractions/restaurants/hotels）→ 候选池
+    overlays: Dict[str, Overlay] = field(default_factory=dict)
+    artifacts: Dict[str, Any] = field(default_factory=dict)        # 派生产物，可被淘汰
+    artifact_bytes: Dict[str, int] = field(default_factory=dict)
+    evictions: int = 0
+
+
+class SessionRegistry:
+    def __init__(self, budget_bytes: int = SESSION_MEMORY_BUDGET_BYTES, idle_seconds: float = SESSION_IDLE_SECONDS,
+                 expire_seconds: float = SESSION_EXPIRE_SECONDS, rss: Callable[[], Optional[int]] = process_rss):
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.expire_seconds = expire_seconds
+        self._rss = rss
+        self._sessions: Dict[str, _Session] = {}
+        self._lock = threading.RLock()
+
+    def _session(self, session_id: str) -> _Session:
+        s = self._sessions.get(session_id)
+        if s is None:
+            s = self._sessions[session_id] = _Session(last_seen=time.time())
+        return s
+
+    def touch(self, session_id: str):
+        """每次页面重跑调用一次：刷新访问时间，注销过期会话，必要时按预算淘汰"""
+        with self._lock:
+            self._session(session_id).last_seen = time.time()
+            self._expire()
+        self.enforce_budget()
+
+    # ---------- 候选池引用 ----------
+    def attach(self, session_id: str, slot: str, pool: PoiPool) -> PoiPool:
+        with self._lock:
+            self._session(session_id).pools[slot] = pool
+        return pool
+
+    def overlay(self, session_id: str, slot: str) -> Overlay:
+        with self._lock:
+            return self._session(session_id).overlays.setdefault(slot, Overlay())
+
+    # ---------- 派生产物 ----------
+    def put(self, session_id: str, name: str, value):
+        shared = {id(p.items) for p in live_pools()}  # 引用的候选池单独统计，不算进会话
+        size = deep_sizeof(value, shared)
+        with self._lock:
+            s = self._session(session_id)
+            s.artifacts[name] = value
+            s.artifact_bytes[name] = size
+        self.enforce_budget()
+
+    def get(self, session_id: str, name: str, default=None):
+        """被淘汰或从未存过时返回 default，调用方自行重建"""
+        with self._lock:
+            s = self._sessions.get(session_id)
+            return s.artifacts.get(name, default) if s else default
+
+    def discard(self, session_id: str, name: str):
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s:
+                s.artifacts.pop(name, None)
+                s.artifact_bytes.pop(name, None)
+
+    # ---------- 预算 ----------
+    def tracked_bytes(self) -> int:
+        with self._lock:
+            artifacts = sum(sum(s.artifact_bytes.values()) for s in self._sessions.values())
+        return artifacts + sum(p.nbytes for p in live_pools())
+
+    def _expire(self):
+        cutoff = time.time() - self.expire_seconds
+        for sid in [sid for sid, s in self._sessions.items() if s.last_seen < cutoff]:
+            del self._sessions[sid]  # 连同候选池引用一起释放
+
+    def enforce_budget(self) -> int:
+        """
+        超出预算时淘汰空闲会话的派生产物（最久未访问的先淘汰），返回估计释放的字节数。
+        能读到进程常驻内存就按它判断，否则按登记的占用估算；活跃会话的数据不动。
+        """
+        rss = self._rss()
+        used = rss if rss is not None else self.tracked_bytes()
+        excess = used - self.budget_bytes
+        if excess <= 0:
+            return 0
+        freed = 0
+        now = time.time()
+        with self._lock:
+            idle = sorted((s.last_seen, sid) for sid, s in self._sessions.items()
+                          if now - s.last_seen >= self.idle_seconds and s.artifacts)
+            for _, sid in idle:
+                if freed >= excess:
+                    break
+                s = self._sessions[sid]
+                freed += sum(s.artifact_bytes.values())
+                s.evictions += len(s.artifacts)
+                s.artifacts.clear()
+                s.artifact_bytes.clear()
+        return freed
+
+    # ---------- 报告 ----------
+    def report(self) -> dict:
+        now = time.time()
+        pools = live_pools()
+        with self._lock:
+            sessions = [
+                {
+                    "session": sid,
+                    "idle_seconds": round(now - s.last_seen, 1),
+                    "artifact_bytes": sum(s.artifact_bytes.values()),
+                    "artifacts": dict(s.artifact_bytes),
+                    "overlay_bytes": deep_sizeof(s.overlays),
+                    "pools": {slot: "/".join(p.key) for slot, p in s.pools.items()},
+                    "evicted": s.evictions,
+                }
+                for sid, s in sorted(self._sessions.items(), key=lambda kv: -kv[1].last_seen)
+            ]
+            refs = {}
+            for s in self._sessions.values():
+                for p in s.pools.values():
+                    refs[id(p)] = refs.get(id(p), 0) + 1
+        return {
+            "process_rss": self._rss(),
+            "budget_bytes": self.budget_bytes,
+            "tracked_bytes": sum(x["artifact_bytes"] + x["overlay_bytes"] for x in sessions) + sum(p.nbytes for p in pools),
+            "pools": [{"city": p.city, "query": p.query, "version": p.version, "items": len(p),
+                       "bytes": p.nbytes, "sessions": refs.get(id(p), 0)} for p in pools],
+            "sessions": sessions,
+        }
+
+
+registry = SessionRegistry()
+
+
+def memory_report() -> dict:
+    return registry.report()
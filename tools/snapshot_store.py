@@ -0,0 +1,159 @@
+"""
+行程快照：把一次完整规划的结果（请求、城市信息、POI 候选、酒店、预算、每天的 DayPlan 和费用）存成紧凑的二进制文件，
+之后通过 ?snapshot=<id> 永久链接秒开，全程不发任何百度/大模型请求。
+- 格式：MAGIC + 格式版本号（1 字节）+ zlib 压缩的规范化 JSON（键排序、紧凑分隔符）
+- 内容寻址：id = 规范化 JSON 的 sha256 前 24 位，内容相同的快照只存一份
+- 请求别名：可复现模式下同一请求（按内容哈希）指向最近一次的快照，SNAPSHOT_ALIAS_TTL 秒内重复提交直接复用，
+  过期后重新规划（POI、价格、营业时间会变）
+- 按最近访问时间淘汰，快照总大小不超过 SNAPSHOT_MAX_MB；被淘汰的永久链接打开时提示已被清理
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import zlib
+from typing import Optional
+
+DATA_DIR = os.getenv("TRAVEL_AGENT_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(DATA_DIR, "snapshots"))
+SNAPSHOT_ALIAS_TTL = float(os.getenv("SNAPSHOT_ALIAS_TTL", str(24 * 3600)))  # 与 API 结果缓存的 24 小时一致
+SNAPSHOT_MAX_BYTES = int(float(os.getenv("SNAPSHOT_MAX_MB", "500")) * 1024 * 1024)
+
+MAGIC = b"TASNAP"
+FORMAT_VERSION = 1
+ID_LENGTH = 24
+_ID_RE = re.compile(rf"^[0-9a-f]{{{ID_LENGTH}}}$")
+_KEY_RE = re.compile(r"^[0-9a-f]{16,64}$")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def canonical_json(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def encode(payload: dict) -> bytes:
+    return MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(canonical_json(payload), 9)
+
+
+def decode(blob: bytes) -> dict:
+    if not blob.startswith(MAGIC) or len(blob) <= len(MAGIC):
+        raise SnapshotError("不是有效的行程快照")
+    version = blob[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f"不支持的快照版本：{version}")
+    try:
+        return json.loads(zlib.decompress(blob[len(MAGIC) + 1:]).decode("utf-8"))
+    except (zlib.error, ValueError) as e:
+        raise SnapshotError(f"快照已损坏：{e}")
+
+
+def _atomic_write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class SnapshotStore:
+    def __init__(self, root: str = SNAPSHOT_DIR, alias_ttl: float = SNAPSHOT_ALIAS_TTL,
+                 max_bytes: int = SNAPSHOT_MAX_BYTES):
+        self.root = root
+        self.alias_ttl = alias_ttl
+        self.max_bytes = max_bytes
+
+    def _object_path(self, snapshot_id: str) -> str:
+        if not _ID_RE.match(snapshot_id or ""):
+            raise SnapshotError("快照编号格式不正确")  # 编号来自 URL，校验后才拼路径
+        return os.path.join(self.root, "objects", snapshot_id[:2], snapshot_id[2:] + ".snap")
+
+    def _alias_path(self, request_key: str) -> str:
+        if not _KEY_RE.match(request_key or ""):
+            raise SnapshotError("请求哈希格式不正确")
+        return os.path.join(self.root, "aliases", request_key)
+
+    def save(self, payload: dict, request_key: Optional[str] = None) -> str:
+        """写入快照并返回 id；内容已存在时不重复写。给了 request_key 时同时更新请求别名"""
+        body = canonical_json(payload)
+        snapshot_id = hashlib.sha256(body).hexdigest()[:ID_LENGTH]
+        path = self._object_path(snapshot_id)
+        written = False
+        try:
+            os.utime(path)
+        except OSError:
+            _atomic_write(path, MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(body, 9))
+            written = True
+        if request_key:
+            _atomic_write(self._alias_path(request_key), snapshot_id.encode("ascii"))
+        if written:
+            self._evict()
+        return snapshot_id
+
+    def load(self, snapshot_id: str) -> dict:
+        path = self._object_path(snapshot_id)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            raise SnapshotError("快照不存在或已被清理")
+        try:
+            os.utime(path)  # 刷新访问时间，常打开的快照不被淘汰
+        except OSError:
+            pass
+        return decode(blob)
+
+    def find(self, request_key: str) -> Optional[str]:
+        """同一请求最近一次保存的快照 id；没有、别名已过期或对应快照已被删除时返回 None"""
+        try:
+            path = self._alias_path(request_key)
+            if time.time() - os.stat(path).st_mtime > self.alias_ttl:
+                return None
+            with open(path, "rb") as f:
+                snapshot_id = f.read().decode("ascii").strip()
+        except (OSError, SnapshotError):
+            return None
+        try:
+            return snapshot_id if os.path.exists(self._object_path(snapshot_id)) else None
+        except SnapshotError:
+            return None
+
+
+    def _evict(self):
+        """删掉过期别名；快照按最近访问时间淘汰，直到总大小不超过上限"""
+        now = time.time()
+        alias_dir = os.path.join(self.root, "aliases")
+        for name in os.listdir(alias_dir) if os.path.isdir(alias_dir) else []:
+            path = os.path.join(alias_dir, name)
+            try:
+                if now - os.stat(path).st_mtime > self.alias_ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+        entries = []
+        for folder, _, files in os.walk(os.path.join(self.root, "objects")):
+            for name in files:
+                if not name.endswith(".snap"):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+store = SnapshotStore()
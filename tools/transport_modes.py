@@ -0,0 +1,116 @@
+"""
+逐段交通方式选择（步行 / 地铁 / 打车）：
+- mode_matrices：由当天的步行出行时间矩阵一次性算出三种方式的 分钟 / 费用 矩阵（numpy 向量化）
+- choose_modes：所有路段先按步行，再按"每花 1 元省下的分钟数"从高到低升级，直到当天交通预算用完
+地铁按全员计票，打车按车计费（每车 4 人）；参数均为城市通用的粗略估计，可用环境变量调整。
+"""
+import heapq
+import os
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from tools.travel_time import TravelMatrix
+
+WALK, METRO, TAXI = 0, 1, 2
+MODE_NAMES = ("步行", "地铁", "打车")
+MODE_ICONS = {"步行": "🚶", "地铁": "🚇", "打车": "🚕"}
+
+METRO_SPEED = 500         # 米/分钟，含停站
+METRO_ACCESS = 12         # 分钟，进出站 + 候车
+METRO_MIN_DISTANCE = 1500  # 米，太近不值得坐地铁
+TAXI_SPEED = 400          # 米/分钟，市区平均车速约 24km/h
+TAXI_WAIT = 6             # 分钟，叫车 + 上下车
+TAXI_BASE, TAXI_BASE_KM, TAXI_PER_KM = 13.0, 3.0, 2.3
+TAXI_SEATS = 4
+
+DAILY_TRANSPORT_BUDGET = float(os.getenv("DAILY_TRANSPORT_BUDGET", "150"))  # 元/天，未给预算时使用
+MIN_MINUTES_PER_YUAN = float(os.getenv("MIN_MINUTES_PER_YUAN", "0.3"))    # 省时太少的升级不值得花钱
+
+
+@dataclass
+class ModeMatrix:
+    minutes: np.ndarray  # (3, 起点数, 终点数)
+    cost: np.ndarray     # (3, 起点数, 终点数)，元
+    meters: np.ndarray   # (起点数, 终点数)
+
+
+@dataclass
+class LegChoice:
+    mode: str
+    minutes: int
+    meters: int
+    cost: int
+
+
+def metro_fare(km: np.ndarray) -> np.ndarray:
+    """按里程分段计价：6km 内 3 元，12/22/32km 各加 1 元，之后每 20km 加 1 元"""
+    fare = 3 + (km > 6) + (km > 12) + (km > 22) + (km > 32)
+    return fare + np.floor(np.maximum(km - 32, 0) / 20)
+
+
+def taxi_fare(km: np.ndarray) -> np.ndarray:
+    return TAXI_BASE + np.maximum(km - TAXI_BASE_KM, 0) * TAXI_PER_KM
+
+
+def mode_matrices(matrix: TravelMatrix, party: int = 2) -> ModeMatrix:
+    walk = np.asarray(matrix.minutes, dtype=np.float64)
+    meters = np.asarray(matrix.meters, dtype=np.float64)
+    km = meters / 1000
+    party = max(1, party)
+    cars = -(-party // TAXI_SEATS)
+
+    minutes = np.empty((3,) + walk.shape)
+    cost = np.empty((3,) + walk.shape)
+    minutes[WALK], cost[WALK] = walk, 0
+    minutes[METRO] = np.where(meters >= METRO_MIN_DISTANCE, METRO_ACCESS + meters / METRO_SPEED, np.inf)
+    cost[METRO] = metro_fare(km) * party
+    minutes[TAXI] = TAXI_WAIT + meters / TAXI_SPEED
+    cost[TAXI] = taxi_fare(km) * cars
+    return ModeMatrix(minutes=np.ceil(minutes), cost=np.round(cost), meters=meters)
+
+
+def choose_modes(modes: ModeMatrix, legs: Sequence[Tuple[int, int]], budget: float = DAILY_TRANSPORT_BUDGET) -> List[LegChoice]:
+    """
+    legs：[(起点下标, 终点下标), ...]。所有路段先步行，每次挑"省时/加价"比最高的一次升级，
+    预算不够或没有划算的升级时停止。候选升级放在堆里，某段升级后只重算这一段，数千段也是毫秒级。
+    """
+    if not legs:
+        return []
+    rows, cols = np.asarray(legs).T
+    t = modes.minutes[:, rows, cols].T.tolist()   # (路段数, 3)
+    c = modes.cost[:, rows, cols].T.tolist()
+    current = [WALK] * len(legs)
+    version = [0] * len(legs)
+    remaining = budget
+
+    def _push(heap, k):
+        for m in (METRO, TAXI):
+            saved = t[k][current[k]] - t[k][m]
+            extra = c[k][m] - c[k][current[k]]
+            if saved <= 0:
+                continue
+            ratio = saved / extra if extra > 0 else float("inf")
+            if ratio >= MIN_MINUTES_PER_YUAN:
+                # 比值相同时优先省时多的
+                heapq.heappush(heap, (-ratio, -saved, k, m, version[k]))
+
+    heap = []
+    for k in range(len(legs)):
+        _push(heap, k)
+    while heap:
+        _, _, k, m, ver = heapq.heappop(heap)
+        extra = c[k][m] - c[k][current[k]]
+        if ver != version[k] or extra > remaining:
+            continue  # 过期条目，或剩余预算不够这次升级
+        remaining -= extra
+        current[k] = m
+        version[k] += 1
+        _push(heap, k)
+
+    return [
+        LegChoice(mode=MODE_NAMES[m], minutes=max(1, int(t[k][m])), meters=int(modes.meters[rows[k], cols[k]]),
+                  cost=int(c[k][m]))
+        for k, m in enumerate(current)
+    ]
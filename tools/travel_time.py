@@ -0,0 +1,207 @@
+"""
+出行时间矩阵：
+- TravelTimeProvider.matrix(origins, destinations) 一次返回整张 起点×终点 的分钟数/米数矩阵
+- BaiduRouteMatrixProvider：百度批量算路（routematrix v2），按 起点数×终点数 ≤ 50 分块请求，
+  结果按坐标（保留 4 位小数，约 10 米）逐对缓存，重复的点对不再请求；失败的点对退回本地估算，
+  各块经 http_client 的共享异步客户端并发请求（最多 ROUTEMATRIX_CONCURRENCY 个同时在途），
+  请求经 tools.resilience 熔断和重试，接口持续出错时直接走本地估算
+- LocalProvider：本地兜底模型，球面距离 × 绕行系数 ÷ 步行速度
+
+默认有百度 AK 时用百度，否则用本地模型；可用 TRAVEL_TIME_PROVIDER=local|baidu 强制指定。
+"""
+import asyncio
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from tools import http_client, resilience
+
+try:
+    import streamlit as st  # type: ignore
+except Exception:
+    st = None  # type: ignore
+
+
+def _get_baidu_ak() -> str | None:
+    """优先从环境变量 / Streamlit secrets 中安全获取百度地图 AK。"""
+    ak = os.getenv("BAIDU_AK")
+    if ak:
+        return ak
+    if st is not None:
+        try:
+            return st.secrets.get("BAIDU_AK")  # type: ignore[attr-defined]
+        except Exception:
+            return None
+    return None
+
+
+BAIDU_AK = _get_baidu_ak()
+
+SPEED_WALK = 80  # 米/分钟
+DETOUR_FACTOR = float(os.getenv("LOCAL_DETOUR_FACTOR", "1.3"))  # 路网距离 / 直线距离
+MAX_PAIRS_PER_REQUEST = 50
+MATRIX_CONCURRENCY = int(os.getenv("ROUTEMATRIX_CONCURRENCY", "4"))  # 同时在途的分块请求数
+PAIR_CACHE_SIZE = int(os.getenv("TRAVEL_TIME_CACHE_SIZE", "20000"))
+
+Point = Tuple[float, float]  # (lat, lng)，百度 BD-09 坐标
+
+
+@dataclass
+class TravelMatrix:
+    minutes: List[List[int]]
+    meters: List[List[int]]
+
+    def leg(self, i: int, j: int) -> Tuple[int, int]:
+        """第 i 个起点到第 j 个终点的 (分钟, 米)"""
+        return self.minutes[i][j], self.meters[i][j]
+
+
+class TravelTimeProvider(ABC):
+    mode = "步行"
+
+    @abstractmethod
+    def matrix(self, origins: Sequence[Point], destinations: Sequence[Point]) -> TravelMatrix:
+        """origins × destinations 的通行时间（分钟）和距离矩阵"""
+
+
+class LocalProvider(TravelTimeProvider):
+    def __init__(self, speed: float = SPEED_WALK, detour: float = DETOUR_FACTOR):
+        self.speed = speed
+        self.detour = detour
+
+    def pair(self, origin: Point, destination: Point) -> Tuple[int, int]:
+        from tools.route_planner import distance_meters
+        try:
+            d = distance_meters(origin[0], origin[1], destination[0], destination[1]) * self.detour
+        except ValueError:
+            d = 1000  # 坐标异常时按1公里估算，与原先的兜底一致
+        return max(1, int(d / self.speed)), int(d)
+
+    def matrix(self, origins, destinations) -> TravelMatrix:
+        legs = [[self.pair(o, d) for d in destinations] for o in origins]
+        return TravelMatrix(minutes=[[m for m, _ in row] for row in legs],
+                            meters=[[d for _, d in row] for row in legs])
+
+
+def _key(p: Point) -> Tuple[float, float]:
+    return round(p[0], 4), round(p[1], 4)
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class BaiduRouteMatrixProvider(TravelTimeProvider):
+    URL = "https://api.map.baidu.com/routematrix/v2/walking"
+
+    def __init__(self, ak: Optional[str] = BAIDU_AK, fallback: Optional[LocalProvider] = None,
+                 cache_size: int = PAIR_CACHE_SIZE):
+        self.ak = ak
+        self.fallback = fallback or LocalProvider()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Tuple[int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "fallback": 0}
+
+    # ---------- 逐对 LRU 缓存 ----------
+    def _cache_get(self, key) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, key, value: Tuple[int, int]):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ---------- 百度批量算路 ----------
+    async def _arequest(self, origins: List[Point], destinations: List[Point]) -> Dict[tuple, Tuple[int, int]]:
+        """一次请求 len(origins) × len(destinations) 个点对，结果按行优先排列"""
+        params = {
+            "ak": self.ak,
+            "origins": "|".join(f"{lat:.6f},{lng:.6f}" for lat, lng in origins),
+            "destinations": "|".join(f"{lat:.6f},{lng:.6f}" for lat, lng in destinations),
+            "output": "json",
+        }
+        self.stats["requests"] += 1
+        r = await http_client.get_json(self.URL, params)
+        if r.get("status") != 0 or len(r.get("result") or []) != len(origins) * len(destinations):
+            raise RuntimeError(f"百度批量算路失败：{r.get('message', 'unknown')}")
+        found = {}
+        for idx, item in enumerate(r["result"]):
+            o, d = origins[idx // len(destinations)], destinations[idx % len(destinations)]
+            seconds = (item.get("duration") or {}).get("value")
+            meters = (item.get("distance") or {}).get("value")
+            if seconds is None or meters is None:
+                continue
+            found[(_key(o), _key(d))] = (max(1, round(seconds / 60)), int(meters))
+        return found
+
+    async def _afetch_missing(self, missing: List[Tuple[Point, Point]]):
+        """缺失点对按 起点数×终点数 ≤ 50 分块，各块并发请求；终点一块，起点按块大小补满"""
+        origins = list({_key(o): o for o, _ in missing}.values())
+        destinations = list({_key(d): d for _, d in missing}.values())
+        blocks = [(origin_block, dest_block)
+                  for dest_block in _chunks(destinations, MAX_PAIRS_PER_REQUEST)
+                  for origin_block in _chunks(origins, max(1, MAX_PAIRS_PER_REQUEST // len(dest_block)))]
+        semaphore = asyncio.Semaphore(max(1, MATRIX_CONCURRENCY))
+
+        async def _one(origin_block, dest_block):
+            async with semaphore:
+                try:
+                    found = await self._arequest(origin_block, dest_block)
+                except Exception as e:
+                    print(f"警告：{e}，该批点对使用本地估算")
+                    return
+            for key, value in found.items():
+                self._cache_put(key, value)
+
+        await asyncio.gather(*(_one(o, d) for o, d in blocks))
+
+    def matrix(self, origins, destinations) -> TravelMatrix:
+        if not self.ak:
+            return self.fallback.matrix(origins, destinations)
+        pairs = [(o, d) for o in origins for d in destinations if _key(o) != _key(d)]
+        missing = [(o, d) for o, d in pairs if self._cache_get((_key(o), _key(d))) is None]
+        self.stats["hits"] += len(pairs) - len(missing)
+        self.stats["misses"] += len(missing)
+        if missing:
+            try:
+                http_client.run_sync(self._afetch_missing(missing))
+            except TimeoutError as e:
+                print(f"警告：{e}，未返回的点对使用本地估算")  # 已返回的块已经写进缓存
+
+        minutes, meters = [], []
+        for o in origins:
+            row_min, row_m = [], []
+            for d in destinations:
+                if _key(o) == _key(d):
+                    value = (1, 0)
+                else:
+                    value = self._cache_get((_key(o), _key(d)))
+                    if value is None:
+                        self.stats["fallback"] += 1
+                        value = self.fallback.pair(o, d)
+                row_min.append(value[0])
+                row_m.append(value[1])
+            minutes.append(row_min)
+            meters.append(row_m)
+        return TravelMatrix(minutes=minutes, meters=meters)
+
+
+def _default_provider() -> TravelTimeProvider:
+    choice = os.getenv("TRAVEL_TIME_PROVIDER", "").lower()
+    if choice == "local" or (choice != "baidu" and not BAIDU_AK):
+        return LocalProvider()
+    return BaiduRouteMatrixProvider()
+
+
+provider = _default_provider()
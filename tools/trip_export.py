@@ -0,0 +1,201 @@
+"""
+流式多格式导出：DayPlan 每生成一天就交给 TripExporter.add_day，一次遍历同时写出
+- itinerary.md       与 export_full_md 完全一致的 Markdown
+- itinerary.json     规范化 JSON 快照（键顺序固定、无时间戳，同一行程字节级一致），供下游程序直接读取；
+                     summary.accommodation 按 hotel_price × nights 计算（DayPlan 里不含住宿费），没给房价时不输出该项
+- itinerary.ics      iCalendar，每个 Activity 一个 VEVENT（Asia/Shanghai 时区，UID 稳定，日历重复导入会覆盖而不是重复）
+- itinerary.geojson  每天的路线 + 停靠点（与页面地图同一套 Feature）
+内容直接写进临时目录里的文件，内存里只保留累计的总结数字，30–60 天的行程也不会占用多少内存；
+finish() 之后可以按格式读取，或用 write_zip 打包下载。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from tools.export_md import MD_HEADER, md_day, md_footer
+
+FORMATS = ("md", "json", "ics", "geojson")
+FILE_NAMES = {"md": "itinerary.md", "json": "itinerary.json", "ics": "itinerary.ics", "geojson": "itinerary.geojson"}
+MIME_TYPES = {"md": "text/markdown", "json": "application/json", "ics": "text/calendar",
+              "geojson": "application/geo+json", "zip": "application/zip"}
+JSON_VERSION = 1
+ICS_TZID = "Asia/Shanghai"
+ICS_CATEGORIES = {"attraction": "景点", "meal": "餐饮", "hotel": "住宿"}
+
+
+# ---------- iCalendar 细节（RFC 5545） ----------
+def _ics_escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _ics_fold(line: str) -> str:
+    """按 75 个字节折行（续行以空格开头），不切断多字节字符"""
+    out, current, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append(current)
+            current, size = " ", 1
+        current += ch
+        size += n
+    out.append(current)
+    return "\r\n".join(out) + "\r\n"
+
+
+def _ics_time(dt: datetime) -> str:
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+class TripExporter:
+    """
+    用法：
+        with TripExporter(trip_id, destination="苏州") as exporter:
+            for day_plan in ...:
+                exporter.add_day(day_plan)
+            exporter.finish()
+            md_text = exporter.read_text("md")
+            exporter.write_zip(path_or_fileobj)
+    退出 with 块时删除临时目录。
+    """
+
+    def __init__(self, trip_id: str, destination: str = "", formats: Iterable[str] = FORMATS,
+                 workdir: Optional[str] = None, meta: Optional[dict] = None,
+                 hotel_price: Optional[int] = None, nights: Optional[int] = None):
+        self.formats = tuple(f for f in FORMATS if f in set(formats))
+        self.trip_id = trip_id
+        self.destination = destination
+        self.hotel_price = hotel_price
+        self.nights = nights  # 默认按天数计，与页面的总花费汇总一致
+        self._dir = tempfile.mkdtemp(prefix="trip-export-", dir=workdir)
+        self._files = {f: open(self.path(f), "w", encoding="utf-8", newline="") for f in self.formats}
+        self._days = 0
+        self._features = 0  # 已写出的 GeoJSON Feature 数，决定是否需要逗号分隔
+        self._totals = {"km": 0.0, "min": 0, "walk_km": 0.0, "restaurant": 0,
+                        "transport": 0, "attraction": 0, "contingency": 0}
+        self._finished = False
+        self._header(meta or {})
+
+    def path(self, fmt: str) -> str:
+        return os.path.join(self._dir, FILE_NAMES[fmt])
+
+    # ---------- 写入 ----------
+    def _write(self, fmt: str, text: str):
+        f = self._files.get(fmt)
+        if f is not None:
+            f.write(text)
+
+    def _header(self, meta: dict):
+        self._write("md", MD_HEADER)
+        head = {"version": JSON_VERSION, "trip_id": self.trip_id, "destination": self.destination, "meta": meta}
+        self._write("json", json.dumps(head, ensure_ascii=False, sort_keys=True)[:-1] + ',"days":[')
+        self._write("ics", "".join(_ics_fold(line) for line in (
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//dahuang-TravelAgent//Itinerary//ZH", "CALSCALE:GREGORIAN",
+            f"X-WR-CALNAME:{_ics_escape(self.destination + '行程')}", f"X-WR-TIMEZONE:{ICS_TZID}",
+            "BEGIN:VTIMEZONE", f"TZID:{ICS_TZID}", "BEGIN:STANDARD", "DTSTART:19700101T000000",
+            "TZOFFSETFROM:+0800", "TZOFFSETTO:+0800", "TZNAME:CST", "END:STANDARD", "END:VTIMEZONE",
+        )))
+        self._write("geojson", '{"type":"FeatureCollection","features":[')
+
+    def add_day(self, plan):
+        if self._finished:
+            raise RuntimeError("导出已结束，不能再追加")
+        first = self._days == 0
+        self._days += 1
+
+        # Markdown 段落顺带算出当天路程，JSON 总结也要用，所以不管是否导出 md 都算一遍
+        text, day_km, day_min, day_walk_km = md_day(plan)
+        self._write("md", text)
+        self._totals["km"] += day_km
+        self._totals["min"] += day_min
+        self._totals["walk_km"] += day_walk_km
+        for field in ("restaurant", "transport", "attraction", "contingency"):
+            self._totals[field] += getattr(plan, field)
+
+        if "json" in self._files:
+            payload = json.dumps(plan.model_dump(mode="json"), ensure_ascii=False, sort_keys=True)
+            self._write("json", payload if first else "," + payload)
+
+        if "ics" in self._files:
+            self._write("ics", "".join(self._vevent(plan, i, act) for i, act in enumerate(plan.activities)))
+
+        if "geojson" in self._files:
+            from tools.map_view import day_features
+
+            for feature in day_features(plan):
+                text = json.dumps(feature, ensure_ascii=False, separators=(",", ":"))
+                self._write("geojson", "," + text if self._features else text)
+                self._features += 1
+
+    def _vevent(self, plan, index: int, act) -> str:
+        uid = hashlib.sha1(f"{self.trip_id}|{plan.day}|{index}|{act.name}".encode("utf-8")).hexdigest()
+        end = act.end if act.end > act.start else act.start  # 零时长活动（如入住）也保留为时间点
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@dahuang-travelagent",
+            f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTSTART;TZID={ICS_TZID}:{_ics_time(act.start)}",
+            f"DTEND;TZID={ICS_TZID}:{_ics_time(end)}",
+            f"SUMMARY:{_ics_escape(act.name)}",
+            f"CATEGORIES:{ICS_CATEGORIES.get(act.category, act.category)}",
+        ]
+        if act.transport_duration > 0:
+            detail = f"Day {plan.day} · {act.transport_mode} {act.transport_duration} 分钟 · {act.transport_distance / 1000:.1f} km"
+            if act.transport_cost:
+                detail += f" · ¥{act.transport_cost}"
+            lines.append(f"DESCRIPTION:{_ics_escape(detail)}")
+        if act.lat is not None and act.lng is not None:
+            lines.append(f"GEO:{act.lat:.6f};{act.lng:.6f}")
+        lines.append("END:VEVENT")
+        return "".join(_ics_fold(line) for line in lines)
+
+    def finish(self) -> Dict[str, str]:
+        """写入各格式的结尾并关闭文件，返回 {格式: 文件路径}"""
+        if not self._finished:
+            t = self._totals
+            self._write("md", md_footer(t["km"], t["min"], t["walk_km"]))
+            summary = {"days": self._days, "km": round(t["km"], 2), "minutes": t["min"],
+                       **{k: t[k] for k in ("restaurant", "transport", "attraction", "contingency")}}
+            if self.hotel_price is not None:
+                nights = self.nights if self.nights is not None else self._days
+                summary["accommodation"] = self.hotel_price * nights
+            self._write("json", '],"summary":' + json.dumps(summary, ensure_ascii=False, sort_keys=True) + "}")
+            self._write("ics", _ics_fold("END:VCALENDAR"))
+            self._write("geojson", "]}")
+            for f in self._files.values():
+                f.close()
+            self._finished = True
+        return {fmt: self.path(fmt) for fmt in self.formats}
+
+    # ---------- 读取 ----------
+    def read_bytes(self, fmt: str) -> bytes:
+        self.finish()
+        with open(self.path(fmt), "rb") as f:
+            return f.read()
+
+    def read_text(self, fmt: str) -> str:
+        return self.read_bytes(fmt).decode("utf-8")
+
+    def write_zip(self, target, prefix: str = "") -> None:
+        """target 为路径或可写文件对象；文件按块压缩写入，不整体读进内存"""
+        self.finish()
+        with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for fmt in self.formats:
+                zf.write(self.path(fmt), arcname=prefix + FILE_NAMES[fmt])
+
+    def close(self):
+        for f in self._files.values():
+            if not f.closed:
+                f.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
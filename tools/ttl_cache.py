@@ -0,0 +1,206 @@
+"""
+工具结果的 TTL 缓存（SQLite，多进程共享）：
+- cached_call：新鲜直接返回；过期但仍在 stale 窗口内先返回旧值、后台刷新（stale-while-revalidate）；否则同步计算
+- 带 error 的结果不缓存；标了 permanent 的查无结果（见 tools.resilience）按 NEGATIVE_TTL 短期负缓存，
+  过期后不作为旧值返回
+- access_log 记录目的地访问，供缓存预热器按最近度 × 频次挑城市
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional
+
+from tools import resilience
+
+DATA_DIR = os.getenv("TRAVEL_AGENT_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+CACHE_PATH = os.getenv("TOOL_CACHE_PATH", os.path.join(DATA_DIR, "tool_cache.sqlite3"))
+
+CITY_TTL = int(os.getenv("CITY_CACHE_TTL", str(30 * 86400)))   # 城市经纬度基本不变
+POI_TTL = int(os.getenv("POI_CACHE_TTL", str(86400)))           # POI 列表一天
+INTRO_TTL = int(os.getenv("INTRO_CACHE_TTL", str(7 * 86400)))   # 城市简介一周
+DAY_PLAN_TTL = int(os.getenv("DAY_PLAN_CACHE_TTL", str(7 * 86400)))  # 可复现模式下的逐日选点，按提示词哈希
+NEGATIVE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "300"))     # 永久性的查无结果，短期内不再重复请求
+
+# 为 True 时跳过读缓存、强制计算并写回（预热器刷新用）
+_refreshing: contextvars.ContextVar[bool] = contextvars.ContextVar("cache_refreshing", default=False)
+
+
+@contextlib.contextmanager
+def refreshing():
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+
+
+def is_error(result: Any) -> bool:
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list):
+        return bool(result) and isinstance(result[0], dict) and "error" in result[0]
+    return result is None
+
+
+class TTLCache:
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+        self._io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-io")  # 协程版本的 SQLite 读写
+        self._refreshing_keys = set()
+        self._tasks = set()  # 持有异步刷新任务的引用，避免被垃圾回收
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                ns TEXT, key TEXT, value TEXT, created REAL, expires REAL, PRIMARY KEY (ns, key))""")
+            conn.execute("CREATE TABLE IF NOT EXISTS access_log (city TEXT, ts REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_access_ts ON access_log (ts)")
+            self._local.conn = conn
+        return conn
+
+    # ---------- 基本读写 ----------
+    def get(self, ns: str, key: str) -> Optional[tuple]:
+        """返回 (value, expires)，不存在返回 None（不判断是否过期）"""
+        row = self._conn().execute("SELECT value, expires FROM entries WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, ns: str, key: str, value: Any, ttl: float):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (ns, key, json.dumps(value, ensure_ascii=False, default=str), now, now + ttl),
+        )
+
+    def expires_at(self, ns: str, key: str) -> Optional[float]:
+        row = self._conn().execute("SELECT expires FROM entries WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return row[0] if row else None
+
+    # ---------- 访问日志 ----------
+    def record_access(self, city: str):
+        self._conn().execute("INSERT INTO access_log VALUES (?, ?)", (city, time.time()))
+
+    def top_cities(self, limit: int = 20, window_days: float = 30, half_life_days: float = 3) -> List[str]:
+        """最近度 × 频次：每次访问按半衰期指数衰减后累加"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM access_log WHERE ts < ?", (now - window_days * 86400,))  # 顺带清理过期日志
+        rows = conn.execute("SELECT city, ts FROM access_log").fetchall()
+        scores = {}
+        decay = math.log(2) / (half_life_days * 86400)
+        for city, ts in rows:
+            scores[city] = scores.get(city, 0.0) + math.exp(-decay * (now - ts))
+        return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+    # ---------- stale-while-revalidate ----------
+    def _refresh_in_background(self, ns: str, key: str, compute: Callable[[], Any], ttl: float):
+        with self._lock:
+            if (ns, key) in self._refreshing_keys:
+                return
+            self._refreshing_keys.add((ns, key))
+
+        def _job():
+            try:
+                self._store(ns, key, compute(), ttl)
+            finally:
+                with self._lock:
+                    self._refreshing_keys.discard((ns, key))
+
+        self._refresh_pool.submit(_job)
+
+    def _lookup(self, ns: str, key: str, stale_ttl: float):
+        """返回 (状态, 值)：fresh / stale / miss；缓存本身出错时返回 error"""
+        if _refreshing.get():
+            return "miss", None
+        try:
+            hit = self.get(ns, key)
+        except sqlite3.Error:
+            return "error", None
+        if hit is None:
+            return "miss", None
+        value, expires = hit
+        now = time.time()
+        if now < expires:
+            return "fresh", value
+        if now < expires + stale_ttl and not is_error(value):
+            return "stale", value
+        return "miss", None
+
+    def _store(self, ns: str, key: str, value: Any, ttl: float):
+        if is_error(value):
+            if not resilience.is_permanent(value):
+                return
+            ttl = min(ttl, NEGATIVE_TTL)
+        try:
+            self.set(ns, key, value, ttl)
+        except sqlite3.Error:
+            pass
+
+    def cached_call(self, ns: str, key: str, compute: Callable[[], Any], ttl: float, stale_ttl: Optional[float] = None):
+        """
+        ttl 内直接返回；过期但未超过 ttl + stale_ttl（默认等于 ttl）时返回旧值并后台刷新；
+        否则同步计算。缓存本身出错时退化为直接计算。
+        """
+        state, value = self._lookup(ns, key, ttl if stale_ttl is None else stale_ttl)
+        if state == "error":
+            return compute()
+        if state == "stale":
+            self._refresh_in_background(ns, key, compute, ttl)
+        if state in ("fresh", "stale"):
+            return value
+        value = compute()
+        self._store(ns, key, value, ttl)
+        return value
+
+    async def _in_pool(self, fn: Callable[..., Any], *args):
+        """在 _io_pool 里执行 SQLite 读写，不阻塞事件循环；带上当前上下文（refreshing() 标记）"""
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._io_pool, lambda: ctx.run(fn, *args))
+
+    async def acached_call(self, ns: str, key: str, compute: Callable[[], Awaitable[Any]], ttl: float,
+                           stale_ttl: Optional[float] = None):
+        """cached_call 的协程版本：compute 返回协程，过期刷新作为当前事件循环上的后台任务执行"""
+        state, value = await self._in_pool(self._lookup, ns, key, ttl if stale_ttl is None else stale_ttl)
+        if state == "error":
+            return await compute()
+        if state == "stale":
+            with self._lock:
+                start = (ns, key) not in self._refreshing_keys
+                self._refreshing_keys.add((ns, key))
+            if start:
+                task = asyncio.get_running_loop().create_task(self._arefresh(ns, key, compute, ttl))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        if state in ("fresh", "stale"):
+            return value
+        value = await compute()
+        await self._in_pool(self._store, ns, key, value, ttl)
+        return value
+
+    async def _arefresh(self, ns: str, key: str, compute: Callable[[], Awaitable[Any]], ttl: float):
+        try:
+            await self._in_pool(self._store, ns, key, await compute(), ttl)
+        except Exception:
+            pass  # 后台刷新失败不影响已返回的旧值，下次访问再试
+        finally:
+            with self._lock:
+                self._refreshing_keys.discard((ns, key))
+
+cache = TTLCache()
+
+
+def poi_key(lat: float, lng: float, radius: int) -> str:
+    return f"{lat:.5f},{lng:.5f},{radius}"